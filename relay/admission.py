@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+# 새 등록 허용 속도 (초당) 와 순간 허용량
+ADMISSION_RATE = float(os.environ.get("RELAY_ADMISSION_RATE", "200"))
+ADMISSION_BURST = int(os.environ.get("RELAY_ADMISSION_BURST", "400"))
+# 토큰을 기다리는 등록 수 한도와 최대 대기 시간 (초)
+PENDING_LIMIT = int(os.environ.get("RELAY_PENDING_REGISTRATIONS", "1000"))
+PENDING_TIMEOUT = float(os.environ.get("RELAY_PENDING_TIMEOUT", "10"))
+# 주소 하나의 동시 연결 한도 (공연장 NAT 뒤 스태프 전원이 한 주소일 수 있어 넉넉하게, 0 이면 끔)
+MAX_CONNECTIONS_PER_IP = int(os.environ.get("RELAY_MAX_CONNECTIONS_PER_IP", "256"))
+# 이 주소에서 온 연결은 X-Forwarded-For 의 마지막 주소를 클라이언트 주소로 본다 (nginx 등)
+TRUSTED_PROXIES = frozenset(filter(None, os.environ.get("RELAY_TRUSTED_PROXIES", "").split(",")))
+
+# 거절 시 재시도 안내 (초). 모두 같은 시각에 다시 몰리지 않도록 지터를 섞는다
+RETRY_AFTER_MIN = 1.0
+RETRY_AFTER_MAX = 30.0
+
+# RFC 6455 1013: Try Again Later
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+@dataclass
+class AdmissionStats:
+    """등록 허용 통계"""
+    admitted: int = 0
+    priority: int = 0   # 대기 없이 통과한 PD 등록
+    queued: int = 0     # 토큰을 기다린 등록
+    # 거절 사유별 수 (per_ip / queue_full / timeout)
+    rejected: Dict[str, int] = field(default_factory=dict)
+
+
+class TokenBucket:
+    """초당 rate 개씩 채워지고 최대 burst 개까지 쌓이는 토큰 버킷"""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """다음 토큰까지 남은 시간 (초)"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionController:
+    """재접속 폭주 때 새 연결·등록을 제한해 기존 세션의 탈리 전달을 지킨다
+
+    연결 단계에서는 주소별 동시 연결 수만 센다. 등록은 토큰 버킷을 통과해야 하고,
+    토큰이 없으면 한도 안에서 도착 순서대로 기다린다. PD 등록은 버킷과 대기열을
+    거치지 않는다. 거절할 때는 지터를 섞은 재시도 시간을 close reason 에 담는다.
+    """
+
+    def __init__(self, rate: float = ADMISSION_RATE, burst: int = ADMISSION_BURST,
+                 pending_limit: int = PENDING_LIMIT, pending_timeout: float = PENDING_TIMEOUT,
+                 max_per_ip: int = MAX_CONNECTIONS_PER_IP, clock: Callable[[], float] = time.monotonic):
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.pending_limit = pending_limit
+        self.pending_timeout = pending_timeout
+        self.max_per_ip = max_per_ip
+        self.connections: Dict[str, int] = {}
+        self.pending: deque = deque()
+        self.stats = AdmissionStats()
+        self._drainer: Optional[asyncio.Task] = None
+
+    def connect(self, address: str) -> Optional[str]:
+        """새 연결 기록. 주소별 한도를 넘으면 거절 사유 반환"""
+        count = self.connections.get(address, 0)
+        if self.max_per_ip and count >= self.max_per_ip:
+            self._reject("per_ip")
+            return "per_ip"
+        self.connections[address] = count + 1
+        return None
+
+    def disconnect(self, address: str):
+        count = self.connections.get(address, 0) - 1
+        if count > 0:
+            self.connections[address] = count
+        else:
+            self.connections.pop(address, None)
+
+    async def admit(self, priority: bool = False) -> Optional[str]:
+        """등록 허용 대기. 허용되면 None, 거절되면 사유 반환"""
+        if priority:
+            self.stats.priority += 1
+            self.stats.admitted += 1
+            return None
+        if not self.pending and self.bucket.try_take():
+            self.stats.admitted += 1
+            return None
+        if len(self.pending) >= self.pending_limit:
+            self._reject("queue_full")
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.pending.append(waiter)
+        self.stats.queued += 1
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.ensure_future(self._drain())
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.pending_timeout)
+        except asyncio.TimeoutError:
+            waiter.cancel()
+            self._reject("timeout")
+            return "timeout"
+        except asyncio.CancelledError:
+            waiter.cancel()
+            raise
+        self.stats.admitted += 1
+        return None
+
+    async def _drain(self):
+        """토큰이 생길 때마다 대기 중인 등록을 도착 순서대로 허용"""
+        while self.pending:
+            waiter = self.pending[0]
+            if waiter.done():
+                # 시간 초과로 떠난 등록
+                self.pending.popleft()
+                continue
+            if self.bucket.try_take():
+                self.pending.popleft()
+                waiter.set_result(None)
+                continue
+            await asyncio.sleep(self.bucket.wait_time())
+
+    def retry_after(self) -> float:
+        """지금 대기열이 빠지는 데 걸릴 시간을 기준으로 0.5~1.5배 지터를 섞은 재시도 시간"""
+        backlog = (len(self.pending) + 1) / self.bucket.rate
+        return min(RETRY_AFTER_MAX, max(RETRY_AFTER_MIN, backlog) * random.uniform(0.5, 1.5))
+
+    def close_reason(self, cause: str) -> str:
+        """close frame reason (123 바이트 이하)"""
+        return f"Relay busy ({cause}); retry_after={self.retry_after():.1f}"
+
+    def _reject(self, cause: str):
+        self.stats.rejected[cause] = self.stats.rejected.get(cause, 0) + 1
+        rejected = sum(self.stats.rejected.values())
+        if rejected & (rejected - 1) == 0:
+            # 폭주 중 로그가 루프를 잡아먹지 않도록 1, 2, 4, 8... 번째에만 기록
+            logging.warning(f"등록 제한: {cause} (누적 거절 {rejected}, 대기 {len(self.pending)})")
+
+
+def client_address(websocket) -> str:
+    """연결의 클라이언트 주소 (신뢰하는 프록시 뒤면 X-Forwarded-For 마지막 값)"""
+    remote_address = websocket.remote_address
+    address = remote_address[0] if remote_address else "unknown"
+    if address in TRUSTED_PROXIES:
+        forwarded = websocket.request_headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return address
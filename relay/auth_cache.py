@@ -0,0 +1,86 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+# 캐시에 보관할 최대 토큰 수
+TOKEN_CACHE_SIZE = 10000
+# exp 클레임이 없는 토큰의 캐시 유지 시간 (초)
+TOKEN_CACHE_TTL = 300
+
+
+@dataclass
+class AuthStats:
+    """JWT 검증 통계"""
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    verifications: int = 0
+    verify_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def average_verify_ms(self) -> float:
+        return self.verify_seconds / self.verifications * 1000 if self.verifications else 0.0
+
+
+class TokenCache:
+    """검증이 끝난 JWT 클레임의 LRU 캐시
+
+    키는 토큰 원문 대신 SHA-256 다이제스트를 쓰고, 항목은 토큰의 exp 시각에 만료된다.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, default_ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.entries: "OrderedDict[bytes, Tuple[Dict, float]]" = OrderedDict()
+        self.stats = AuthStats()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict]:
+        """캐시된 클레임 반환 (없거나 만료되면 None)"""
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        payload, expires_at = entry
+        if time.time() >= expires_at:
+            del self.entries[key]
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        return payload
+
+    def peek(self, token: str) -> Optional[Dict]:
+        """통계·LRU 순서를 건드리지 않고 캐시된 클레임 확인 (없거나 만료되면 None)"""
+        entry = self.entries.get(self.digest(token))
+        if entry is None or time.time() >= entry[1]:
+            return None
+        return entry[0]
+
+    def put(self, token: str, payload: Dict):
+        """검증된 클레임 저장"""
+        expires_at = payload.get("exp", time.time() + self.default_ttl)
+        key = self.digest(token)
+        self.entries[key] = (payload, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def record_verification(self, seconds: float):
+        """jwt.decode 소요 시간 기록"""
+        self.stats.verifications += 1
+        self.stats.verify_seconds += seconds
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import os
+import socket
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from cluster import RelayCluster
+
+# 채널 이름 접두사
+NODE_CHANNEL = "returnfeed:relay:node:"
+SESSION_CHANNEL = "returnfeed:relay:session:"
+
+# Redis 연결이 끊겼을 때 재연결 대기 (초). 실패할 때마다 두 배로 늘려 최대값까지
+BACKPLANE_RECONNECT_MIN = float(os.environ.get("RELAY_BACKPLANE_RECONNECT_MIN", "0.5"))
+BACKPLANE_RECONNECT_MAX = float(os.environ.get("RELAY_BACKPLANE_RECONNECT_MAX", "30"))
+
+MessageHandler = Callable[[str, bytes], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """릴레이 노드 사이의 pub/sub 백플레인 인터페이스
+
+    구현체는 같은 채널에 대해 발행 순서대로 handler 를 하나씩 호출해야 한다.
+    메서드를 빠뜨린 구현체는 만들 때 TypeError 로 실패한다.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler):
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: bytes):
+        ...
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        ...
+
+    @abstractmethod
+    async def close(self):
+        ...
+
+
+class InProcessHub:
+    """InProcessBackplane 들이 공유하는 채널 목록"""
+
+    def __init__(self):
+        self.channels: Dict[str, Set["InProcessBackplane"]] = {}
+
+
+class InProcessBackplane(Backplane):
+    """한 프로세스 안의 여러 RelayServer 를 잇는 백플레인 (개발/시뮬레이션용)"""
+
+    def __init__(self, hub: InProcessHub):
+        self.hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.channels: Set[str] = set()
+
+    async def start(self, handler: MessageHandler):
+        async def consume():
+            while True:
+                channel, payload = await self.queue.get()
+                try:
+                    await handler(channel, payload)
+                except Exception as e:
+                    logging.error(f"백플레인 메시지 처리 오류: {e}")
+
+        self.task = asyncio.ensure_future(consume())
+
+    async def publish(self, channel: str, payload: bytes):
+        for backplane in self.hub.channels.get(channel, ()):
+            backplane.queue.put_nowait((channel, payload))
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+        self.hub.channels.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+        subscribers = self.hub.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.hub.channels[channel]
+
+    async def close(self):
+        for channel in list(self.channels):
+            await self.unsubscribe(channel)
+        if self.task is not None:
+            self.task.cancel()
+
+
+def encode_command(*args) -> bytes:
+    """RESP 배열로 명령 인코딩"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """RESP 응답 하나 읽기"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode("utf-8")
+    if prefix == b"-":
+        raise RuntimeError(body.decode("utf-8"))
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RuntimeError(f"Unexpected RESP reply: {line!r}")
+
+
+@dataclass
+class BackplaneStats:
+    """Redis 백플레인 연결 통계"""
+    disconnects: int = 0       # 연결이 끊긴 횟수
+    reconnects: int = 0        # 재연결에 성공한 횟수
+    failed_attempts: int = 0   # 재연결 시도 실패 횟수
+    dropped_publishes: int = 0  # 끊겨 있는 동안 버린 발행 수
+
+
+class RedisBackplane(Backplane):
+    """Redis 프로토콜(RESP) pub/sub 백플레인
+
+    발행용 연결과 구독용 연결을 따로 쓴다. PUBLISH 응답은 백그라운드에서 읽어
+    버리므로 발행이 왕복 시간을 기다리지 않는다. 둘 중 하나라도 끊기면 둘 다 닫고
+    지수 백오프로 다시 연결한 뒤 구독 중이던 채널을 다시 구독한다. 끊겨 있는 동안의
+    발행은 버리고 connected 와 stats 로 드러낸다.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379",
+                 reconnect_min: float = BACKPLANE_RECONNECT_MIN, reconnect_max: float = BACKPLANE_RECONNECT_MAX):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.publisher: Optional[asyncio.StreamWriter] = None
+        self.subscriber: Optional[asyncio.StreamWriter] = None
+        self.channels: Set[str] = set()
+        self.connected = False
+        self.stats = BackplaneStats()
+        self.handler: Optional[MessageHandler] = None
+        self.tasks: List[asyncio.Task] = []
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await read_reply(reader)
+        return reader, writer
+
+    async def _connect(self):
+        """발행·구독 연결을 열고 구독 중인 채널을 다시 구독"""
+        publish_reader, publisher = await self._open()
+        try:
+            subscribe_reader, subscriber = await self._open()
+        except BaseException:
+            publisher.close()
+            raise
+        self.publisher, self.subscriber = publisher, subscriber
+        if self.channels:
+            subscriber.write(encode_command("SUBSCRIBE", *sorted(self.channels)))
+        self.connected = True
+        return publish_reader, subscribe_reader
+
+    def _close_connections(self):
+        self.connected = False
+        for writer in (self.publisher, self.subscriber):
+            if writer is not None:
+                writer.close()
+
+    async def _drain_publish_replies(self, reader: asyncio.StreamReader):
+        while True:
+            try:
+                await read_reply(reader)
+            except RuntimeError as e:
+                logging.warning(f"Redis PUBLISH 오류: {e}")
+
+    async def _read_messages(self, reader: asyncio.StreamReader):
+        while True:
+            reply = await read_reply(reader)
+            if isinstance(reply, list) and reply and reply[0] == b"message":
+                try:
+                    await self.handler(reply[1].decode("utf-8"), reply[2])
+                except Exception as e:
+                    logging.error(f"백플레인 메시지 처리 오류: {e}")
+
+    async def _run(self, publish_reader: asyncio.StreamReader, subscribe_reader: asyncio.StreamReader):
+        """연결이 끊길 때까지 응답을 읽고, 끊기면 백오프하며 재연결"""
+        while True:
+            readers = [
+                asyncio.ensure_future(self._drain_publish_replies(publish_reader)),
+                asyncio.ensure_future(self._read_messages(subscribe_reader))
+            ]
+            try:
+                done, _ = await asyncio.wait(readers, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in readers:
+                    task.cancel()
+            for task in done:
+                error = task.exception()
+                if error is not None and not isinstance(error, (ConnectionError, asyncio.IncompleteReadError, OSError)):
+                    logging.error(f"Redis 응답 처리 오류: {error!r}")
+            self._close_connections()
+            self.stats.disconnects += 1
+            logging.error(f"Redis 백플레인 연결 끊김 ({self.host}:{self.port}), 재연결 시도")
+
+            delay = self.reconnect_min
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    publish_reader, subscribe_reader = await self._connect()
+                    break
+                except (OSError, ConnectionError, RuntimeError, asyncio.IncompleteReadError) as e:
+                    self.stats.failed_attempts += 1
+                    delay = min(delay * 2, self.reconnect_max)
+                    logging.warning(f"Redis 재연결 실패, {delay:.1f}초 후 재시도: {e}")
+            self.stats.reconnects += 1
+            logging.info(f"Redis 백플레인 재연결, 채널 {len(self.channels)}개 다시 구독")
+
+    async def start(self, handler: MessageHandler):
+        # 시작 시 연결 실패는 그대로 올려 노드가 백플레인 없이 뜨지 않게 한다
+        self.handler = handler
+        publish_reader, subscribe_reader = await self._connect()
+        self.tasks = [asyncio.ensure_future(self._run(publish_reader, subscribe_reader))]
+
+    async def publish(self, channel: str, payload: bytes):
+        if not self.connected:
+            self.stats.dropped_publishes += 1
+            return
+        self.publisher.write(encode_command("PUBLISH", channel, payload))
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+        if self.connected:
+            self.subscriber.write(encode_command("SUBSCRIBE", channel))
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+        if self.connected:
+            self.subscriber.write(encode_command("UNSUBSCRIBE", channel))
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self._close_connections()
+
+
+class BackplaneTransport:
+    """Backplane 을 RelayCluster 전송 계층으로 쓰기 위한 어댑터
+
+    노드 간 요청은 노드별 채널로, 세션 상태는 세션 채널로 한 번만 발행한다.
+    """
+
+    session_channels = True
+
+    def __init__(self, backplane: Backplane, node_id: str):
+        self.backplane = backplane
+        self.node_id = node_id
+
+    async def start(self, on_message: Callable[[bytes], Awaitable[None]],
+                    on_peer_lost: Optional[Callable[[str], None]] = None):
+        # pub/sub 에서는 노드별 연결이 없어 상대 노드가 끊긴 것을 알 수 없다
+        async def handle(channel: str, payload: bytes):
+            await on_message(payload)
+
+        await self.backplane.start(handle)
+        await self.backplane.subscribe(NODE_CHANNEL + self.node_id)
+
+    async def send(self, node_id: str, payload: bytes):
+        await self.backplane.publish(NODE_CHANNEL + node_id, payload)
+
+    async def subscribe_session(self, session_id: str):
+        await self.backplane.subscribe(SESSION_CHANNEL + session_id)
+
+    async def unsubscribe_session(self, session_id: str):
+        await self.backplane.unsubscribe(SESSION_CHANNEL + session_id)
+
+    async def publish_session(self, session_id: str, payload: bytes):
+        await self.backplane.publish(SESSION_CHANNEL + session_id, payload)
+
+    async def close(self):
+        await self.backplane.close()
+
+
+def cluster_from_env() -> Optional[RelayCluster]:
+    """RELAY_BACKPLANE_URL 이 있으면 Redis 백플레인 기반 RelayCluster 생성
+
+    RELAY_NODE_ID: 이 노드 ID (기본값 호스트명)
+    RELAY_NODES: 모든 노드 ID 목록 (쉼표 구분, 세션 소유 노드 계산에 사용)
+    """
+    url = os.environ.get("RELAY_BACKPLANE_URL")
+    if not url:
+        return None
+    node_id = os.environ.get("RELAY_NODE_ID", socket.gethostname())
+    nodes = [node.strip() for node in os.environ.get("RELAY_NODES", node_id).split(",") if node.strip()]
+    if node_id not in nodes:
+        raise ValueError(f"RELAY_NODE_ID {node_id} is not listed in RELAY_NODES")
+    return RelayCluster(node_id, nodes, BackplaneTransport(RedisBackplane(url), node_id))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+탈리 프레임 코덱 벤치마크
+현재 JSON 경로(json.dumps/json.loads)와 바이너리 서브프로토콜(wire.py)의
+인코딩/디코딩 시간과 프레임 크기를 비교한다.
+
+예: python bench_codec.py --inputs 30 --iterations 20000
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime
+
+from tally import snapshot_message, delta_message
+from wire import InputTable, encode_tally, encode_snapshot, decode_frame
+
+
+def build_tally_state(input_count: int) -> dict:
+    """vMix 입력 input_count 개짜리 대표 탈리 상태"""
+    return {
+        "program": 1,
+        "preview": 2,
+        "inputs": {
+            str(number): {
+                "number": number,
+                "title": f"Camera {number}",
+                "type": "Capture",
+                "state": "Running"
+            }
+            for number in range(1, input_count + 1)
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def measure(label: str, func, iterations: int, size: int):
+    """func 를 iterations 번 실행한 평균 시간(µs)과 프레임 크기 출력"""
+    elapsed = timeit.timeit(func, number=iterations)
+    print(f"{label:<28} {elapsed / iterations * 1e6:>10.2f} µs  {size:>8} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tally codec benchmark")
+    parser.add_argument("--inputs", type=int, default=30, help="입력 개수")
+    parser.add_argument("--iterations", type=int, default=20000, help="반복 횟수")
+    args = parser.parse_args()
+
+    seq = 42
+    state = build_tally_state(args.inputs)
+    table = InputTable()
+    table.sync(state)
+
+    json_full = json.dumps(snapshot_message(seq, state))
+    json_delta = json.dumps(delta_message(seq, {"program": 2, "preview": 1}, state["timestamp"]))
+    binary_tally = encode_tally(seq, state, table)
+    binary_snapshot = encode_snapshot(seq, state, table)
+
+    print(f"입력 {args.inputs}개, 반복 {args.iterations}회")
+    print("--- encode ---")
+    measure("json tally_update (full)", lambda: json.dumps(snapshot_message(seq, state)),
+            args.iterations, len(json_full.encode("utf-8")))
+    measure("json tally_delta", lambda: json.dumps(
+                delta_message(seq, {"program": 2, "preview": 1}, state["timestamp"])),
+            args.iterations, len(json_delta.encode("utf-8")))
+    measure("binary FRAME_TALLY", lambda: encode_tally(seq, state, table),
+            args.iterations, len(binary_tally))
+    measure("binary FRAME_SNAPSHOT", lambda: encode_snapshot(seq, state, table),
+            args.iterations, len(binary_snapshot))
+
+    print("--- decode ---")
+    measure("json tally_update (full)", lambda: json.loads(json_full),
+            args.iterations, len(json_full.encode("utf-8")))
+    measure("json tally_delta", lambda: json.loads(json_delta),
+            args.iterations, len(json_delta.encode("utf-8")))
+    measure("binary FRAME_TALLY", lambda: decode_frame(binary_tally, table.keys),
+            args.iterations, len(binary_tally))
+    measure("binary FRAME_SNAPSHOT", lambda: decode_frame(binary_snapshot),
+            args.iterations, len(binary_snapshot))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+송신 압축 정책별 CPU 비교
+같은 릴레이를 RELAY_COMPRESSION=default / off / threshold / shared 로 각각 띄워 bench_relays 와
+같은 부하(세션당 PD 1명 + 스태프 M명, 세션당 --rate 컷/초)를 걸고, 컷 하나를 세션 전체에
+전달하는 데 든 릴레이 CPU 시간(ms/컷)과 지연을 JSON 으로 출력한다. 부하 생성 쪽 클라이언트는
+모두 permessage-deflate 를 제안하므로 모드 간 차이는 릴레이의 압축 방식에서만 생긴다.
+
+--inputs 로 컷 메시지의 입력 수를 늘리면 프레임이 커져 압축 비용 차이가 뚜렷해진다.
+
+예: python bench_compression.py --relay relay_server --sessions 10 --staff 50 --inputs 40 --duration 10
+"""
+
+import argparse
+import json
+import os
+
+from bench_relays import RELAYS, measure
+
+MODES = ("default", "off", "threshold", "shared")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay CPU per cut for each compression mode")
+    parser.add_argument("--relay", choices=RELAYS, default="relay_server")
+    parser.add_argument("--modes", default=",".join(MODES), help="비교할 RELAY_COMPRESSION 값 (쉼표 구분)")
+    parser.add_argument("--min-size", type=int, help="RELAY_COMPRESSION_MIN_SIZE (없으면 릴레이 기본값)")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--staff", type=int, default=50, help="세션당 스태프 수")
+    parser.add_argument("--rate", type=float, default=5.0, help="세션당 초당 컷 수")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--inputs", type=int, default=20, help="컷 메시지에 넣을 입력 수 (프레임 크기)")
+    parser.add_argument("--warmup", type=float, default=0.5, help="등록 후 컷 시작 전 대기 (초)")
+    parser.add_argument("--drain", type=float, default=1.0, help="마지막 컷 후 수신 대기 (초)")
+    parser.add_argument("--load-processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--output", help="결과 JSON 저장 경로 (없으면 표준 출력만)")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(","):
+        env = {"RELAY_COMPRESSION": mode}
+        if args.min_size is not None:
+            env["RELAY_COMPRESSION_MIN_SIZE"] = str(args.min_size)
+        result = measure(args.relay, args, env)
+        cpu_seconds, cuts = result["relay_cpu_seconds"], result["cuts_sent"]
+        cpu_ms_per_cut = round(cpu_seconds * 1000 / cuts, 3) if cpu_seconds is not None and cuts else None
+        results.append({"compression": mode, "inputs_per_cut": args.inputs,
+                        "relay_cpu_ms_per_cut": cpu_ms_per_cut, **result})
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
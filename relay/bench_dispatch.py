@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+메시지 디스패치 마이크로 벤치마크
+대표적인 메시지 구성(ping 위주, 탈리 위주, 재접속 폭주)을 RelayServer.handle_message 에
+직접 넣어 메시지당 처리 시간을 잰다. JSON 코덱(orjson / 표준 json)별로 하위 프로세스를
+띄워 비교하고, 기준선으로 이전 방식(json.loads 후 type 확인)의 파싱 비용도 함께 출력한다.
+
+예: python bench_dispatch.py --messages 50000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+
+from bench_workers import BENCH_ADMISSION_ENV
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MIXES = {
+    # 이름: [(메시지 종류, 비율)]
+    "ping-heavy": [("ping", 0.90), ("tally", 0.08), ("input_list", 0.02)],
+    "tally-heavy": [("ping", 0.30), ("tally", 0.60), ("input_list", 0.10)],
+    "reconnect-storm": [("ping", 0.40), ("register", 0.50), ("tally", 0.10)],
+}
+
+
+class BenchSocket:
+    """handle_message 가 쓰는 만큼만 흉내 낸 연결 객체 (네트워크 비용 제외)"""
+
+    open = True
+    subprotocol = None
+    remote_address = ("127.0.0.1", 0)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, message):
+        self.sent += 1
+
+    def write_frame_sync(self, fin, opcode, data):
+        self.sent += 1
+
+    async def close(self, code=1000, reason=""):
+        self.open = False
+
+
+def build_messages(mix: str, count: int, input_count: int):
+    """mix 비율대로 (소켓 종류, 메시지) 목록 생성"""
+    inputs = {str(n): {"number": n, "title": f"Camera {n}", "type": "Capture"} for n in range(1, input_count + 1)}
+    kinds, weights = zip(*MIXES[mix])
+    rng = random.Random(7)
+    messages = []
+    program = 1
+    for kind in rng.choices(kinds, weights, k=count):
+        if kind == "ping":
+            messages.append(("staff", json.dumps({"type": "ping"})))
+        elif kind == "tally":
+            program = program % input_count + 1
+            messages.append(("pd", json.dumps({"type": "tally_update", "program": program, "preview": 1, "inputs": inputs})))
+        elif kind == "input_list":
+            messages.append(("pd", json.dumps({"type": "input_list", "inputs": inputs})))
+        elif kind == "register":
+            messages.append(("new", json.dumps({"type": "register", "sessionId": "bench", "role": "staff"})))
+    return messages
+
+
+async def run_mix(mix: str, count: int, staff: int, input_count: int) -> float:
+    """mix 를 handle_message 로 처리하는 데 걸린 메시지당 시간(µs)"""
+    from relay_server import RelayServer
+
+    server = RelayServer()
+    server.coalescer.window = 0
+    pd = BenchSocket()
+    await server.handle_message(pd, json.dumps({"type": "register", "sessionId": "bench", "role": "pd"}))
+    staff_sockets = [BenchSocket() for _ in range(staff)]
+    for websocket in staff_sockets:
+        await server.handle_message(websocket, json.dumps({"type": "register", "sessionId": "bench", "role": "staff"}))
+
+    messages = build_messages(mix, count, input_count)
+    started = time.perf_counter()
+    for index, (sender, message) in enumerate(messages):
+        if sender == "pd":
+            websocket = pd
+        elif sender == "new":
+            websocket = BenchSocket()
+        else:
+            websocket = staff_sockets[index % staff]
+        await server.handle_message(websocket, message)
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def baseline_parse(mix: str, count: int, input_count: int) -> float:
+    """이전 방식: 모든 메시지를 json.loads 한 뒤 type 확인하는 비용(µs)"""
+    messages = build_messages(mix, count, input_count)
+    started = time.perf_counter()
+    for _, message in messages:
+        json.loads(message).get("type")
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def child(args):
+    """현재 코덱으로 모든 mix 측정 후 JSON 출력"""
+    import codec
+    results = {"codec": codec.CODEC_NAME}
+    for mix in MIXES:
+        results[mix] = round(asyncio.run(run_mix(mix, args.messages, args.staff, args.inputs)), 2)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay dispatch micro-benchmark")
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--staff", type=int, default=50, help="세션 스태프 수 (팬아웃 대상)")
+    parser.add_argument("--inputs", type=int, default=30, help="탈리 메시지의 입력 개수")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        logging.disable(logging.INFO)
+        child(args)
+        return
+
+    print(f"메시지 {args.messages}개, 스태프 {args.staff}명, 입력 {args.inputs}개 (µs/message)")
+    print(f"{'mix':<18}{'baseline loads':>16}{'json':>10}{'orjson':>10}")
+    rows = {mix: {"baseline": baseline_parse(mix, args.messages, args.inputs)} for mix in MIXES}
+    for codec_name in ("json", "orjson"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--messages", str(args.messages),
+             "--staff", str(args.staff), "--inputs", str(args.inputs)],
+            cwd=HERE, env={**os.environ, **BENCH_ADMISSION_ENV, "RELAY_JSON_CODEC": codec_name},
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        results = json.loads(output)
+        for mix in MIXES:
+            rows[mix][results["codec"]] = results[mix]
+
+    for mix, row in rows.items():
+        print(f"{mix:<18}{row['baseline']:>16.2f}{row.get('json', float('nan')):>10.2f}"
+              f"{row.get('orjson', float('nan')):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
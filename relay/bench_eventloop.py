@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+이벤트 루프별 팬아웃 지연 비교
+같은 릴레이를 RELAY_EVENT_LOOP=asyncio 와 uvloop 으로 각각 띄워 bench_relays 와 같은
+부하(세션당 PD 1명 + 스태프 M명, 세션당 --rate 컷/초)를 걸고, 컷이 스태프에게 도착하기까지의
+지연과 릴레이 CPU 사용량을 JSON 으로 출력한다. 부하 생성 프로세스는 두 경우 모두 기본
+asyncio 루프로 돌아서 릴레이 쪽 차이만 측정된다.
+
+uvloop 이 설치되어 있지 않으면 해당 항목은 skipped 로 표시한다.
+
+예: python bench_eventloop.py --relay relay_server --sessions 20 --staff 50 --rate 10 --duration 10
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+
+from bench_relays import RELAYS, measure
+
+LOOPS = ("asyncio", "uvloop")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan-out latency with and without uvloop")
+    parser.add_argument("--relay", choices=RELAYS, default="relay_server")
+    parser.add_argument("--loops", default=",".join(LOOPS), help="비교할 이벤트 루프 (쉼표 구분)")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--staff", type=int, default=50, help="세션당 스태프 수")
+    parser.add_argument("--rate", type=float, default=10.0, help="세션당 초당 컷 수")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=0.5, help="등록 후 컷 시작 전 대기 (초)")
+    parser.add_argument("--drain", type=float, default=1.0, help="마지막 컷 후 수신 대기 (초)")
+    parser.add_argument("--load-processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--output", help="결과 JSON 저장 경로 (없으면 표준 출력만)")
+    args = parser.parse_args()
+
+    results = []
+    for loop in args.loops.split(","):
+        if loop == "uvloop" and importlib.util.find_spec("uvloop") is None:
+            results.append({"relay": args.relay, "event_loop": loop, "skipped": "uvloop not installed"})
+            continue
+        result = measure(args.relay, args, {"RELAY_EVENT_LOOP": loop})
+        results.append({"event_loop": loop, **result})
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+유휴 연결당 메모리 측정
+릴레이를 기본 모드와 lean 모드(RELAY_MEMORY_MODE=lean)로 각각 띄우고, 세션마다
+스태프 --per-session 명씩 등록만 한 유휴 연결을 단계별(기본 10k/50k/100k)로 늘려 가며
+릴레이 프로세스의 RSS 와 연결당 증가량을 JSON 으로 출력한다.
+
+부하 측은 연결마다 websockets 객체를 만들지 않고 소켓에 핸드셰이크와 register 프레임만
+직접 쓴다. 루프백 한 주소의 임시 포트 수를 넘지 않도록 127.0.x.y 출발 주소를 나눠 쓰며,
+두 프로세스 모두 파일 디스크립터 한도를 hard limit 까지 올린다 (100k 측정에는
+ulimit -Hn 이 그 이상이어야 한다).
+
+예: python bench_memory.py --counts 10000,50000,100000 --modes default,lean
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench_relays import BENCH_JWT_SECRET, RELAYS, process_usage, register_message
+from bench_workers import BENCH_ADMISSION_ENV, free_port, wait_for_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 출발 주소 하나당 연결 수 (리눅스 기본 임시 포트 범위 약 28k 보다 작게)
+CONNECTIONS_PER_SOURCE = 20000
+
+HANDSHAKE = (
+    "GET / HTTP/1.1\r\n"
+    "Host: 127.0.0.1:{port}\r\n"
+    "Upgrade: websocket\r\n"
+    "Connection: Upgrade\r\n"
+    "Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+    "Sec-WebSocket-Version: 13\r\n"
+    # 브라우저처럼 압축 확장을 제안해야 기본 모드의 zlib 비용이 측정에 잡힌다
+    "Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n"
+    "\r\n"
+)
+
+# 릴레이 프로세스도 fd 한도를 올린 뒤 원래 스크립트를 실행
+SERVER_BOOTSTRAP = (
+    "import resource, runpy, sys; "
+    "soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE); "
+    "resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard)); "
+    "runpy.run_path(sys.argv[1], run_name='__main__')"
+)
+
+
+def raise_fd_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def text_frame(payload: str) -> bytes:
+    """마스킹된 텍스트 프레임 (마스크 키 0 → 본문은 그대로)"""
+    data = payload.encode("utf-8")
+    if len(data) < 126:
+        header = bytes([0x81, 0x80 | len(data)])
+    else:
+        header = bytes([0x81, 0x80 | 126]) + len(data).to_bytes(2, "big")
+    return header + b"\x00\x00\x00\x00" + data
+
+
+def open_idle_connection(port: int, index: int, register: bytes) -> socket.socket:
+    """핸드셰이크 후 register 만 보내고 그대로 두는 연결"""
+    source = index // CONNECTIONS_PER_SOURCE
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(10)
+    sock.bind((f"127.0.{source // 250}.{source % 250 + 1}", 0))
+    sock.connect(("127.0.0.1", port))
+    sock.sendall(HANDSHAKE.format(port=port).encode("ascii"))
+    response = b""
+    while b"\r\n\r\n" not in response:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("handshake closed")
+        response += chunk
+    if not response.startswith(b"HTTP/1.1 101"):
+        raise ConnectionError(response.split(b"\r\n", 1)[0].decode("latin-1"))
+    sock.sendall(register)
+    return sock
+
+
+def relay_connections(port: int) -> int:
+    """릴레이 /metrics 의 등록된 연결 수"""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=60) as response:
+        for line in response.read().decode("utf-8").splitlines():
+            if line.startswith("relay_connections "):
+                return int(line.split()[1])
+    raise RuntimeError("relay_connections metric not found")
+
+
+def measure(relay: str, mode: str, counts: list, args) -> dict:
+    port = free_port()
+    # 유휴 소켓은 ping 에 답하지 않으므로 측정 중 생존 확인으로 정리되지 않게 ping 을 끈다
+    env = {**os.environ, **BENCH_ADMISSION_ENV, "RELAY_PING_INTERVAL": "86400",
+           "RELAY_HOST": "127.0.0.1", "RELAY_PORT": str(port), "RELAY_MEMORY_MODE": mode}
+    if relay == "relay_server_secure":
+        env["JWT_SECRET"] = BENCH_JWT_SECRET
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_BOOTSTRAP, os.path.join(HERE, f"{relay}.py")],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sockets = []
+    checkpoints = []
+    baseline = None
+    try:
+        wait_for_port(port)
+        time.sleep(args.settle)
+        baseline = process_usage(process.pid)["rss_kb"]
+
+        # 세션별 register 프레임은 미리 만들어 재사용
+        registers = {}
+        for target in counts:
+            while len(sockets) < target:
+                index = len(sockets)
+                session = index // args.per_session
+                if session not in registers:
+                    registers[session] = text_frame(
+                        register_message(relay, f"idle-{session}", "staff", f"idle-{session}")
+                    )
+                sockets.append(open_idle_connection(port, index, registers[session]))
+            time.sleep(args.settle)
+            rss = process_usage(process.pid)["rss_kb"]
+            # 거절·정리된 연결이 있으면 연결당 메모리가 틀리게 나오므로 측정을 멈춘다
+            registered = relay_connections(port)
+            if registered != target:
+                raise RuntimeError(f"relay has {registered} registered connections, expected {target}")
+            checkpoints.append({
+                "connections": target,
+                "rss_kb": rss,
+                "bytes_per_connection": round((rss - baseline) * 1024 / target) if rss and baseline else None,
+            })
+    finally:
+        for sock in sockets:
+            sock.close()
+        process.terminate()
+        process.wait()
+
+    return {"relay": relay, "mode": mode, "baseline_rss_kb": baseline, "checkpoints": checkpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay RSS per idle connection")
+    parser.add_argument("--relay", choices=RELAYS, default="relay_server")
+    parser.add_argument("--counts", default="10000,50000,100000", help="측정할 연결 수 (쉼표 구분, 오름차순)")
+    parser.add_argument("--modes", default="default,lean")
+    parser.add_argument("--per-session", type=int, default=50, help="세션당 연결 수")
+    parser.add_argument("--settle", type=float, default=2.0, help="RSS 측정 전 대기 (초)")
+    args = parser.parse_args()
+
+    counts = sorted(int(count) for count in args.counts.split(","))
+    limit = raise_fd_limit()
+    if counts[-1] + 100 > limit:
+        sys.exit(f"fd hard limit {limit} 이 {counts[-1]} 연결에 부족합니다 (ulimit -Hn 확인)")
+
+    results = [measure(args.relay, mode, counts, args) for mode in args.modes.split(",")]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
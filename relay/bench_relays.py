@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Relay 부하·지연 벤치마크
+릴레이(relay_server / relay_server_secure / main)를 로컬에서 띄우고 세션 S개마다
+PD 1명과 스태프 M명을 붙인다. PD 는 세션당 --rate 회/초로 컷(program 변경)을 보내고,
+스태프가 해당 컷을 받기까지의 지연(p50/p99/max), 초당 전달 메시지 수, 릴레이 프로세스의
+CPU 사용 시간과 RSS 를 JSON 으로 출력한다. 결과 파일을 남겨 구현 간·커밋 간 회귀 비교에 쓴다.
+
+예: python bench_relays.py --relay all --sessions 10 --staff 20 --rate 5 --duration 10 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import websockets
+
+from bench_workers import BENCH_ADMISSION_ENV, free_port, wait_for_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+RELAYS = ("relay_server", "relay_server_secure", "main")
+
+# 컷마다 program 값을 고유하게 만들어 수신 측이 송신 시각을 찾을 수 있게 한다
+PROGRAM_STRIDE = 1_000_000
+
+BENCH_JWT_SECRET = "bench-secret"
+
+
+def bench_token(user_id: str, is_pd: bool) -> str:
+    import jwt
+    payload = {"userId": user_id, "isPD": is_pd, "exp": int(time.time()) + 3600}
+    return jwt.encode(payload, BENCH_JWT_SECRET, algorithm="HS256")
+
+
+def tally_inputs(count: int) -> dict:
+    """컷 메시지에 실을 입력 목록 (vMix 입력 count 개 분량)"""
+    return {
+        str(number): {"name": f"Camera {number}", "type": "Capture", "state": "Running", "muted": False}
+        for number in range(1, count + 1)
+    }
+
+
+def register_message(relay: str, session_id: str, role: str, user_id: str) -> str:
+    message = {"type": "register", "sessionId": session_id, "role": role}
+    if relay == "relay_server_secure":
+        message["token"] = bench_token(user_id, role == "pd")
+    return json.dumps(message)
+
+
+def process_usage(pid: int) -> dict:
+    """/proc 에서 CPU 사용 시간(초)과 RSS(KB) 읽기 (Linux 외에서는 None)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return {"cpu_seconds": None, "rss_kb": None}
+    ticks = os.sysconf("SC_CLK_TCK")
+    # utime, stime 는 ')' 뒤 12, 13 번째 필드
+    return {"cpu_seconds": (int(fields[11]) + int(fields[12])) / ticks, "rss_kb": rss}
+
+
+async def run_session(relay: str, url: str, index: int, args, sent_at: dict, latencies: list, received: list):
+    """세션 하나: 스태프 등록 후 PD 가 일정 간격으로 컷 전송"""
+    session_id = f"bench-{index}"
+    registered = 0 if relay == "main" else 1
+
+    async def connect(role: str, user_id: str):
+        websocket = await websockets.connect(url, max_queue=None)
+        await websocket.send(register_message(relay, session_id, role, user_id))
+        # main.py 는 등록 응답이 없다
+        for _ in range(registered):
+            await websocket.recv()
+        return websocket
+
+    async def listen(websocket):
+        try:
+            async for message in websocket:
+                arrived = time.monotonic()
+                received[0] += 1
+                # 컷 확인용 필드만 필요하므로 tally 메시지만 파싱
+                if '"program"' not in message:
+                    continue
+                program = json.loads(message).get("program")
+                if not isinstance(program, int) or program // PROGRAM_STRIDE != index:
+                    continue
+                started = sent_at.get(program)
+                if started is not None:
+                    latencies.append(arrived - started)
+        except websockets.ConnectionClosed:
+            pass
+
+    staff = [await connect("staff", f"staff-{index}-{n}") for n in range(args.staff)]
+    listeners = [asyncio.ensure_future(listen(websocket)) for websocket in staff]
+    pd = await connect("pd", f"pd-{index}")
+    await asyncio.sleep(args.warmup)
+
+    inputs = tally_inputs(getattr(args, "inputs", 0))
+    interval = 1.0 / args.rate
+    next_cut = time.monotonic()
+    deadline = next_cut + args.duration
+    cut = 0
+    while next_cut < deadline:
+        cut += 1
+        program = index * PROGRAM_STRIDE + cut
+        sent_at[program] = time.monotonic()
+        await pd.send(json.dumps({"type": "tally_update", "program": program, "preview": 0, "inputs": inputs}))
+        next_cut += interval
+        await asyncio.sleep(max(0.0, next_cut - time.monotonic()))
+
+    await asyncio.sleep(args.drain)
+    for websocket in staff + [pd]:
+        await websocket.close()
+    for listener in listeners:
+        listener.cancel()
+    return cut
+
+
+def load_process(relay: str, port: int, indexes: list, args, result_queue):
+    """부하 생성 프로세스: 맡은 세션들을 돌리고 (컷 수, 수신 수, 지연 목록) 반환"""
+    sent_at: dict = {}
+    latencies: list = []
+    received = [0]
+
+    async def run():
+        url = f"ws://127.0.0.1:{port}"
+        return await asyncio.gather(*[
+            run_session(relay, url, index, args, sent_at, latencies, received) for index in indexes
+        ])
+
+    cuts = sum(asyncio.run(run()))
+    result_queue.put((cuts, received[0], latencies))
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(relay: str, args, extra_env: dict = None) -> dict:
+    """릴레이 하나를 띄워 측정 (extra_env 는 릴레이 프로세스에만 적용)"""
+    port = free_port()
+    env = {**os.environ, **BENCH_ADMISSION_ENV, "RELAY_HOST": "127.0.0.1", "RELAY_PORT": str(port),
+           **(extra_env or {})}
+    if relay == "relay_server_secure":
+        env["JWT_SECRET"] = BENCH_JWT_SECRET
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, f"{relay}.py")],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port)
+        before = process_usage(process.pid)
+
+        context = multiprocessing.get_context("spawn")
+        result_queue = context.Queue()
+        shares = [list(range(args.sessions))[i::args.load_processes] for i in range(args.load_processes)]
+        workers = [
+            context.Process(target=load_process, args=(relay, port, share, args, result_queue))
+            for share in shares if share
+        ]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        results = [result_queue.get() for _ in workers]
+        elapsed = time.monotonic() - started
+        for worker in workers:
+            worker.join()
+
+        after = process_usage(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    cuts = sum(result[0] for result in results)
+    received = sum(result[1] for result in results)
+    latencies = [latency for result in results for latency in result[2]]
+    cpu_seconds = None
+    if before["cpu_seconds"] is not None and after["cpu_seconds"] is not None:
+        cpu_seconds = round(after["cpu_seconds"] - before["cpu_seconds"], 3)
+
+    return {
+        "relay": relay,
+        "sessions": args.sessions,
+        "staff_per_session": args.staff,
+        "cut_rate_per_session": args.rate,
+        "duration": args.duration,
+        "cuts_sent": cuts,
+        "cut_deliveries": len(latencies),
+        "expected_deliveries": cuts * args.staff,
+        "messages_received": received,
+        "messages_per_sec": round(received / args.duration, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(max(latencies) * 1000, 3) if latencies else None,
+        },
+        "relay_cpu_seconds": cpu_seconds,
+        "relay_cpu_percent": round(cpu_seconds / elapsed * 100, 1) if cpu_seconds is not None else None,
+        "relay_rss_kb": after["rss_kb"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay load and cut-to-delivery latency benchmark")
+    parser.add_argument("--relay", choices=RELAYS + ("all",), default="all")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--staff", type=int, default=20, help="세션당 스태프 수")
+    parser.add_argument("--rate", type=float, default=5.0, help="세션당 초당 컷 수")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--inputs", type=int, default=0, help="컷 메시지에 넣을 입력 수 (프레임 크기)")
+    parser.add_argument("--warmup", type=float, default=0.5, help="등록 후 컷 시작 전 대기 (초)")
+    parser.add_argument("--drain", type=float, default=1.0, help="마지막 컷 후 수신 대기 (초)")
+    parser.add_argument("--load-processes", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--output", help="결과 JSON 저장 경로 (없으면 표준 출력만)")
+    args = parser.parse_args()
+
+    relays = RELAYS if args.relay == "all" else (args.relay,)
+    results = [measure(relay, args) for relay in relays]
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
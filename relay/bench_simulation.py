@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+네트워크 없이 측정하는 핸들러 CPU 벤치마크
+simulation.Simulation 으로 릴레이 서버를 메모리 연결·가상 시계 위에 띄워 세션 S개마다
+PD 1명과 스태프 M명을 붙이고, 세션마다 --cuts 번 컷을 보낸다. 소켓·커널 비용이 빠진
+메시지 처리(파싱, 상태 갱신, 인코딩, 팬아웃) CPU 시간만 ms/컷 으로 출력하고, 핸들러별
+누적 시간도 함께 보여 준다. 결과는 매 실행 같은 순서로 처리되므로 커밋 간 비교에 쓴다.
+
+예: python bench_simulation.py --sessions 10 --staff 1000 --cuts 50 --inputs 20
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from bench_relays import BENCH_JWT_SECRET, bench_token, tally_inputs
+from simulation import Simulation
+
+RELAYS = ("relay_server", "relay_server_secure")
+
+
+def server_factory(relay: str):
+    """relay_server_secure 는 import 시점에 JWT_SECRET 을 읽으므로 필요할 때 가져온다"""
+    if relay == "relay_server_secure":
+        os.environ.setdefault("JWT_SECRET", BENCH_JWT_SECRET)
+        from relay_server_secure import SecureRelayServer
+        return SecureRelayServer
+    from relay_server import RelayServer
+    return RelayServer
+
+
+def register_fields(relay: str, user_id: str, is_pd: bool) -> dict:
+    return {"token": bench_token(user_id, is_pd)} if relay == "relay_server_secure" else {}
+
+
+def measure(args) -> dict:
+    sim = Simulation(server_factory(args.relay), seed=args.seed)
+
+    async def run():
+        staff, pds = [], []
+        for index in range(args.sessions):
+            session_id = f"bench-{index}"
+            for n in range(args.staff):
+                staff.append(await sim.client(session_id, "staff", keep_messages=False,
+                                              **register_fields(args.relay, f"staff-{index}-{n}", False)))
+            pds.append(await sim.client(session_id, "pd", keep_messages=False,
+                                        **register_fields(args.relay, f"pd-{index}", True)))
+        registered_at = sim.elapsed
+        before = sum(connection.received for connection in staff)
+
+        inputs = tally_inputs(args.inputs)
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for cut in range(1, args.cuts + 1):
+            for pd in pds:
+                await pd.send(json.dumps({"type": "tally_update", "program": cut, "preview": 0, "inputs": inputs}))
+            # 컷 간격만큼 가상 시간을 넘겨 묶음 처리 창이 닫히게 한다
+            await asyncio.sleep(1.0 / args.rate)
+        cpu_seconds = time.process_time() - cpu_started
+        wall_seconds = time.perf_counter() - wall_started
+        return registered_at, before, sum(connection.received for connection in staff), cpu_seconds, wall_seconds
+
+    try:
+        registered_at, before, after, cpu_seconds, wall_seconds = sim.run(run())
+        # close() 가 남은 연결을 정리하며 handle_disconnect 가 불리기 전에 읽는다
+        handlers = {
+            name: {"count": histogram.count, "seconds": round(histogram.sum, 4)}
+            for name, histogram in sim.server.timings.durations.items()
+        }
+    finally:
+        sim.close()
+
+    cuts = args.cuts * args.sessions
+    return {
+        "relay": args.relay,
+        "sessions": args.sessions,
+        "staff_per_session": args.staff,
+        "connections": args.sessions * (args.staff + 1),
+        "inputs_per_cut": args.inputs,
+        "cuts_sent": cuts,
+        "cut_deliveries": after - before,
+        "expected_deliveries": cuts * args.staff,
+        "virtual_seconds_to_register": round(registered_at, 3),
+        "cpu_seconds": round(cpu_seconds, 3),
+        "cpu_ms_per_cut": round(cpu_seconds * 1000 / cuts, 3) if cuts else None,
+        "wall_seconds": round(wall_seconds, 3),
+        "handlers": handlers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process handler CPU benchmark on memory connections")
+    parser.add_argument("--relay", choices=RELAYS, default="relay_server")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--staff", type=int, default=1000, help="세션당 스태프 수")
+    parser.add_argument("--cuts", type=int, default=20, help="세션당 컷 수")
+    parser.add_argument("--rate", type=float, default=5.0, help="세션당 초당 컷 수 (가상 시간)")
+    parser.add_argument("--inputs", type=int, default=0, help="컷 메시지에 넣을 입력 수 (프레임 크기)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="결과 JSON 저장 경로 (없으면 표준 출력만)")
+    args = parser.parse_args()
+
+    # 연결 수만큼 찍히는 등록 로그는 측정을 흐린다
+    logging.disable(logging.INFO)
+    report = json.dumps(measure(args), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+워커 수별 Relay 처리량 비교
+workers.py 를 워커 1개와 N개로 각각 띄우고, 세션마다 PD 1명과 스태프 M명을 붙여
+PD 가 최대 속도로 컷을 보내는 동안 스태프가 받은 탈리 메시지 수(초당)를 잰다.
+부하 생성기도 여러 프로세스로 나눠 돌려야 릴레이가 병목이 된다.
+
+예: python bench_workers.py --workers 4 --sessions 40 --staff 50 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 벤치마크 부하는 모두 127.0.0.1 한 주소에서 오므로 릴레이의 주소별 연결 한도와 등록 토큰 버킷을
+# 풀어 둔다 (그대로 두면 256 연결에서 1013 으로 거절되거나 버킷 대기 시간을 재게 된다)
+BENCH_ADMISSION_ENV = {
+    "RELAY_MAX_CONNECTIONS_PER_IP": "0",
+    "RELAY_ADMISSION_RATE": "1000000000",
+    "RELAY_ADMISSION_BURST": "1000000000",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"relay did not start on port {port}")
+
+
+async def run_session(url: str, session_id: str, staff_count: int, duration: float, received: list):
+    """세션 하나: 스태프 등록 후 PD 가 duration 동안 컷 전송"""
+    staff = []
+    for _ in range(staff_count):
+        websocket = await websockets.connect(url, max_queue=None)
+        await websocket.send(json.dumps({"type": "register", "sessionId": session_id, "role": "staff", "delta": True}))
+        await websocket.recv()
+        staff.append(websocket)
+
+    async def count(websocket):
+        try:
+            async for _ in websocket:
+                received[0] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    counters = [asyncio.ensure_future(count(websocket)) for websocket in staff]
+
+    pd = await websockets.connect(url)
+    await pd.send(json.dumps({"type": "register", "sessionId": session_id, "role": "pd"}))
+    await pd.recv()
+    await asyncio.sleep(0.5)
+
+    deadline = time.monotonic() + duration
+    program = 0
+    while time.monotonic() < deadline:
+        program = program % 8 + 1
+        await pd.send(json.dumps({"type": "tally_update", "program": program, "preview": 9, "inputs": {}}))
+        await asyncio.sleep(0)
+
+    await asyncio.sleep(0.5)
+    for websocket in staff + [pd]:
+        await websocket.close()
+    for counter in counters:
+        counter.cancel()
+
+
+def load_process(port: int, session_ids: list, staff_count: int, duration: float, result_queue):
+    """부하 생성 프로세스"""
+    received = [0]
+
+    async def run():
+        url = f"ws://127.0.0.1:{port}"
+        await asyncio.gather(*[
+            run_session(url, session_id, staff_count, duration, received) for session_id in session_ids
+        ])
+
+    asyncio.run(run())
+    result_queue.put(received[0])
+
+
+def measure(workers: int, args) -> dict:
+    """워커 workers 개로 릴레이를 띄우고 처리량 측정"""
+    port = free_port()
+    ipc_dir = tempfile.mkdtemp(prefix="relay-bench-")
+    relay = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "workers.py"), "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port), "--ipc-dir", ipc_dir],
+        cwd=HERE, env={**os.environ, **BENCH_ADMISSION_ENV}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port)
+        time.sleep(0.5)
+
+        context = multiprocessing.get_context("spawn")
+        result_queue = context.Queue()
+        session_ids = [f"bench-{i}" for i in range(args.sessions)]
+        shares = [session_ids[i::args.load_processes] for i in range(args.load_processes)]
+        processes = [
+            context.Process(target=load_process, args=(port, share, args.staff, args.duration, result_queue))
+            for share in shares if share
+        ]
+        for process in processes:
+            process.start()
+        delivered = sum(result_queue.get() for _ in processes)
+        for process in processes:
+            process.join()
+    finally:
+        relay.terminate()
+        relay.wait()
+
+    return {
+        "workers": workers,
+        "delivered": delivered,
+        "delivered_per_sec": round(delivered / args.duration, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay throughput: 1 worker vs N workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--staff", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--load-processes", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    results = [measure(1, args)]
+    if args.workers > 1:
+        results.append(measure(args.workers, args))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
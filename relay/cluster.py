@@ -0,0 +1,361 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# IPC 프레임 길이 접두사
+_LENGTH = struct.Struct("!I")
+
+# 다른 워커 소켓 연결 재시도
+CONNECT_RETRIES = 20
+CONNECT_RETRY_DELAY = 0.1
+
+# 소유 노드의 PD 등록 허락을 기다리는 최대 시간 (초). 넘기면 등록을 거절한다
+PD_CLAIM_TIMEOUT = float(os.environ.get("RELAY_PD_CLAIM_TIMEOUT", "2"))
+
+
+@dataclass
+class ClusterStats:
+    """노드 간 전달 통계"""
+    forwarded_updates: int = 0  # 소유 노드로 넘긴 PD 업데이트
+    published_states: int = 0   # 구독 노드로 보낸 상태 메시지
+    received: int = 0           # 다른 노드에서 받은 메시지
+    send_failures: int = 0
+    pd_claims_refused: int = 0  # 다른 PD 가 있어 거절한 PD 등록
+    pd_claim_timeouts: int = 0  # 소유 노드 응답이 없어 거절한 PD 등록
+    rejected_updates: int = 0   # 세션 PD 가 아닌 연결에서 온 업데이트
+    lost_nodes: int = 0         # 연결 끊김·전송 실패로 구독을 정리한 횟수
+
+
+def session_owner(session_id: str, nodes: List[str]) -> str:
+    """세션 ID 해시로 세션 상태를 소유할 노드 결정 (프로세스가 달라도 같은 결과)"""
+    return nodes[zlib.crc32(session_id.encode("utf-8")) % len(nodes)]
+
+
+class UnixSocketTransport:
+    """같은 호스트의 워커끼리 Unix 소켓으로 길이 접두사 프레임을 주고받는 전송 계층
+
+    노드마다 보내는 연결을 하나씩 열고, 그 연결이 끊기면 on_peer_lost 로 알린다.
+    """
+
+    def __init__(self, ipc_dir: str, node_id: str):
+        self.ipc_dir = ipc_dir
+        self.node_id = node_id
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.writers: Dict[str, asyncio.StreamWriter] = {}
+        self.connecting: Dict[str, asyncio.Lock] = {}
+        self.watchers: Dict[str, asyncio.Task] = {}
+        self.on_peer_lost: Optional[Callable[[str], None]] = None
+
+    def path_of(self, node_id: str) -> str:
+        """노드의 Unix 소켓 경로"""
+        return os.path.join(self.ipc_dir, f"relay-{node_id}.sock")
+
+    async def start(self, on_message: Callable[[bytes], Awaitable[None]],
+                    on_peer_lost: Optional[Callable[[str], None]] = None):
+        """자기 노드의 수신 소켓 열기"""
+        self.on_peer_lost = on_peer_lost
+        os.makedirs(self.ipc_dir, exist_ok=True)
+        path = self.path_of(self.node_id)
+        if os.path.exists(path):
+            os.unlink(path)
+
+        async def handle_peer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while True:
+                    header = await reader.readexactly(_LENGTH.size)
+                    (length,) = _LENGTH.unpack(header)
+                    payload = await reader.readexactly(length)
+                    # 메시지 하나의 처리 오류로 워커 간 연결 전체가 끊기지 않게 한다
+                    try:
+                        await on_message(payload)
+                    except Exception as e:
+                        logging.error(f"노드 간 메시지 처리 오류: {e!r}")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        self.server = await asyncio.start_unix_server(handle_peer, path=path)
+
+    async def send(self, node_id: str, payload: bytes):
+        """노드로 프레임 전송 (쓰기 버퍼에 기록만 하고 drain 을 기다리지 않음)"""
+        writer = self.writers.get(node_id)
+        if writer is None or writer.is_closing():
+            writer = await self._connect(node_id)
+        writer.write(_LENGTH.pack(len(payload)) + payload)
+
+    async def _connect(self, node_id: str) -> asyncio.StreamWriter:
+        """노드로의 연결을 한 번만 열도록 잠금 후 연결"""
+        lock = self.connecting.setdefault(node_id, asyncio.Lock())
+        async with lock:
+            writer = self.writers.get(node_id)
+            if writer is not None and not writer.is_closing():
+                return writer
+            # 워커가 동시에 뜨는 중이면 상대 소켓이 아직 없을 수 있어 잠시 재시도
+            for attempt in range(CONNECT_RETRIES):
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.path_of(node_id))
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if attempt == CONNECT_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(CONNECT_RETRY_DELAY)
+            self.writers[node_id] = writer
+            self.watchers[node_id] = asyncio.ensure_future(self._watch(node_id, reader, writer))
+            return writer
+
+    async def _watch(self, node_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """상대 노드는 이 연결로 보내지 않으므로 EOF 는 상대가 닫혔다(종료·충돌)는 뜻"""
+        try:
+            await reader.read()
+        except ConnectionError:
+            pass
+        if self.writers.get(node_id) is not writer:
+            return
+        del self.writers[node_id]
+        self.watchers.pop(node_id, None)
+        writer.close()
+        logging.warning(f"노드 {node_id} 연결 끊김")
+        if self.on_peer_lost is not None:
+            self.on_peer_lost(node_id)
+
+    async def close(self):
+        """수신 소켓과 모든 연결 닫기"""
+        for watcher in self.watchers.values():
+            watcher.cancel()
+        self.watchers.clear()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class RelayCluster:
+    """여러 릴레이 노드 사이의 세션 소유권과 상태 전달
+
+    세션 상태는 session_owner 로 정해진 노드 하나만 갱신한다. 다른 노드에 붙은 PD 의
+    업데이트는 소유 노드로 전달되고, 소유 노드는 seq 를 매긴 상태를 해당 세션의
+    멤버가 있는 노드마다 한 번씩 보낸다. 각 노드는 받은 상태를 자기 클라이언트에게
+    한 번 인코딩해서 팬아웃한다.
+
+    세션당 PD 하나 규칙도 소유 노드가 지킨다. PD 등록은 소유 노드에 claim_pd 로 허락을
+    받아야 하고, 소유 노드는 허락한 PD 의 업데이트만 반영한다.
+    """
+
+    def __init__(self, node_id: str, nodes: List[str], transport):
+        self.node_id = node_id
+        self.nodes = nodes
+        self.transport = transport
+        self.server = None
+        # 소유 노드 측: 세션별 멤버가 있는 다른 노드
+        self.subscribers: Dict[str, Set[str]] = {}
+        # 소유 노드 측: 세션별 PD 를 가진 (노드, claim)
+        self.pd_holders: Dict[str, Tuple[str, str]] = {}
+        # 요청 노드 측: 응답을 기다리는 claim_pd 요청
+        self.pending_claims: Dict[str, asyncio.Future] = {}
+        self._counter = itertools.count(1)
+        self.stats = ClusterStats()
+
+    def attach(self, server):
+        """RelayServer 연결"""
+        self.server = server
+
+    async def start(self):
+        await self.transport.start(self.handle_payload, self.node_lost)
+
+    async def close(self):
+        await self.transport.close()
+
+    def owner_of(self, session_id: str) -> str:
+        return session_owner(session_id, self.nodes)
+
+    def is_owner(self, session_id: str) -> bool:
+        return self.owner_of(session_id) == self.node_id
+
+    def has_subscribers(self, session_id: str) -> bool:
+        return bool(self.subscribers.get(session_id))
+
+    @property
+    def session_channels(self) -> bool:
+        """전송 계층이 세션 채널 발행(pub/sub)을 지원하는지 여부"""
+        return getattr(self.transport, "session_channels", False)
+
+    async def join(self, session_id: str):
+        """이 노드에 세션의 첫 멤버가 생겼을 때 소유 노드에 구독 요청"""
+        if not self.is_owner(session_id):
+            if self.session_channels:
+                await self.transport.subscribe_session(session_id)
+            await self._send(self.owner_of(session_id), {
+                "op": "subscribe", "session": session_id, "node": self.node_id
+            })
+
+    async def leave(self, session_id: str):
+        """이 노드에서 세션의 마지막 멤버가 나갔을 때 구독 해제"""
+        if not self.is_owner(session_id):
+            if self.session_channels:
+                await self.transport.unsubscribe_session(session_id)
+            await self._send(self.owner_of(session_id), {
+                "op": "unsubscribe", "session": session_id, "node": self.node_id
+            })
+
+    async def forward_update(self, session_id: str, message: Dict, claim: Optional[str]):
+        """PD 업데이트를 소유 노드로 전달"""
+        self.stats.forwarded_updates += 1
+        await self._send(self.owner_of(session_id), {
+            "op": "update", "session": session_id, "claim": claim, "message": message
+        })
+
+    def node_lost(self, node_id: str):
+        """다른 노드와의 연결이 끊기거나 전송이 실패하면 그 노드의 구독과 PD 자리를 정리
+
+        충돌한 노드가 unsubscribe 를 보내지 못해도 세션이 정리되고 상태를 더 보내지 않는다.
+        노드가 다시 뜨면 세션 멤버가 생길 때 다시 구독한다.
+        """
+        if node_id == self.node_id:
+            return
+        for session_id in [s for s, nodes in self.subscribers.items() if node_id in nodes]:
+            self._remove_subscriber(session_id, node_id)
+        for session_id in [s for s, holder in self.pd_holders.items() if holder[0] == node_id]:
+            del self.pd_holders[session_id]
+        self.stats.lost_nodes += 1
+
+    def _remove_subscriber(self, session_id: str, node_id: str):
+        nodes = self.subscribers.get(session_id)
+        if nodes is not None:
+            nodes.discard(node_id)
+            if not nodes:
+                del self.subscribers[session_id]
+        self.server.drop_session_if_idle(session_id)
+
+    def new_claim(self) -> str:
+        """PD 연결 하나를 가리키는 클러스터 내 고유 id"""
+        return f"{self.node_id}:{next(self._counter)}"
+
+    async def claim_pd(self, session_id: str, claim: str, takeover: bool = False) -> bool:
+        """소유 노드에 PD 등록 허락 요청 (takeover 는 같은 노드의 resume 재접속)"""
+        owner = self.owner_of(session_id)
+        if owner == self.node_id:
+            return self._arbitrate_pd(session_id, self.node_id, claim, takeover)
+        request = self.new_claim()
+        future = asyncio.get_running_loop().create_future()
+        self.pending_claims[request] = future
+        try:
+            await self._send(owner, {
+                "op": "claim_pd", "session": session_id, "node": self.node_id,
+                "claim": claim, "takeover": takeover, "request": request
+            })
+            return await asyncio.wait_for(future, PD_CLAIM_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats.pd_claim_timeouts += 1
+            logging.warning(f"세션 {session_id} PD 등록: 소유 노드 {owner} 응답 없음")
+            return False
+        finally:
+            self.pending_claims.pop(request, None)
+
+    async def release_pd(self, session_id: str, claim: str):
+        """PD 연결이 끊겼을 때 소유 노드의 PD 자리 반납"""
+        if self.is_owner(session_id):
+            self._release_pd(session_id, claim)
+        else:
+            await self._send(self.owner_of(session_id), {"op": "release_pd", "session": session_id, "claim": claim})
+
+    def accepts_update(self, session_id: str, claim: Optional[str]) -> bool:
+        """소유 노드 측: 업데이트가 현재 세션 PD 에게서 왔는지"""
+        holder = self.pd_holders.get(session_id)
+        if holder is not None and holder[1] == claim:
+            return True
+        self.stats.rejected_updates += 1
+        return False
+
+    def _arbitrate_pd(self, session_id: str, node_id: str, claim: str, takeover: bool) -> bool:
+        # resume 토큰은 노드 로컬이라 takeover 는 이전 PD 가 붙은 노드에서만 오고, 이전 연결은 그 노드가 닫는다
+        holder = self.pd_holders.get(session_id)
+        if holder is not None and holder[1] != claim and not (takeover and holder[0] == node_id):
+            self.stats.pd_claims_refused += 1
+            return False
+        self.pd_holders[session_id] = (node_id, claim)
+        return True
+
+    def _release_pd(self, session_id: str, claim: str):
+        holder = self.pd_holders.get(session_id)
+        if holder is not None and holder[1] == claim:
+            del self.pd_holders[session_id]
+
+    async def publish_state(self, session, delta: Optional[Dict], nodes: Optional[Set[str]] = None):
+        """소유 노드에서 갱신된 상태를 구독 노드에 전달 (노드당 한 번, 인코딩은 한 번)"""
+        targets = nodes if nodes is not None else self.subscribers.get(session.session_id)
+        if not targets:
+            return
+        payload = json.dumps({
+            "op": "state",
+            "session": session.session_id,
+            "seq": session.seq,
+            "state": session.tally_state,
+            "delta": delta
+        }).encode("utf-8")
+        if nodes is None and self.session_channels:
+            # 세션 채널에 한 번 발행하면 백플레인이 구독 노드마다 전달
+            self.stats.published_states += 1
+            try:
+                await self.transport.publish_session(session.session_id, payload)
+            except Exception as e:
+                self.stats.send_failures += 1
+                logging.warning(f"세션 {session.session_id} 상태 발행 실패: {e}")
+            return
+        for node_id in list(targets):
+            self.stats.published_states += 1
+            await self._send_raw(node_id, payload)
+
+    async def handle_payload(self, payload: bytes):
+        """다른 노드에서 온 메시지 처리"""
+        self.stats.received += 1
+        data = json.loads(payload)
+        op = data.get("op")
+        session_id = data.get("session")
+
+        if op == "subscribe":
+            self.subscribers.setdefault(session_id, set()).add(data["node"])
+            session = self.server.ensure_session(session_id)
+            if session.seq:
+                await self.publish_state(session, None, {data["node"]})
+        elif op == "unsubscribe":
+            self._remove_subscriber(session_id, data["node"])
+        elif op == "update":
+            if not self.accepts_update(session_id, data.get("claim")):
+                return
+            session = self.server.ensure_session(session_id)
+            await self.server.apply_tally_update(session, data["message"])
+        elif op == "claim_pd":
+            granted = self._arbitrate_pd(session_id, data["node"], data["claim"], data.get("takeover", False))
+            await self._send(data["node"], {"op": "claim_pd_result", "request": data["request"], "granted": granted})
+        elif op == "claim_pd_result":
+            future = self.pending_claims.get(data["request"])
+            if future is not None and not future.done():
+                future.set_result(bool(data["granted"]))
+        elif op == "release_pd":
+            self._release_pd(session_id, data["claim"])
+        elif op == "state":
+            await self.server.apply_remote_state(
+                session_id, data["seq"], data["state"], data.get("delta")
+            )
+        else:
+            logging.warning(f"알 수 없는 클러스터 메시지: {op}")
+
+    async def _send(self, node_id: str, data: Dict):
+        await self._send_raw(node_id, json.dumps(data).encode("utf-8"))
+
+    async def _send_raw(self, node_id: str, payload: bytes):
+        try:
+            await self.transport.send(node_id, payload)
+        except Exception as e:
+            self.stats.send_failures += 1
+            logging.warning(f"노드 {node_id} 전송 실패: {e}")
+            self.node_lost(node_id)
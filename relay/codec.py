@@ -0,0 +1,53 @@
+import json
+import os
+import re
+from typing import Optional
+
+# RELAY_JSON_CODEC=json 이면 orjson 이 설치되어 있어도 표준 json 사용
+_PREFERRED = os.environ.get("RELAY_JSON_CODEC", "orjson")
+
+# 이 길이 이하의 메시지만 type 을 엿보고 전체 파싱을 건너뛸 수 있다
+PEEK_LIMIT = 128
+
+_TYPE_PATTERN = re.compile(r'"type"\s*:\s*"([A-Za-z_]+)"')
+
+try:
+    if _PREFERRED != "orjson":
+        raise ImportError
+    import orjson
+
+    CODEC_NAME = "orjson"
+    DecodeError = orjson.JSONDecodeError
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj) -> str:
+        """JSON 텍스트로 인코딩 (텍스트 프레임으로 보내므로 str 반환)"""
+        return orjson.dumps(obj, option=_OPTIONS).decode("utf-8")
+
+    def loads(data):
+        return orjson.loads(data)
+except ImportError:
+    CODEC_NAME = "json"
+    DecodeError = json.JSONDecodeError
+
+    def dumps(obj) -> str:
+        """JSON 텍스트로 인코딩"""
+        return json.dumps(obj)
+
+    def loads(data):
+        return json.loads(data)
+
+
+def peek_type(message) -> Optional[str]:
+    """작은 텍스트 메시지에서 JSON 파싱 없이 type 값만 추출
+
+    필드가 몇 개 없는 제어 메시지(ping 등)용이다. 큰 메시지나 바이너리는 None 을
+    돌려주며, 이 경우 호출 측은 전체 파싱으로 넘어가야 한다.
+    """
+    if not isinstance(message, str) or len(message) > PEEK_LIMIT:
+        return None
+    # 중첩 객체의 type 을 잘못 읽지 않도록 "type" 키가 하나뿐인 메시지만 처리
+    if message.count('"type"') != 1:
+        return None
+    match = _TYPE_PATTERN.search(message)
+    return match.group(1) if match else None
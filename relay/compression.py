@@ -0,0 +1,199 @@
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import prepare_data
+
+# 송신 압축 정책
+#   default    websockets 기본 permessage-deflate (연결마다 압축)
+#   off        압축 협상 안 함
+#   threshold  기본 협상 + COMPRESSION_MIN_SIZE 보다 작은 프레임과 압축 끈 역할은 압축하지 않고 보냄
+#   shared     threshold + server_no_context_takeover 로 협상해 브로드캐스트 프레임을 한 번만 압축해
+#              창 크기가 같은 수신자 전원에게 같은 바이트를 쓴다
+COMPRESSION_MODE = os.environ.get("RELAY_COMPRESSION", "default")
+COMPRESSION_MODES = ("default", "off", "threshold", "shared")
+# 이 크기(바이트)보다 작은 프레임은 압축하지 않는다 (deflate 헤더·블록 비용이 이득보다 큼)
+COMPRESSION_MIN_SIZE = int(os.environ.get("RELAY_COMPRESSION_MIN_SIZE", "256"))
+# 역할별 최소 크기. 예: "camera=off,viewer=1024,pd=0" (off 는 압축 안 함)
+COMPRESSION_ROLES = os.environ.get("RELAY_COMPRESSION_ROLES", "")
+
+# websockets 기본 설정과 같은 창 크기·메모리 레벨
+COMPRESSION_WINDOW_BITS = 12
+COMPRESSION_MEM_LEVEL = 5
+
+_EMPTY_UNCOMPRESSED_BLOCK = b"\x00\x00\xff\xff"
+
+
+def server_frame(opcode: int, payload: bytes, compressed: bool = False) -> bytes:
+    """마스크 없는 단일 서버 프레임 직렬화
+
+    Frame.serialize 는 확장을 거치지 않은 RSV1 을 거부하므로 이미 압축한 payload 는 직접 쓴다.
+    """
+    head1 = 0b10000000 | (0b01000000 if compressed else 0) | opcode
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", head1, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", head1, 126, length)
+    else:
+        header = struct.pack("!BBQ", head1, 127, length)
+    return header + payload
+
+
+@dataclass
+class CompressionStats:
+    """송신 압축 통계"""
+    shared_compressions: int = 0  # 브로드캐스트당 한 번 압축한 횟수
+    shared_frames: int = 0        # 공유 압축 프레임을 쓴 연결 수 (압축한 첫 연결 포함)
+    uncompressed_frames: int = 0  # 크기·역할 기준으로 압축하지 않고 보낸 프레임
+    per_connection_frames: int = 0  # 연결별 확장 압축으로 넘긴 프레임
+    bytes_in: int = 0             # 공유 압축 전 바이트
+    bytes_out: int = 0            # 공유 압축 후 바이트
+
+
+def parse_role_sizes(value: str) -> Dict[str, Optional[int]]:
+    """RELAY_COMPRESSION_ROLES 파싱 (역할 → 최소 크기, 압축 안 함이면 None)"""
+    sizes: Dict[str, Optional[int]] = {}
+    for item in value.split(","):
+        role, _, size = item.strip().partition("=")
+        if not role or not size:
+            continue
+        size = size.strip().lower()
+        if size == "off":
+            sizes[role.strip()] = None
+        elif size == "on":
+            sizes[role.strip()] = 0
+        else:
+            try:
+                sizes[role.strip()] = int(size)
+            except ValueError:
+                logging.warning(f"잘못된 RELAY_COMPRESSION_ROLES 항목 무시: {item}")
+    return sizes
+
+
+def serve_options(limits: Dict, mode: str = COMPRESSION_MODE) -> Dict:
+    """connection_limits() 에 압축 모드의 websockets.serve 인자를 합친다
+
+    default 외의 모드를 지정하면 lean 모드의 compression=None 보다 우선한다.
+    """
+    options = dict(limits)
+    if mode == "off":
+        options["compression"] = None
+    elif mode == "threshold":
+        options.pop("compression", None)
+    elif mode == "shared":
+        # 연결마다 압축 컨텍스트를 유지하지 않으므로 같은 창 크기면 압축 결과가 같다
+        options["compression"] = None
+        options["extensions"] = [ServerPerMessageDeflateFactory(
+            server_no_context_takeover=True,
+            server_max_window_bits=COMPRESSION_WINDOW_BITS,
+            client_max_window_bits=COMPRESSION_WINDOW_BITS,
+            compress_settings={"memLevel": COMPRESSION_MEM_LEVEL},
+        )]
+    return options
+
+
+def _deflate_extension(websocket) -> Optional[PerMessageDeflate]:
+    for extension in getattr(websocket, "extensions", ()):
+        if isinstance(extension, PerMessageDeflate):
+            return extension
+    return None
+
+
+class CompressionPolicy:
+    """팬아웃 프레임을 어떻게 압축해 쓸지 정한다
+
+    write 가 False 를 돌려주면 호출한 쪽이 websockets 기본 경로(write_frame_sync)로 보낸다.
+    압축하지 않은 메시지는 permessage-deflate 를 협상한 연결에도 보낼 수 있고(RSV1 없음),
+    수신 측 압축 컨텍스트에 영향을 주지 않는다.
+    """
+
+    def __init__(self, mode: str = COMPRESSION_MODE, min_size: int = COMPRESSION_MIN_SIZE,
+                 role_sizes: Optional[Dict[str, Optional[int]]] = None):
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"unknown compression mode: {mode}")
+        self.mode = mode
+        self.active = mode in ("threshold", "shared")
+        self.min_size = min_size
+        self.role_sizes = parse_role_sizes(COMPRESSION_ROLES) if role_sizes is None else role_sizes
+        # 역할 기준이 있는 연결 → 최소 크기 (None 이면 압축 안 함)
+        self.min_sizes: Dict[object, Optional[int]] = {}
+        self.stats = CompressionStats()
+
+    def assign(self, websocket, role):
+        """등록된 연결의 역할별 압축 기준 적용"""
+        key = str(role)
+        if self.active and key in self.role_sizes:
+            self.min_sizes[websocket] = self.role_sizes[key]
+
+    def forget(self, websocket):
+        self.min_sizes.pop(websocket, None)
+
+    def shared_frames(self) -> Optional[Dict]:
+        """브로드캐스트 하나 동안 직렬화한 프레임을 모아 둘 캐시 (shared 모드가 아니면 None)"""
+        return {} if self.mode == "shared" else None
+
+    def write(self, websocket, opcode: int, data: bytes, shared: Optional[Dict] = None) -> bool:
+        """정책에 따라 프레임을 기록. 기본 경로로 보내야 하면 False"""
+        if not self.active:
+            return False
+        deflate = _deflate_extension(websocket)
+        if deflate is None:
+            if shared is None:
+                return False
+            # 압축을 협상하지 않은 연결끼리는 직렬화한 프레임을 나눠 쓴다
+            websocket.transport.write(self._frame(shared, None, opcode, data))
+            return True
+
+        min_size = self.min_sizes.get(websocket, self.min_size)
+        if min_size is None or len(data) < min_size:
+            self.stats.uncompressed_frames += 1
+            if shared is None:
+                websocket.transport.write(server_frame(opcode, data))
+            else:
+                websocket.transport.write(self._frame(shared, None, opcode, data))
+            return True
+
+        if shared is None or not deflate.local_no_context_takeover:
+            self.stats.per_connection_frames += 1
+            return False
+        self.stats.shared_frames += 1
+        websocket.transport.write(self._frame(shared, deflate.local_max_window_bits, opcode, data))
+        return True
+
+    def _frame(self, shared: Dict, window_bits: Optional[int], opcode: int, data: bytes) -> bytes:
+        """창 크기별로 한 번만 압축·직렬화 (window_bits 가 None 이면 비압축 프레임)"""
+        frame = shared.get(window_bits)
+        if frame is not None:
+            return frame
+        if window_bits is None:
+            frame = server_frame(opcode, data)
+        else:
+            encoder = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window_bits,
+                                       COMPRESSION_MEM_LEVEL)
+            payload = encoder.compress(data) + encoder.flush(zlib.Z_SYNC_FLUSH)
+            if payload.endswith(_EMPTY_UNCOMPRESSED_BLOCK):
+                payload = payload[:-4]
+            frame = server_frame(opcode, payload, compressed=True)
+            self.stats.shared_compressions += 1
+            self.stats.bytes_in += len(data)
+            self.stats.bytes_out += len(payload)
+        shared[window_bits] = frame
+        return frame
+
+    def broadcast(self, websockets: Iterable, message):
+        """websockets.broadcast 대용: 열린 연결 전원에게 정책대로 전송 (main.py 용)"""
+        opcode, data = prepare_data(message)
+        shared = self.shared_frames()
+        for websocket in websockets:
+            if not websocket.open:
+                continue
+            try:
+                if not self.write(websocket, opcode, data, shared):
+                    websocket.write_frame_sync(True, opcode, data)
+            except Exception as e:
+                logging.warning(f"브로드캐스트 전송 실패 ({websocket.remote_address}): {e}")
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+import os
+
+# auto: uvloop 이 설치되어 있으면 사용, uvloop: 없으면 경고 후 기본 루프, asyncio: 항상 기본 루프
+EVENT_LOOP = os.environ.get("RELAY_EVENT_LOOP", "auto")
+
+
+def install_event_loop(preference: str = EVENT_LOOP) -> str:
+    """asyncio.run 전에 호출. 사용할 이벤트 루프 정책을 설치하고 이름을 반환"""
+    if preference == "asyncio":
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        if preference == "uvloop":
+            logging.warning("RELAY_EVENT_LOOP=uvloop 이지만 uvloop 이 설치되어 있지 않아 기본 asyncio 루프 사용")
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
+
+
+def loop_name(loop: asyncio.AbstractEventLoop = None) -> str:
+    """실행 중인 이벤트 루프 구현 이름"""
+    loop = loop or asyncio.get_running_loop()
+    return "uvloop" if type(loop).__module__.startswith("uvloop") else "asyncio"
@@ -0,0 +1,222 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+from websockets.frames import prepare_data
+
+from compression import CompressionPolicy
+
+# 느린 클라이언트 대기열 한도 (병합 후에도 넘으면 연결 종료)
+MAILBOX_MAX_MESSAGES = int(os.environ.get("RELAY_MAILBOX_MAX_MESSAGES", "256"))
+MAILBOX_MAX_BYTES = int(os.environ.get("RELAY_MAILBOX_MAX_BYTES", str(1024 * 1024)))
+# 송신 버퍼가 이 시간(초) 동안 비워지지 않으면 연결 종료
+MAILBOX_STALL_TIMEOUT = float(os.environ.get("RELAY_MAILBOX_STALL_TIMEOUT", "10"))
+
+# 탈리 상태 메시지는 우선 레인으로 보낸다
+URGENT_KINDS = frozenset({
+    "tally_update", "snapshot", "tally_delta", "tally_binary", "snapshot_binary",
+    "input_tally", "tally_replay",
+})
+# 같은 그룹의 대기 중인 메시지는 최신 것 하나만 남긴다. tally_delta 를 버리면 클라이언트가
+# seq 누락을 감지해 full_state 를 요청하므로 최신 상태로 수렴한다
+CONFLATION_GROUPS = {
+    "tally_update": "state",
+    "snapshot": "state",
+    "tally_delta": "delta",
+    "tally_binary": "binary",
+    "snapshot_binary": "binary_snapshot",
+    "input_tally": "input",
+    "pong": "pong",
+}
+
+
+@dataclass
+class FanoutStats:
+    """팬아웃 누적 통계"""
+    broadcasts: int = 0
+    frames_sent: int = 0
+    send_failures: int = 0
+    skipped_closed: int = 0
+    # 메시지 종류별 전송 프레임 수 (/metrics 용)
+    frames_by_kind: Dict[str, int] = field(default_factory=dict)
+    queued: int = 0      # 송신 버퍼가 차서 대기열로 보낸 메시지 수
+    conflated: int = 0   # 대기 중 최신 메시지로 대체된 수
+    # 느린 클라이언트 연결 종료 사유별 수
+    slow_disconnects: Dict[str, int] = field(default_factory=dict)
+
+
+class Mailbox:
+    """송신 버퍼가 찬 연결 하나의 대기열 (우선 레인 + 일반 레인)"""
+
+    __slots__ = ("urgent", "bulk", "bytes")
+
+    _sequence = itertools.count()
+
+    def __init__(self):
+        self.urgent: "OrderedDict[Hashable, Tuple]" = OrderedDict()
+        self.bulk: "OrderedDict[Hashable, Tuple]" = OrderedDict()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.urgent) + len(self.bulk)
+
+    def put(self, kind: str, key, opcode: int, data: bytes, message) -> bool:
+        """메시지 추가. 같은 그룹의 대기 메시지를 대체했으면 True"""
+        lane = self.urgent if kind in URGENT_KINDS else self.bulk
+        group = CONFLATION_GROUPS.get(kind)
+        slot = (group, key) if group is not None else next(self._sequence)
+        replaced = lane.pop(slot, None)
+        if replaced is not None:
+            self.bytes -= len(replaced[1])
+        # 대체된 메시지 자리가 아니라 맨 뒤에 넣어 도착 순서를 유지
+        lane[slot] = (opcode, data, message, kind)
+        self.bytes += len(data)
+        return replaced is not None
+
+    def pop(self) -> Tuple:
+        lane = self.urgent if self.urgent else self.bulk
+        entry = lane.popitem(last=False)[1]
+        self.bytes -= len(entry[1])
+        return entry
+
+
+class FanoutEngine:
+    """프레임을 한 번만 인코딩해서 세션 전체에 대기 없이 밀어 넣는 엔진
+
+    websockets.broadcast 와 같은 방식으로 각 연결의 쓰기 버퍼에 동기적으로
+    프레임을 기록하므로, 느린 소켓 하나가 다른 클라이언트의 탈리 전송을
+    지연시키지 않는다. 송신 버퍼가 high-water 를 넘은 연결은 Mailbox 에 모아
+    두었다가 버퍼가 비면 탈리 상태부터 보내고, 한도를 넘기면 연결을 끊는다.
+    """
+
+    def __init__(self, max_messages: int = MAILBOX_MAX_MESSAGES, max_bytes: int = MAILBOX_MAX_BYTES,
+                 stall_timeout: float = MAILBOX_STALL_TIMEOUT, compression: CompressionPolicy = None):
+        self.stats = FanoutStats()
+        self.compression = compression or CompressionPolicy()
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.stall_timeout = stall_timeout
+        self.mailboxes: Dict[object, Mailbox] = {}
+
+    def broadcast(self, clients: Iterable, message, kind: str = "broadcast", key=None) -> List:
+        """clients 전원에게 message 전송 후 끊긴 클라이언트 목록 반환
+
+        key 는 같은 kind 안에서 병합 단위를 나눌 때 쓴다 (예: input_tally 의 입력 id).
+        """
+        opcode, data = prepare_data(message)
+        # shared 압축 모드에서는 수신자 전원이 같은 압축·직렬화 결과를 쓴다
+        shared = self.compression.shared_frames()
+        dead_clients = []
+        self.stats.broadcasts += 1
+        sent = 0
+
+        for client in clients:
+            websocket = client.websocket
+            if not websocket.open:
+                self.stats.skipped_closed += 1
+                dead_clients.append(client)
+                continue
+
+            try:
+                if self._deliver(websocket, kind, key, opcode, data, message, shared):
+                    sent += 1
+                else:
+                    dead_clients.append(client)
+            except Exception as e:
+                self.stats.send_failures += 1
+                dead_clients.append(client)
+                logging.warning(f"팬아웃 전송 실패 ({websocket.remote_address}): {e}")
+
+        self.stats.frames_sent += sent
+        self.stats.frames_by_kind[kind] = self.stats.frames_by_kind.get(kind, 0) + sent
+        return dead_clients
+
+    def send_prepared(self, websocket, frame: Tuple[int, bytes], message, kind: str = "pong") -> bool:
+        """prepare_data 로 미리 만들어 둔 프레임을 한 연결에 기록 (닫힌 연결이면 False)"""
+        if not websocket.open:
+            return False
+        if not self._deliver(websocket, kind, None, frame[0], frame[1], message):
+            return False
+        self.stats.frames_sent += 1
+        return True
+
+    def _deliver(self, websocket, kind: str, key, opcode: int, data: bytes, message, shared=None) -> bool:
+        """바로 쓰거나 대기열에 넣는다. 한도를 넘겨 연결을 끊었으면 False"""
+        mailbox = self.mailboxes.get(websocket)
+        if mailbox is None:
+            if not self._backed_up(websocket):
+                self._write(websocket, opcode, data, message, shared)
+                return True
+            mailbox = self.mailboxes[websocket] = Mailbox()
+            asyncio.ensure_future(self._drain_mailbox(websocket, mailbox))
+
+        self.stats.queued += 1
+        if mailbox.put(kind, key, opcode, data, message):
+            self.stats.conflated += 1
+        if len(mailbox) > self.max_messages:
+            self._disconnect_slow(websocket, "mailbox_messages")
+            return False
+        if mailbox.bytes > self.max_bytes:
+            self._disconnect_slow(websocket, "mailbox_bytes")
+            return False
+        return True
+
+    @staticmethod
+    def _backed_up(websocket) -> bool:
+        """송신 버퍼가 전송 계층의 high-water 를 넘었는지 (websockets 의 drain 대기 조건과 같음)"""
+        transport = getattr(websocket, "transport", None)
+        if transport is None:
+            return False
+        return transport.get_write_buffer_size() > transport.get_write_buffer_limits()[1]
+
+    async def _drain_mailbox(self, websocket, mailbox: Mailbox):
+        """송신 버퍼가 빠질 때마다 대기열을 우선 레인부터 기록"""
+        try:
+            while mailbox and self.mailboxes.get(websocket) is mailbox:
+                try:
+                    await asyncio.wait_for(websocket.drain(), self.stall_timeout)
+                except asyncio.TimeoutError:
+                    self._disconnect_slow(websocket, "stalled")
+                    return
+                while mailbox and not self._backed_up(websocket):
+                    opcode, data, message, kind = mailbox.pop()
+                    self._write(websocket, opcode, data, message)
+        except Exception:
+            # 연결이 닫혔으면 핸들러의 정리 경로가 처리
+            pass
+        finally:
+            if self.mailboxes.get(websocket) is mailbox:
+                del self.mailboxes[websocket]
+
+    def _disconnect_slow(self, websocket, reason: str):
+        """병합 후에도 따라오지 못하는 클라이언트 연결 종료"""
+        self.mailboxes.pop(websocket, None)
+        self.stats.slow_disconnects[reason] = self.stats.slow_disconnects.get(reason, 0) + 1
+        logging.warning(f"느린 클라이언트 연결 종료 ({reason}): {websocket.remote_address}")
+        transport = getattr(websocket, "transport", None)
+        if transport is not None:
+            transport.abort()
+
+    def _write(self, websocket, opcode, data, message, shared=None):
+        """연결 쓰기 버퍼에 프레임 기록 (await 없음)"""
+        write_frame_sync = getattr(websocket, "write_frame_sync", None)
+        if write_frame_sync is not None:
+            if self.compression.active and self.compression.write(websocket, opcode, data, shared):
+                return
+            write_frame_sync(True, opcode, data)
+            return
+
+        # write_frame_sync 가 없는 연결 구현은 send 를 태스크로 띄워 대기하지 않는다
+        task = asyncio.ensure_future(websocket.send(message))
+        task.add_done_callback(self._on_send_done)
+
+    def _on_send_done(self, task: asyncio.Future):
+        """비동기 전송 결과 기록"""
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.stats.send_failures += 1
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+세션별 탈리 변경 이력 기록 (write-behind)
+탈리 갱신 경로에서는 버퍼에 한 줄 추가만 하고, 백그라운드 태스크가 크기나 시간 기준으로
+모아서 저장소에 쓴다. 기본 저장소는 SQLite 이며, HistoryBackend 를 구현하면 다른 저장소로
+바꿀 수 있다.
+
+방송 후 편집 결정 목록(EDL)용 조회:
+    python history.py --db tally_history.db --session SESSION --from 2026-10-16T19:00 --to 2026-10-16T21:00
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from codec import dumps, loads
+
+# 설정되어 있으면 이 경로의 SQLite 파일에 탈리 이력 기록
+HISTORY_PATH = os.environ.get("RELAY_HISTORY_PATH")
+# 버퍼가 이만큼 차거나 FLUSH_INTERVAL 초가 지나면 저장
+HISTORY_FLUSH_SIZE = int(os.environ.get("RELAY_HISTORY_FLUSH_SIZE", "256"))
+HISTORY_FLUSH_INTERVAL = float(os.environ.get("RELAY_HISTORY_FLUSH_INTERVAL", "1.0"))
+# 저장소가 느리거나 멈췄을 때 메모리에 들고 있을 최대 변경 수 (넘으면 버림)
+HISTORY_MAX_BUFFER = int(os.environ.get("RELAY_HISTORY_MAX_BUFFER", "100000"))
+
+# (session_id, seq, recorded_at, program, preview, delta)
+HistoryRow = Tuple[str, int, float, object, object, Dict]
+
+
+@dataclass
+class HistoryStats:
+    """이력 기록 통계"""
+    recorded: int = 0
+    written: int = 0
+    dropped: int = 0       # 버퍼가 가득 차 버린 변경
+    flushes: int = 0
+    write_failures: int = 0
+    write_seconds: float = 0.0
+
+
+class HistoryBackend(ABC):
+    """이력 저장소 인터페이스 (write·query 를 빠뜨린 구현체는 만들 때 TypeError)"""
+
+    @abstractmethod
+    async def write(self, rows: List[HistoryRow]):
+        ...
+
+    @abstractmethod
+    async def query(self, session_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+        """session_id 의 [start, end) 구간 변경을 시간순으로 반환"""
+
+    async def close(self):
+        pass
+
+
+def history_entry(session_id: str, seq: int, recorded_at: float, program, preview, delta: Dict) -> Dict:
+    """조회 결과 한 줄"""
+    return {
+        "sessionId": session_id,
+        "seq": seq,
+        "timestamp": datetime.fromtimestamp(recorded_at).isoformat(),
+        "recordedAt": recorded_at,
+        "program": program,
+        "preview": preview,
+        "delta": delta
+    }
+
+
+def _column(value):
+    """SQLite 가 그대로 저장할 수 없는 program/preview 값은 JSON 텍스트로"""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return dumps(value)
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """SQLite 이력 저장소. 연결 하나를 전용 스레드에서만 사용해 이벤트 루프를 막지 않는다"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS tally_history ("
+        " session_id TEXT NOT NULL,"
+        " seq INTEGER NOT NULL,"
+        " recorded_at REAL NOT NULL,"
+        " program,"
+        " preview,"
+        " delta TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS tally_history_session_time ON tally_history (session_id, recorded_at)",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tally-history")
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            # 추가 위주 기록: WAL 로 읽기(조회)와 쓰기가 서로 막지 않게 한다
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+        return self.connection
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _write(self, rows: List[HistoryRow]):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO tally_history VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, seq, recorded_at, _column(program), _column(preview), dumps(delta))
+                 for session_id, seq, recorded_at, program, preview, delta in rows]
+            )
+
+    def _query(self, session_id: str, start: Optional[float], end: Optional[float],
+               limit: Optional[int]) -> List[Dict]:
+        sql = "SELECT session_id, seq, recorded_at, program, preview, delta FROM tally_history WHERE session_id = ?"
+        params: list = [session_id]
+        if start is not None:
+            sql += " AND recorded_at >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND recorded_at < ?"
+            params.append(end)
+        sql += " ORDER BY recorded_at, seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [
+            history_entry(session_id, seq, recorded_at, program, preview, loads(delta))
+            for session_id, seq, recorded_at, program, preview, delta in self._connect().execute(sql, params)
+        ]
+
+    def _close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def write(self, rows: List[HistoryRow]):
+        await self._run(self._write, rows)
+
+    async def query(self, session_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+        return await self._run(self._query, session_id, start, end, limit)
+
+    async def close(self):
+        await self._run(self._close)
+        self.executor.shutdown(wait=False)
+
+
+class HistoryRecorder:
+    """탈리 변경을 모아 두었다가 백그라운드에서 저장소에 쓰는 write-behind 기록기
+
+    record 는 팬아웃과 같은 경로에서 불리므로 리스트에 튜플 하나만 추가한다. 직렬화와
+    저장은 run 태스크가 flush_size 개가 모이거나 flush_interval 초가 지날 때 한꺼번에 한다.
+    저장소가 따라오지 못해 버퍼가 max_buffer 를 넘으면 새 변경을 버리고 dropped 로 센다.
+    """
+
+    def __init__(self, backend: HistoryBackend, flush_size: int = HISTORY_FLUSH_SIZE,
+                 flush_interval: float = HISTORY_FLUSH_INTERVAL, max_buffer: int = HISTORY_MAX_BUFFER):
+        self.backend = backend
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer: List[HistoryRow] = []
+        self.stats = HistoryStats()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def record(self, session_id: str, seq: int, delta: Dict, tally_state: Dict):
+        """탈리 변경 하나 기록 (핫패스: 대기 없음)"""
+        if len(self.buffer) >= self.max_buffer:
+            self.stats.dropped += 1
+            if self.stats.dropped & (self.stats.dropped - 1) == 0:
+                logging.warning(f"탈리 이력 버퍼 가득 참: 변경 {self.stats.dropped}개 버림")
+            return
+        self.buffer.append((session_id, seq, time.time(), tally_state.get("program"),
+                            tally_state.get("preview"), delta))
+        self.stats.recorded += 1
+        if len(self.buffer) >= self.flush_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        """버퍼에 있는 변경을 저장소에 기록 (실패하면 버퍼 앞쪽에 되돌림)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.buffer:
+                return
+            rows, self.buffer = self.buffer, []
+            started = time.perf_counter()
+            try:
+                await self.backend.write(rows)
+            except Exception as e:
+                self.stats.write_failures += 1
+                logging.error(f"탈리 이력 저장 실패 ({len(rows)}개): {e}")
+                # 되돌린 뒤 한도를 넘는 만큼은 오래된 것부터 버린다
+                self.buffer = rows + self.buffer
+                overflow = len(self.buffer) - self.max_buffer
+                if overflow > 0:
+                    del self.buffer[:overflow]
+                    self.stats.dropped += overflow
+                return
+            self.stats.written += len(rows)
+            self.stats.flushes += 1
+            self.stats.write_seconds += time.perf_counter() - started
+
+    async def run(self):
+        """flush_size 또는 flush_interval 마다 flush. 취소되면 남은 변경을 기록하고 종료"""
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+        finally:
+            await self.flush()
+            await self.backend.close()
+
+    async def query(self, session_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+        """session_id 의 [start, end) 구간(UNIX 시간) 탈리 변경 목록. 아직 버퍼에 있는 변경도 포함"""
+        await self.flush()
+        return await self.backend.query(session_id, start, end, limit)
+
+
+def history_from_env() -> Optional[HistoryRecorder]:
+    """RELAY_HISTORY_PATH 가 있으면 SQLite 저장소를 쓰는 HistoryRecorder 생성"""
+    if not HISTORY_PATH:
+        return None
+    return HistoryRecorder(SQLiteHistoryBackend(HISTORY_PATH))
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """ISO 8601 시각 또는 UNIX 초"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query recorded tally changes for a session")
+    parser.add_argument("--db", default=HISTORY_PATH or "tally_history.db", help="SQLite 이력 파일")
+    parser.add_argument("--session", required=True)
+    parser.add_argument("--from", dest="start", help="시작 시각 (ISO 8601 또는 UNIX 초, 포함)")
+    parser.add_argument("--to", dest="end", help="끝 시각 (ISO 8601 또는 UNIX 초, 미포함)")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    async def run():
+        backend = SQLiteHistoryBackend(args.db)
+        try:
+            return await backend.query(args.session, parse_time(args.start), parse_time(args.end), args.limit)
+        finally:
+            await backend.close()
+
+    print(json.dumps(asyncio.run(run()), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+from dataclasses import fields
+from enum import Enum
+from typing import Dict, Union
+
+# RELAY_MEMORY_MODE=lean 이면 연결별 버퍼 한도를 탈리 트래픽에 맞게 줄인다
+MEMORY_MODE = os.environ.get("RELAY_MEMORY_MODE", "default")
+
+# 탈리 프레임은 수백 바이트, 가장 큰 input_list 도 수십 KB 수준
+LEAN_CONNECTION_LIMITS = {
+    "max_size": 256 * 1024,   # 수신 메시지 최대 크기 (기본 1 MiB)
+    "max_queue": 4,           # 처리 대기 수신 메시지 수 (기본 32)
+    "read_limit": 16 * 1024,  # 수신 스트림 버퍼 (기본 64 KiB)
+    "write_limit": 16 * 1024,  # 송신 버퍼 high-water mark (기본 64 KiB)
+    "compression": None,      # permessage-deflate 의 연결별 zlib 컨텍스트 생략
+}
+
+
+class Role(str, Enum):
+    """클라이언트 역할 (str 과 그대로 비교 가능)"""
+    PD = "pd"
+    PD_SOFTWARE = "pd_software"
+    CAMERA = "camera"
+    STAFF = "staff"
+    VIEWER = "viewer"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+PD_ROLES = (Role.PD, Role.PD_SOFTWARE)
+
+_ROLES: Dict[str, Role] = {role.value: role for role in Role}
+
+
+def parse_role(value) -> Union[Role, str]:
+    """알려진 역할은 Role 멤버로, 그 밖의 문자열은 intern 해서 반환"""
+    if not isinstance(value, str):
+        return value
+    return _ROLES.get(value) or sys.intern(value)
+
+
+def intern_id(value):
+    """세션 ID 등 여러 연결이 공유하는 문자열을 한 객체로 합침"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def monotonic_seconds() -> int:
+    """연결·세션 생성 시각 (datetime 대신 정수 초)"""
+    return int(time.monotonic())
+
+
+def connection_limits() -> Dict:
+    """websockets.serve 에 넘길 연결 버퍼 설정 (기본 모드면 빈 dict)"""
+    if MEMORY_MODE == "lean":
+        return dict(LEAN_CONNECTION_LIMITS)
+    return {}
+
+
+def slotted(cls):
+    """dataclass 를 __slots__ 클래스로 다시 만든다 (Python 3.10 의 slots=True 대용)
+
+    인스턴스마다 __dict__ 가 없어져 연결 레코드 하나가 수백 바이트 줄어든다.
+    @dataclass 바깥에 붙인다.
+    """
+    names = tuple(f.name for f in fields(cls))
+    namespace = dict(cls.__dict__)
+    namespace["__slots__"] = names
+    for name in names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
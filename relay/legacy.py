@@ -0,0 +1,96 @@
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+from codec import loads, DecodeError
+
+# RELAY_LEGACY_PROTOCOL=1 이면 RelayServer 가 등록하지 않은 클라이언트에게 main.py 프로토콜로 응답
+LEGACY_PROTOCOL = os.environ.get("RELAY_LEGACY_PROTOCOL", "0") == "1"
+# 연결 URL 에 sessionId 가 없는 legacy 클라이언트가 들어갈 세션
+LEGACY_DEFAULT_SESSION = os.environ.get("RELAY_LEGACY_SESSION", "default")
+# 보관할 게시판 수. sessionId 는 클라이언트가 정하므로 넘으면 가장 오래 쓰지 않은 것부터 버린다
+LEGACY_MAX_BULLETINS = int(os.environ.get("RELAY_LEGACY_MAX_BULLETINS", "1000"))
+
+
+def legacy_session_id(path: str, default: str = LEGACY_DEFAULT_SESSION) -> str:
+    """연결 URL 의 ?sessionId= (없으면 기본 세션)"""
+    query = parse_qs(urlparse(path).query)
+    return (query.get("sessionId") or query.get("session") or [default])[0] or default
+
+
+def is_register_message(message, register_types) -> bool:
+    """legacy 연결이 보낸 메시지가 RelayServer 등록 요청인지 (register 가 들어 있는 메시지만 파싱)"""
+    if not isinstance(message, str) or '"register' not in message:
+        return False
+    try:
+        data = loads(message)
+    except DecodeError:
+        return False
+    return isinstance(data, dict) and data.get("type") in register_types
+
+
+class LegacyRelay:
+    """main.py 호환 중계
+
+    main.py 처럼 받은 메시지를 (보낸 클라이언트 포함) 그대로 전달하고, 마지막 input_list 를
+    '게시판'으로 보관했다가 새 클라이언트에게 먼저 보낸다. 다만 전달 범위는 서버 전체가
+    아니라 같은 legacy 세션의 클라이언트로 한정한다. legacy 세션은 노드 로컬이다.
+    """
+
+    def __init__(self, fanout, client_factory, max_bulletins: int = LEGACY_MAX_BULLETINS):
+        self.fanout = fanout
+        self.client_factory = client_factory
+        self.sessions: Dict[str, Set] = {}
+        self.members: Dict[object, object] = {}
+        # 세션 id → 마지막 input_list 원문. main.py 처럼 클라이언트가 모두 나가도 유지하되
+        # max_bulletins 개를 넘으면 LRU 로 버린다
+        self.bulletins: "OrderedDict[str, object]" = OrderedDict()
+        self.max_bulletins = max_bulletins
+        self.evicted_bulletins = 0
+        self.relayed = 0
+
+    def join(self, websocket, session_id: str):
+        """연결을 legacy 세션에 추가하고 게시판 메시지를 먼저 보낸다"""
+        client = self.client_factory(websocket=websocket, session_id=session_id)
+        self.members[websocket] = client
+        self.sessions.setdefault(session_id, set()).add(client)
+        bulletin = self.bulletins.get(session_id)
+        if bulletin is not None:
+            self.bulletins.move_to_end(session_id)
+            self.fanout.broadcast([client], bulletin, "legacy_bulletin")
+
+    def leave(self, websocket):
+        client = self.members.pop(websocket, None)
+        if client is None:
+            return
+        clients = self.sessions.get(client.session_id)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self.sessions[client.session_id]
+
+    def relay(self, websocket, message):
+        """같은 세션 전원에게 그대로 전달하고, input_list 면 게시판 갱신"""
+        session_id = self.members[websocket].session_id
+        clients = self.sessions[session_id]
+        for dead_client in self.fanout.broadcast(clients, message, "legacy"):
+            clients.discard(dead_client)
+        self.relayed += 1
+
+        # input_list 문자열이 없는 메시지(ping 등 대부분)는 파싱하지 않는다
+        if isinstance(message, str) and '"input_list"' not in message:
+            return
+        try:
+            data = loads(message)
+        except DecodeError:
+            logging.warning(f"JSON 형식이 아닌 legacy 메시지 수신: {message[:100]}")
+            return
+        if isinstance(data, dict) and data.get("type") == "input_list":
+            self.bulletins[session_id] = message
+            self.bulletins.move_to_end(session_id)
+            while len(self.bulletins) > self.max_bulletins:
+                self.bulletins.popitem(last=False)
+                self.evicted_bulletins += 1
+            logging.info(f"legacy 세션 {session_id} 의 카메라 목록 게시판 갱신")
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Set
+
+# 이 시간(초) 동안 아무 메시지가 없으면 프로토콜 ping 전송
+PING_INTERVAL = float(os.environ.get("RELAY_PING_INTERVAL", "20"))
+# ping 후 이 시간(초) 안에 pong 이나 메시지가 없으면 연결 정리
+PING_TIMEOUT = float(os.environ.get("RELAY_PING_TIMEOUT", "20"))
+
+WHEEL_TICK = 1.0
+WHEEL_SLOTS = 64
+
+
+@dataclass
+class LivenessStats:
+    """연결 생존 확인 통계"""
+    pings_sent: int = 0
+    reaped: int = 0
+
+
+class TimerWheel:
+    """해시 타이머 휠
+
+    예약과 취소는 슬롯 set 하나에 넣고 빼는 O(1) 작업이고, 한 tick 에는 현재 슬롯만
+    검사한다. 슬롯 수보다 먼 마감은 같은 슬롯에 남아 있다가 해당 바퀴에 만료된다.
+    """
+
+    def __init__(self, slots: int = WHEEL_SLOTS, tick: float = WHEEL_TICK):
+        self.tick = tick
+        self.slots: List[Set[Hashable]] = [set() for _ in range(slots)]
+        self.position = 0
+        self.deadlines: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def schedule(self, key: Hashable, delay: float):
+        """key 를 delay 초 뒤 만료되도록 (재)예약"""
+        self.cancel(key)
+        deadline = self.position + max(1, math.ceil(delay / self.tick))
+        self.deadlines[key] = deadline
+        self.slots[deadline % len(self.slots)].add(key)
+
+    def cancel(self, key: Hashable):
+        deadline = self.deadlines.pop(key, None)
+        if deadline is not None:
+            self.slots[deadline % len(self.slots)].discard(key)
+
+    def advance(self) -> List[Hashable]:
+        """한 tick 전진 후 만료된 key 목록 반환"""
+        self.position += 1
+        slot = self.slots[self.position % len(self.slots)]
+        expired = [key for key in slot if self.deadlines[key] <= self.position]
+        for key in expired:
+            slot.discard(key)
+            del self.deadlines[key]
+        return expired
+
+
+class LivenessTracker:
+    """연결별 타이머·태스크 없이 타이머 휠 하나로 유휴 연결을 확인하고 정리
+
+    메시지를 받을 때는 마지막 수신 시각만 갱신하고(touch), 휠에서 마감이 돌아온
+    연결만 검사한다. 유휴 시간이 interval 을 넘으면 프로토콜 ping 을 보내고, 그 뒤
+    timeout 안에 응답이 없으면 전송 계층을 끊어 핸들러의 정리 경로로 넘긴다.
+    """
+
+    def __init__(self, interval: float = PING_INTERVAL, timeout: float = PING_TIMEOUT,
+                 wheel: TimerWheel = None, clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.timeout = timeout
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.clock = clock
+        self.last_seen: Dict[Hashable, float] = {}
+        self.pinged: Dict[Hashable, float] = {}  # ping 을 보낸 연결 → 보낸 시각
+        self.stats = LivenessStats()
+
+    def track(self, websocket):
+        self.last_seen[websocket] = self.clock()
+        self.wheel.schedule(websocket, self.interval)
+
+    def touch(self, websocket):
+        """수신 활동 기록 (핫패스: dict 갱신 하나)"""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = self.clock()
+
+    def forget(self, websocket):
+        self.last_seen.pop(websocket, None)
+        self.pinged.pop(websocket, None)
+        self.wheel.cancel(websocket)
+
+    def check(self):
+        """한 tick 진행 후 마감된 연결 처리"""
+        now = self.clock()
+        reaped = 0
+        for websocket in self.wheel.advance():
+            last_seen = self.last_seen.get(websocket)
+            if last_seen is None:
+                continue
+            idle = now - last_seen
+            pinged_at = self.pinged.get(websocket)
+            if pinged_at is not None and last_seen >= pinged_at:
+                # ping 이후 pong 이나 메시지를 받았음
+                del self.pinged[websocket]
+                pinged_at = None
+            if idle < self.interval:
+                # 마감 전에 활동이 있었음: 남은 시간만큼 다시 예약
+                self.wheel.schedule(websocket, self.interval - idle)
+            elif pinged_at is None:
+                self.pinged[websocket] = now
+                self.wheel.schedule(websocket, self.timeout)
+                self._ping(websocket)
+            elif now - pinged_at < self.timeout:
+                # 루프가 밀려 tick 을 몰아서 처리하는 중이면 pong 을 받을 시간을 더 준다
+                self.wheel.schedule(websocket, self.timeout - (now - pinged_at))
+            else:
+                self.forget(websocket)
+                self._reap(websocket)
+                reaped += 1
+        if reaped:
+            self.stats.reaped += reaped
+            logging.info(f"응답 없는 연결 {reaped}개 정리 (누적 {self.stats.reaped})")
+
+    async def run(self):
+        """tick 마다 check. 이벤트 루프가 밀리면 놓친 tick 을 몰아서 처리"""
+        tick = self.wheel.tick
+        next_tick = self.clock() + tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - self.clock()))
+            while next_tick <= self.clock():
+                self.check()
+                next_tick += tick
+
+    def _ping(self, websocket):
+        ping = getattr(websocket, "ping", None)
+        if ping is None or not websocket.open:
+            return
+        self.stats.pings_sent += 1
+        task = asyncio.ensure_future(ping())
+        task.add_done_callback(lambda done: self._on_ping_sent(websocket, done))
+
+    def _on_ping_sent(self, websocket, task: asyncio.Future):
+        """ping 전송 후 pong 대기 future 에 활동 기록 콜백 연결"""
+        if task.cancelled() or task.exception() is not None:
+            return
+        task.result().add_done_callback(lambda pong: self._on_pong(websocket, pong))
+
+    def _on_pong(self, websocket, pong: asyncio.Future):
+        if not pong.cancelled() and pong.exception() is None:
+            self.touch(websocket)
+
+    def _reap(self, websocket):
+        transport = getattr(websocket, "transport", None)
+        if transport is not None:
+            transport.abort()
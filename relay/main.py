@@ -1,9 +1,15 @@
 import asyncio
 import logging
-import json
+import os
 import websockets
 from websockets.exceptions import ConnectionClosed
 
+from codec import loads, DecodeError
+from compression import CompressionPolicy, serve_options
+from eventloop import install_event_loop, loop_name
+from lean import connection_limits
+from metrics import LoopLagSampler
+
 # --- 로깅 설정 ---
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +21,8 @@ logging.basicConfig(
 CONNECTED_CLIENTS = set()
 # 서버가 기억하고 있을 '최신 카메라 목록' (JSON 문자열 형태)
 LATEST_INPUT_LIST = None
+# RELAY_COMPRESSION 송신 압축 정책 (main.py 는 역할을 모르므로 크기 기준만 적용)
+COMPRESSION = CompressionPolicy()
 
 # --- 웹소켓 핸들러 함수 ---
 async def handler(websocket, path):
@@ -45,16 +53,22 @@ async def handler(websocket, path):
         # --- 모든 클라이언트로부터 오는 메시지를 처리하는 루프 ---
         async for message in websocket:
             # PD 프로그램으로부터 받은 메시지를 모든 클라이언트에게 전달 (브로드캐스트)
-            websockets.broadcast(CONNECTED_CLIENTS, message)
+            if COMPRESSION.active:
+                COMPRESSION.broadcast(CONNECTED_CLIENTS, message)
+            else:
+                websockets.broadcast(CONNECTED_CLIENTS, message)
             
             # --- PD가 보낸 메시지인지 확인하고 '게시판'에 저장 ---
+            # input_list 문자열이 없는 메시지(ping 등 대부분)는 파싱하지 않는다
+            if isinstance(message, str) and '"input_list"' not in message:
+                continue
             try:
-                data = json.loads(message)
+                data = loads(message)
                 # 메시지 타입이 'input_list' 라면, 이 메시지를 '최신 목록'으로 저장한다.
                 if data.get("type") == "input_list":
                     LATEST_INPUT_LIST = message
                     logging.info(f"새로운 카메라 목록을 수신하여 '게시판'에 업데이트했습니다.")
-            except json.JSONDecodeError:
+            except DecodeError:
                 # JSON 형식이 아닌 메시지는 무시
                 logging.warning(f"JSON 형식이 아닌 메시지 수신: {message[:100]}")
             except Exception as e:
@@ -71,14 +85,18 @@ async def handler(websocket, path):
 
 # --- 서버를 시작하는 메인 함수 ---
 async def main():
-    host = "0.0.0.0"
-    port = 8765
+    host = os.environ.get("RELAY_HOST", "0.0.0.0")
+    port = int(os.environ.get("RELAY_PORT", "8765"))
     
-    async with websockets.serve(handler, host, port):
+    # /metrics 는 없지만 루프 지연이 기준을 넘으면 경고 로그를 남긴다
+    asyncio.ensure_future(LoopLagSampler().run())
+    async with websockets.serve(handler, host, port, **serve_options(connection_limits())):
         logging.info(f"업그레이드된 탈리 중계 서버가 ws://{host}:{port} 에서 시작되었습니다.")
+        logging.info(f"이벤트 루프: {loop_name()}")
         await asyncio.Future()  # 서버를 영원히 실행
 
 if __name__ == "__main__":
+    install_event_loop()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -8,6 +8,7 @@ import os
 import sys
 
 # relay_server_secure 모듈을 임포트하고 실행
+from eventloop import install_event_loop
 from relay_server_secure import main
 import asyncio
 
@@ -19,6 +20,7 @@ if __name__ == "__main__":
         print("프로덕션 환경에서는 반드시 안전한 JWT_SECRET을 설정하세요.")
         print("예: export JWT_SECRET='your-very-long-random-secret-key'")
     
+    install_event_loop()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,383 @@
+import asyncio
+import http
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from eventloop import loop_name
+from timesync import session_clock_stats
+
+# /metrics 경로 (websockets.serve 의 process_request 훅에서 처리)
+METRICS_PATH = "/metrics"
+
+# 히스토그램 버킷 (초)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# 연결별 송신 버퍼 크기 버킷 (바이트)
+BUFFER_BUCKETS = (0, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# 이벤트 루프 지연 측정 주기 (초)
+LOOP_LAG_INTERVAL = float(os.environ.get("RELAY_LOOP_LAG_INTERVAL", "0.5"))
+# 이 값(초)보다 늦게 깨어나면 경고 로그 (LOOP_LAG_WARN_EVERY 초에 한 번만)
+LOOP_LAG_WARN = float(os.environ.get("RELAY_LOOP_LAG_WARN", "0.1"))
+LOOP_LAG_WARN_EVERY = 10.0
+
+
+class Histogram:
+    """고정 버킷 히스토그램. observe 는 리스트 칸 하나만 증가시킨다"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        """Prometheus 텍스트 형식 (누적 버킷)"""
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class LoopLagSampler:
+    """이벤트 루프가 콜백을 예정보다 얼마나 늦게 실행하는지 측정
+
+    interval 마다 잠들었다 깨어난 시각의 지연을 히스토그램에 기록한다. 이 지연은
+    그대로 탈리 전달 지연에 더해지므로, threshold 를 넘으면 경고를 남긴다.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_WARN,
+                 warn_every: float = LOOP_LAG_WARN_EVERY):
+        self.interval = interval
+        self.threshold = threshold
+        self.warn_every = warn_every
+        self.histogram = Histogram(LOOP_LAG_BUCKETS)
+        self.max_seconds = 0.0
+        self.slow_samples = 0  # threshold 를 넘은 측정 수
+        self._warned_at = float("-inf")
+        self._unreported = 0
+
+    def observe(self, lag: float, now: float):
+        self.histogram.observe(lag)
+        if lag > self.max_seconds:
+            self.max_seconds = lag
+        if lag <= self.threshold:
+            return
+        self.slow_samples += 1
+        self._unreported += 1
+        if now - self._warned_at >= self.warn_every:
+            logging.warning(
+                f"이벤트 루프 지연 {lag * 1000:.1f}ms (기준 {self.threshold * 1000:.0f}ms, "
+                f"최근 {self._unreported}회 초과)"
+            )
+            self._warned_at = now
+            self._unreported = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.observe(max(0.0, now - expected), now)
+
+
+class RelayMetrics:
+    """릴레이 운영 지표
+
+    핫패스에서는 dict/리스트의 정수만 증가시키고, 세션·연결별 값은
+    스크레이프 시점에 서버 상태를 훑어 계산한다.
+    """
+
+    def __init__(self):
+        self.messages_in: Dict[str, int] = {}
+        self.messages_out: Dict[str, int] = {}
+        self.fanout_seconds = Histogram(LATENCY_BUCKETS)
+        self.encode_seconds = Histogram(LATENCY_BUCKETS)
+        self.loop_lag = LoopLagSampler()
+        self.loop_lag_seconds = self.loop_lag.histogram
+        self.started_at = time.time()
+
+    def count_in(self, msg_type: str):
+        self.messages_in[msg_type] = self.messages_in.get(msg_type, 0) + 1
+
+    def count_out(self, msg_type: str, count: int = 1):
+        self.messages_out[msg_type] = self.messages_out.get(msg_type, 0) + count
+
+    async def sample_loop_lag(self, interval: Optional[float] = None):
+        """이벤트 루프 지연 측정 (서버 시작 시 태스크로 실행)"""
+        if interval is not None:
+            self.loop_lag.interval = interval
+        await self.loop_lag.run()
+
+    def render(self, server) -> str:
+        """서버 상태를 포함한 Prometheus 텍스트"""
+        lines = [
+            "# TYPE relay_uptime_seconds gauge",
+            f"relay_uptime_seconds {time.time() - self.started_at:.3f}",
+            "# TYPE relay_sessions gauge",
+            f"relay_sessions {len(server.sessions)}",
+            "# TYPE relay_connections gauge",
+            f"relay_connections {len(server.clients)}",
+        ]
+
+        lines.append("# TYPE relay_session_clients gauge")
+        buffers = Histogram(BUFFER_BUCKETS)
+        clock_stats: Dict[str, Tuple[int, float, float, float]] = {}
+        buffer_max: Dict[str, int] = {}
+        for session_id, session in server.sessions.items():
+            roles: Dict[str, int] = {}
+            for client in session.clients:
+                roles[client.role] = roles.get(client.role, 0) + 1
+                depth = write_buffer_size(client.websocket)
+                buffers.observe(depth)
+                if depth > buffer_max.get(session_id, -1):
+                    buffer_max[session_id] = depth
+            for role, count in roles.items():
+                lines.append(f'relay_session_clients{{session="{escape(session_id)}",role="{escape(role)}"}} {count}')
+            clock = session_clock_stats(session.clients)
+            if clock is not None:
+                clock_stats[session_id] = clock
+
+        # ping/pong 으로 측정한 세션별 클라이언트 RTT·시계 오프셋
+        lines.append("# TYPE relay_session_clock_clients gauge")
+        for session_id, (measured, _, _, _) in clock_stats.items():
+            lines.append(f'relay_session_clock_clients{{session="{escape(session_id)}"}} {measured}')
+        lines.append("# TYPE relay_session_rtt_seconds gauge")
+        for session_id, (_, rtt_avg, rtt_max, _) in clock_stats.items():
+            lines.append(f'relay_session_rtt_seconds{{session="{escape(session_id)}",stat="avg"}} {rtt_avg / 1000:.6f}')
+            lines.append(f'relay_session_rtt_seconds{{session="{escape(session_id)}",stat="max"}} {rtt_max / 1000:.6f}')
+        lines.append("# TYPE relay_session_clock_offset_max_seconds gauge")
+        for session_id, (_, _, _, offset_max) in clock_stats.items():
+            lines.append(f'relay_session_clock_offset_max_seconds{{session="{escape(session_id)}"}} {offset_max / 1000:.6f}')
+
+        lines.append("# TYPE relay_messages_in_total counter")
+        for msg_type, count in self.messages_in.items():
+            lines.append(f'relay_messages_in_total{{type="{escape(msg_type)}"}} {count}')
+
+        lines.append("# TYPE relay_messages_out_total counter")
+        messages_out = dict(self.messages_out)
+        for kind, count in server.fanout.stats.frames_by_kind.items():
+            messages_out[kind] = messages_out.get(kind, 0) + count
+        for msg_type, count in messages_out.items():
+            lines.append(f'relay_messages_out_total{{type="{escape(msg_type)}"}} {count}')
+
+        fanout = server.fanout.stats
+        lines += [
+            "# TYPE relay_fanout_send_failures_total counter",
+            f"relay_fanout_send_failures_total {fanout.send_failures}",
+            "# TYPE relay_fanout_skipped_closed_total counter",
+            f"relay_fanout_skipped_closed_total {fanout.skipped_closed}",
+        ]
+
+        lines += [
+            "# TYPE relay_outbound_backlogged_connections gauge",
+            f"relay_outbound_backlogged_connections {len(server.fanout.mailboxes)}",
+            "# TYPE relay_outbound_queued_total counter",
+            f"relay_outbound_queued_total {fanout.queued}",
+            "# TYPE relay_outbound_conflated_total counter",
+            f"relay_outbound_conflated_total {fanout.conflated}",
+            "# TYPE relay_slow_client_disconnects_total counter",
+        ]
+        for reason, count in fanout.slow_disconnects.items():
+            lines.append(f'relay_slow_client_disconnects_total{{reason="{escape(reason)}"}} {count}')
+
+        compression = server.fanout.compression
+        lines += [
+            "# TYPE relay_compression_info gauge",
+            f'relay_compression_info{{mode="{escape(compression.mode)}"}} 1',
+            "# TYPE relay_compression_frames_total counter",
+            f'relay_compression_frames_total{{path="shared"}} {compression.stats.shared_frames}',
+            f'relay_compression_frames_total{{path="uncompressed"}} {compression.stats.uncompressed_frames}',
+            f'relay_compression_frames_total{{path="per_connection"}} {compression.stats.per_connection_frames}',
+            "# TYPE relay_compression_shared_compressions_total counter",
+            f"relay_compression_shared_compressions_total {compression.stats.shared_compressions}",
+            "# TYPE relay_compression_shared_bytes_total counter",
+            f'relay_compression_shared_bytes_total{{stage="in"}} {compression.stats.bytes_in}',
+            f'relay_compression_shared_bytes_total{{stage="out"}} {compression.stats.bytes_out}',
+        ]
+
+        coalesce = server.coalescer.stats
+        lines += [
+            "# TYPE relay_tally_updates_received_total counter",
+            f"relay_tally_updates_received_total {coalesce.received}",
+            "# TYPE relay_tally_updates_emitted_total counter",
+            f"relay_tally_updates_emitted_total {coalesce.emitted}",
+            "# TYPE relay_tally_updates_coalesced_total counter",
+            f"relay_tally_updates_coalesced_total {coalesce.coalesced}",
+        ]
+
+        lines.append("# TYPE relay_fanout_duration_seconds histogram")
+        lines += self.fanout_seconds.render("relay_fanout_duration_seconds")
+        lines.append("# TYPE relay_encode_duration_seconds histogram")
+        lines += self.encode_seconds.render("relay_encode_duration_seconds")
+        lines.append("# TYPE relay_event_loop_lag_seconds histogram")
+        lines += self.loop_lag_seconds.render("relay_event_loop_lag_seconds")
+        lines += [
+            "# TYPE relay_event_loop_lag_max_seconds gauge",
+            f"relay_event_loop_lag_max_seconds {self.loop_lag.max_seconds}",
+            "# TYPE relay_event_loop_lag_slow_total counter",
+            f"relay_event_loop_lag_slow_total {self.loop_lag.slow_samples}",
+            "# TYPE relay_event_loop_info gauge",
+            f'relay_event_loop_info{{loop="{loop_name()}"}} 1',
+        ]
+
+        timings = getattr(server, "timings", None)
+        if timings is not None:
+            lines.append("# TYPE relay_handler_duration_seconds histogram")
+            for name, histogram in timings.durations.items():
+                lines += histogram.render("relay_handler_duration_seconds", f'handler="{name}"')
+            lines.append("# TYPE relay_slow_operations_total counter")
+            for name, count in timings.slow.items():
+                lines.append(f'relay_slow_operations_total{{handler="{name}"}} {count}')
+
+        lines.append("# TYPE relay_outbound_buffer_bytes histogram")
+        lines += buffers.render("relay_outbound_buffer_bytes")
+        lines.append("# TYPE relay_session_outbound_buffer_max_bytes gauge")
+        for session_id, depth in buffer_max.items():
+            lines.append(f'relay_session_outbound_buffer_max_bytes{{session="{escape(session_id)}"}} {depth}')
+
+        liveness = server.liveness
+        lines += [
+            "# TYPE relay_liveness_tracked_connections gauge",
+            f"relay_liveness_tracked_connections {len(liveness.last_seen)}",
+            "# TYPE relay_liveness_pings_sent_total counter",
+            f"relay_liveness_pings_sent_total {liveness.stats.pings_sent}",
+            "# TYPE relay_liveness_reaped_total counter",
+            f"relay_liveness_reaped_total {liveness.stats.reaped}",
+        ]
+
+        legacy = getattr(server, "legacy", None)
+        if legacy is not None:
+            lines += [
+                "# TYPE relay_legacy_connections gauge",
+                f"relay_legacy_connections {len(legacy.members)}",
+                "# TYPE relay_legacy_sessions gauge",
+                f"relay_legacy_sessions {len(legacy.sessions)}",
+                "# TYPE relay_legacy_relayed_total counter",
+                f"relay_legacy_relayed_total {legacy.relayed}",
+                "# TYPE relay_legacy_bulletins gauge",
+                f"relay_legacy_bulletins {len(legacy.bulletins)}",
+                "# TYPE relay_legacy_bulletins_evicted_total counter",
+                f"relay_legacy_bulletins_evicted_total {legacy.evicted_bulletins}",
+            ]
+
+        lines += [
+            "# TYPE relay_quality_samples_total counter",
+            f"relay_quality_samples_total {server.quality.samples}",
+            "# TYPE relay_quality_summaries_total counter",
+            f"relay_quality_summaries_total {server.quality.summaries}",
+        ]
+
+        history = getattr(server, "history", None)
+        if history is not None:
+            lines += [
+                "# TYPE relay_history_buffered gauge",
+                f"relay_history_buffered {len(history.buffer)}",
+                "# TYPE relay_history_recorded_total counter",
+                f"relay_history_recorded_total {history.stats.recorded}",
+                "# TYPE relay_history_written_total counter",
+                f"relay_history_written_total {history.stats.written}",
+                "# TYPE relay_history_dropped_total counter",
+                f"relay_history_dropped_total {history.stats.dropped}",
+                "# TYPE relay_history_write_failures_total counter",
+                f"relay_history_write_failures_total {history.stats.write_failures}",
+                "# TYPE relay_history_write_seconds_total counter",
+                f"relay_history_write_seconds_total {history.stats.write_seconds}",
+            ]
+
+        admission = server.admission
+        lines += [
+            "# TYPE relay_admission_connected_addresses gauge",
+            f"relay_admission_connected_addresses {len(admission.connections)}",
+            "# TYPE relay_admission_pending gauge",
+            f"relay_admission_pending {len(admission.pending)}",
+            "# TYPE relay_admission_admitted_total counter",
+            f"relay_admission_admitted_total {admission.stats.admitted}",
+            "# TYPE relay_admission_priority_total counter",
+            f"relay_admission_priority_total {admission.stats.priority}",
+            "# TYPE relay_admission_queued_total counter",
+            f"relay_admission_queued_total {admission.stats.queued}",
+            "# TYPE relay_admission_rejected_total counter",
+        ]
+        for reason, count in admission.stats.rejected.items():
+            lines.append(f'relay_admission_rejected_total{{reason="{escape(reason)}"}} {count}')
+
+        # Redis 백플레인 연결 상태 (끊겨 있으면 노드 간 상태 전달이 멈춘다)
+        transport = getattr(getattr(server, "cluster", None), "transport", None)
+        backplane = getattr(transport, "backplane", None)
+        if getattr(backplane, "stats", None) is not None:
+            lines += [
+                "# TYPE relay_backplane_connected gauge",
+                f"relay_backplane_connected {int(backplane.connected)}",
+                "# TYPE relay_backplane_disconnects_total counter",
+                f"relay_backplane_disconnects_total {backplane.stats.disconnects}",
+                "# TYPE relay_backplane_reconnects_total counter",
+                f"relay_backplane_reconnects_total {backplane.stats.reconnects}",
+                "# TYPE relay_backplane_reconnect_failures_total counter",
+                f"relay_backplane_reconnect_failures_total {backplane.stats.failed_attempts}",
+                "# TYPE relay_backplane_dropped_publishes_total counter",
+                f"relay_backplane_dropped_publishes_total {backplane.stats.dropped_publishes}",
+            ]
+
+        token_cache = getattr(server, "token_cache", None)
+        if token_cache is not None:
+            auth = token_cache.stats
+            lines += [
+                "# TYPE relay_auth_cache_hits_total counter",
+                f"relay_auth_cache_hits_total {auth.hits}",
+                "# TYPE relay_auth_cache_misses_total counter",
+                f"relay_auth_cache_misses_total {auth.misses}",
+                "# TYPE relay_auth_verify_seconds_total counter",
+                f"relay_auth_verify_seconds_total {auth.verify_seconds}",
+                "# TYPE relay_auth_verifications_total counter",
+                f"relay_auth_verifications_total {auth.verifications}",
+            ]
+
+        return "\n".join(lines) + "\n"
+
+    def process_request_hook(self, server):
+        """websockets.serve(process_request=...) 용 훅. /metrics 만 HTTP 로 응답"""
+        async def process_request(path: str, request_headers) -> Optional[Tuple]:
+            if path.split("?", 1)[0] != METRICS_PATH:
+                return None
+            body = self.render(server).encode("utf-8")
+            return (
+                http.HTTPStatus.OK,
+                [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")],
+                body
+            )
+        return process_request
+
+
+def write_buffer_size(websocket) -> int:
+    """연결의 송신 버퍼에 쌓인 바이트 수"""
+    transport = getattr(websocket, "transport", None)
+    if transport is None:
+        return 0
+    try:
+        return transport.get_write_buffer_size()
+    except Exception:
+        return 0
+
+
+def escape(value) -> str:
+    """Prometheus 레이블 값 이스케이프"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,206 @@
+import asyncio
+import functools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+from codec import dumps
+from metrics import Histogram, LATENCY_BUCKETS
+
+# 이 시간(ms)보다 오래 걸린 핸들러는 세션·클라이언트 수·페이로드 크기와 함께 경고 로그
+SLOW_OPERATION_MS = float(os.environ.get("RELAY_SLOW_OP_MS", "50"))
+# 설정되어 있으면 이 경로에 관리용 Unix 소켓을 연다 (예: echo "profile 30" | nc -U /run/relay-admin.sock)
+ADMIN_SOCKET = os.environ.get("RELAY_ADMIN_SOCKET")
+# 프로파일 파일을 쓸 디렉터리
+PROFILE_DIR = os.environ.get("RELAY_PROFILE_DIR", tempfile.gettempdir())
+
+# 샘플링 간격 (초) 과 한 번에 허용하는 최대 프로파일 시간 (초)
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_SECONDS = 300.0
+PROFILE_DEFAULT_SECONDS = 10.0
+
+T = TypeVar("T")
+
+# 현재 태스크에서 측정 중인 핸들러와 그 시간에서 뺄 누적 시간 [초].
+# 하위 태스크는 컨텍스트를 복사해 가므로 같은 태스크일 때만 쓴다
+_measuring: ContextVar[Optional[Tuple[object, List[float]]]] = ContextVar("relay_measuring", default=None)
+
+
+class HandlerTimings:
+    """핸들러별 소요 시간 히스토그램과 느린 작업 로그"""
+
+    def __init__(self, slow_ms: float = SLOW_OPERATION_MS):
+        self.slow_seconds = slow_ms / 1000
+        self.durations: Dict[str, Histogram] = {}
+        self.slow: Dict[str, int] = {}
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.durations.get(name)
+        if histogram is None:
+            histogram = self.durations[name] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+
+    def log_slow(self, name: str, seconds: float, server, client, args):
+        """느린 작업 기록. 세션 정보는 이때만 찾는다"""
+        self.slow[name] = self.slow.get(name, 0) + 1
+        session_id = getattr(client, "session_id", None)
+        payload = args[0] if args else None
+        if session_id is None and isinstance(payload, dict):
+            session_id = payload.get("sessionId")
+        session = server.sessions.get(session_id) if session_id else None
+        clients = len(session.clients) if session is not None else 0
+        if isinstance(payload, (str, bytes)):
+            size = len(payload)
+        elif isinstance(payload, dict):
+            size = len(dumps(payload))
+        else:
+            size = 0
+        logging.warning(
+            f"느린 작업 {name}: {seconds * 1000:.1f}ms "
+            f"(session {session_id or '-'}, clients {clients}, payload {size}B)"
+        )
+
+
+def _excluded_in_task() -> Optional[List[float]]:
+    measuring = _measuring.get()
+    if measuring is None or measuring[0] is not asyncio.current_task():
+        return None
+    return measuring[1]
+
+
+async def untimed(awaitable: Awaitable[T]) -> T:
+    """측정 중인 핸들러 시간에서 빠지는 대기 (등록 허용 대기처럼 처리 비용이 아닌 구간)"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        excluded = _excluded_in_task()
+        if excluded is not None:
+            excluded[0] += time.perf_counter() - started
+
+
+def timed(name: str):
+    """(self, websocket 또는 Client, payload...) 형태의 서버 코루틴 메서드 소요 시간 측정
+
+    중첩된 측정(handle_message 안의 register_client 등)은 안쪽 이름으로만 기록하고
+    바깥 핸들러 시간에서는 뺀다. untimed 로 감싼 대기 시간도 뺀다.
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, target, *args):
+            # 연결 해제 후에는 clients 에서 빠지므로 세션 정보용 Client 를 먼저 잡아 둔다
+            client = self.clients.get(target) or target
+            outer = _excluded_in_task()
+            excluded = [0.0]
+            token = _measuring.set((asyncio.current_task(), excluded))
+            started = time.perf_counter()
+            try:
+                return await method(self, target, *args)
+            finally:
+                total = time.perf_counter() - started
+                _measuring.reset(token)
+                if outer is not None:
+                    outer[0] += total
+                elapsed = total - excluded[0]
+                self.timings.observe(name, elapsed)
+                if elapsed >= self.timings.slow_seconds:
+                    self.timings.log_slow(name, elapsed, self, client, args)
+        return wrapper
+    return decorate
+
+
+class SamplingProfiler:
+    """이벤트 루프 스레드의 스택을 주기적으로 찍어 접힌 스택(folded) 형식으로 저장
+
+    별도 스레드가 sys._current_frames() 로 대상 스레드의 스택만 읽으므로 루프 쪽에는
+    계측 코드가 없다. 결과 파일은 flamegraph.pl 이나 speedscope 로 바로 볼 수 있다.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL, directory: str = PROFILE_DIR):
+        self.interval = interval
+        self.directory = directory
+        self.running = False
+
+    async def profile(self, seconds: float) -> str:
+        """현재 스레드(이벤트 루프)를 seconds 동안 샘플링하고 프로파일 파일 경로 반환"""
+        if self.running:
+            raise RuntimeError("profiling already in progress")
+        seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+        target = threading.get_ident()
+        path = os.path.join(self.directory, f"relay-profile-{os.getpid()}-{int(time.time())}.folded")
+        self.running = True
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._sample, target, seconds, path
+            )
+        finally:
+            self.running = False
+
+    def _sample(self, target: int, seconds: float, path: str) -> str:
+        stacks: Dict[str, int] = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(target)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                # 줄 번호 대신 함수 시작 줄을 써서 같은 함수의 샘플이 한 프레임으로 모이게 한다
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                stacks[stack] = stacks.get(stack, 0) + 1
+            time.sleep(self.interval)
+
+        with open(path, "w") as f:
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        logging.info(f"프로파일 저장: {path} (샘플 {sum(stacks.values())}개)")
+        return path
+
+
+async def start_admin_socket(server, path: str = ADMIN_SOCKET) -> Optional[asyncio.AbstractServer]:
+    """관리용 Unix 소켓 (소유자만 접근). 한 줄 명령:
+
+    profile [초]  이벤트 루프를 샘플링해 프로파일 파일 경로를 돌려준다
+    timings       핸들러별 호출 수·누적 시간(중첩 호출·대기 제외)·느린 작업 수 (JSON)
+    """
+    if not path:
+        return None
+    profiler = SamplingProfiler()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            command = (await reader.readline()).decode("utf-8", "replace").split()
+            if command and command[0] == "profile":
+                seconds = float(command[1]) if len(command) > 1 else PROFILE_DEFAULT_SECONDS
+                try:
+                    reply = await profiler.profile(seconds)
+                except RuntimeError as e:
+                    reply = f"error: {e}"
+            elif command and command[0] == "timings":
+                reply = dumps({
+                    name: {"count": histogram.count, "seconds": histogram.sum,
+                           "slow": server.timings.slow.get(name, 0)}
+                    for name, histogram in server.timings.durations.items()
+                })
+            else:
+                reply = "commands: profile [seconds], timings"
+            writer.write(reply.encode("utf-8") + b"\n")
+            await writer.drain()
+        except (ValueError, OSError) as e:
+            logging.warning(f"관리 소켓 명령 오류: {e}")
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    admin = await asyncio.start_unix_server(handle, path)
+    os.chmod(path, 0o600)
+    logging.info(f"관리 소켓: {path}")
+    return admin
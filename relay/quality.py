@@ -0,0 +1,232 @@
+import asyncio
+import math
+import os
+import time
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from codec import dumps
+
+# 이미지에는 numpy 가 설치된다 (requirements.txt). 없거나 RELAY_QUALITY_NUMPY=0 이면 표준 array 사용
+_PREFERRED_NUMPY = os.environ.get("RELAY_QUALITY_NUMPY", "1") == "1"
+
+try:
+    if not _PREFERRED_NUMPY:
+        raise ImportError
+    import numpy as np
+except ImportError:
+    np = None
+
+# 클라이언트 품질 리포트에서 모으는 값 (bitrateHandler.ts 의 quality_metrics_report 필드)
+QUALITY_FIELDS = ("packetLoss", "jitter", "roundTripTime", "bandwidth", "fps")
+# 세션별 링 버퍼 크기 (샘플 수)
+QUALITY_WINDOW = int(os.environ.get("RELAY_QUALITY_WINDOW", "1024"))
+# 이 시간(초)보다 오래된 샘플은 요약에서 뺀다
+QUALITY_MAX_AGE = float(os.environ.get("RELAY_QUALITY_MAX_AGE", "10"))
+# PD 에게 요약을 보내는 주기 (초)
+QUALITY_SUMMARY_INTERVAL = float(os.environ.get("RELAY_QUALITY_INTERVAL", "1.0"))
+# 요약에 넣는 품질이 나쁜 클라이언트 수
+QUALITY_WORST_CLIENTS = 3
+# 세션에서 구분해 둘 클라이언트 라벨 수 (넘으면 버퍼를 비우고 다시 시작)
+QUALITY_MAX_CLIENTS = 4096
+
+_PERCENTILES = (("p50", 0.50), ("p95", 0.95))
+
+
+class QualityRing:
+    """세션 하나의 품질 샘플 고정 크기 링 버퍼
+
+    샘플마다 파이썬 객체를 만들지 않도록 값은 (capacity × 필드 수) float64 배열 하나,
+    클라이언트 번호와 수신 시각은 각각 int32/float64 배열에 둔다. numpy 가 없으면
+    같은 배치의 표준 array 를 쓴다.
+    """
+
+    __slots__ = ("capacity", "values", "clients", "times", "size", "next", "labels", "slots", "dirty")
+
+    def __init__(self, capacity: int = QUALITY_WINDOW):
+        self.capacity = capacity
+        width = len(QUALITY_FIELDS)
+        if np is not None:
+            self.values = np.zeros((capacity, width), dtype=np.float64)
+            self.clients = np.zeros(capacity, dtype=np.int32)
+            self.times = np.zeros(capacity, dtype=np.float64)
+        else:
+            self.values = array("d", bytes(8 * capacity * width))
+            self.clients = array("i", bytes(4 * capacity))
+            self.times = array("d", bytes(8 * capacity))
+        self.size = 0
+        self.next = 0
+        self.labels: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.dirty = False
+
+    def append(self, label: str, sample: List[float], now: float):
+        slot = self.slots.get(label)
+        if slot is None:
+            if len(self.labels) >= QUALITY_MAX_CLIENTS:
+                self.size = self.next = 0
+                self.labels.clear()
+                self.slots.clear()
+            slot = self.slots[label] = len(self.labels)
+            self.labels.append(label)
+
+        index = self.next
+        if np is not None:
+            self.values[index] = sample
+        else:
+            width = len(QUALITY_FIELDS)
+            self.values[index * width:(index + 1) * width] = array("d", sample)
+        self.clients[index] = slot
+        self.times[index] = now
+        self.next = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.dirty = True
+
+    def summary(self, now: float, max_age: float = QUALITY_MAX_AGE,
+                worst: int = QUALITY_WORST_CLIENTS) -> Optional[Dict]:
+        """max_age 안의 샘플로 필드별 백분위와 패킷 손실(동률이면 RTT)이 큰 클라이언트 목록 계산"""
+        self.dirty = False
+        if np is not None:
+            return self._summary_numpy(now - max_age, worst)
+        return self._summary_array(now - max_age, worst)
+
+    def _summary_numpy(self, since: float, worst: int) -> Optional[Dict]:
+        fresh = self.times[:self.size] >= since
+        if not fresh.any():
+            return None
+        values = self.values[:self.size][fresh]
+        clients = self.clients[:self.size][fresh]
+        ordered = np.sort(values, axis=0)
+        count = len(ordered)
+        metrics = {}
+        for column, field in enumerate(QUALITY_FIELDS):
+            stats = {name: float(ordered[min(count - 1, int(count * fraction)), column])
+                     for name, fraction in _PERCENTILES}
+            stats["max"] = float(ordered[-1, column])
+            metrics[field] = stats
+
+        # 클라이언트별 평균: 슬롯 번호로 bincount
+        samples = np.bincount(clients, minlength=len(self.labels))
+        present = np.nonzero(samples)[0]
+        means = np.stack([
+            np.bincount(clients, weights=values[:, column], minlength=len(self.labels))[present] / samples[present]
+            for column in range(len(QUALITY_FIELDS))
+        ], axis=1)
+        loss, rtt = QUALITY_FIELDS.index("packetLoss"), QUALITY_FIELDS.index("roundTripTime")
+        rank = np.lexsort((-means[:, rtt], -means[:, loss]))[:worst]
+        return quality_summary(count, len(present), metrics, [
+            (self.labels[present[row]], [float(value) for value in means[row]]) for row in rank
+        ])
+
+    def _summary_array(self, since: float, worst: int) -> Optional[Dict]:
+        width = len(QUALITY_FIELDS)
+        rows = [index for index in range(self.size) if self.times[index] >= since]
+        if not rows:
+            return None
+        count = len(rows)
+        metrics = {}
+        for column, field in enumerate(QUALITY_FIELDS):
+            ordered = sorted(self.values[index * width + column] for index in rows)
+            stats = {name: ordered[min(count - 1, int(count * fraction))] for name, fraction in _PERCENTILES}
+            stats["max"] = ordered[-1]
+            metrics[field] = stats
+
+        totals: Dict[int, List[float]] = {}
+        for index in rows:
+            total = totals.setdefault(self.clients[index], [0.0] * (width + 1))
+            for column in range(width):
+                total[column] += self.values[index * width + column]
+            total[width] += 1
+        means = {slot: [value / total[width] for value in total[:width]] for slot, total in totals.items()}
+        loss, rtt = QUALITY_FIELDS.index("packetLoss"), QUALITY_FIELDS.index("roundTripTime")
+        rank = sorted(means, key=lambda slot: (means[slot][loss], means[slot][rtt]), reverse=True)[:worst]
+        return quality_summary(count, len(means), metrics, [(self.labels[slot], means[slot]) for slot in rank])
+
+
+def quality_summary(samples: int, clients: int, metrics: Dict, worst: List) -> Dict:
+    return {
+        "samples": samples,
+        "clients": clients,
+        "metrics": metrics,
+        "worst": [{"client": label, **dict(zip(QUALITY_FIELDS, means))} for label, means in worst]
+    }
+
+
+def parse_quality_sample(data: Dict) -> Optional[List[float]]:
+    """quality_metrics 메시지의 숫자 필드 (없으면 0). 숫자가 하나도 없거나 NaN·Infinity 가 있으면 None"""
+    sample = []
+    found = False
+    for field in QUALITY_FIELDS:
+        value = data.get(field)
+        if type(value) in (int, float):
+            # 표준 json 은 NaN/Infinity 를 받아들인다. 백분위수와 순위를 망가뜨리므로 리포트째 버린다
+            if not math.isfinite(value):
+                return None
+            sample.append(float(value))
+            found = True
+        else:
+            sample.append(0.0)
+    return sample if found else None
+
+
+def client_label(client) -> str:
+    """cameraId·userId 가 없는 클라이언트의 표시 이름"""
+    remote_address = client.websocket.remote_address
+    if not remote_address:
+        return str(client.role)
+    return f"{client.role}@{remote_address[0]}:{remote_address[1]}"
+
+
+class QualityReporter:
+    """클라이언트 품질 리포트를 세션별 링 버퍼에 모으고, interval 마다 PD 에게 요약 하나만 전송
+
+    스태프 N명의 리포트를 PD 에게 각각 전달하는 대신 세션당 주기마다 메시지 하나로 줄인다.
+    링 버퍼는 첫 리포트가 올 때 세션에 만든다.
+    """
+
+    def __init__(self, fanout, sessions: Dict, interval: float = QUALITY_SUMMARY_INTERVAL,
+                 capacity: int = QUALITY_WINDOW, clock: Callable[[], float] = time.monotonic):
+        self.fanout = fanout
+        self.sessions = sessions
+        self.interval = interval
+        self.capacity = capacity
+        self.clock = clock
+        self.samples = 0
+        self.summaries = 0
+
+    def record(self, session, client, data: Dict) -> bool:
+        sample = parse_quality_sample(data)
+        if sample is None:
+            return False
+        if session.quality is None:
+            session.quality = QualityRing(self.capacity)
+        label = data.get("cameraId") or client.user_id or client_label(client)
+        session.quality.append(str(label), sample, self.clock())
+        self.samples += 1
+        return True
+
+    def push(self):
+        """새 샘플이 있는 세션의 PD 에게 요약 전송"""
+        now = self.clock()
+        for session in self.sessions.values():
+            ring = session.quality
+            if ring is None or not ring.dirty or session.pd_client is None:
+                continue
+            summary = ring.summary(now)
+            if summary is None:
+                continue
+            message = dumps({
+                "type": "quality_summary",
+                "sessionId": session.session_id,
+                "window": QUALITY_MAX_AGE,
+                **summary,
+                "timestamp": datetime.now().isoformat()
+            })
+            self.fanout.broadcast([session.pd_client], message, "quality_summary")
+            self.summaries += 1
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.push()
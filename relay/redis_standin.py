@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+로컬 Redis 대역 서버
+RedisBackplane 이 쓰는 명령(PING, AUTH, PUBLISH, SUBSCRIBE, UNSUBSCRIBE)만
+RESP 로 구현한다. 실제 Redis 없이 여러 릴레이 노드를 띄워 백플레인을 확인할 때 사용.
+
+예: python redis_standin.py --port 6379
+    RELAY_BACKPLANE_URL=redis://127.0.0.1:6379 RELAY_NODE_ID=a RELAY_NODES=a,b python relay_server.py
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Dict, Set
+
+from backplane import encode_command, read_reply
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def subscription_reply(kind: bytes, channel: bytes, count: int) -> bytes:
+    """SUBSCRIBE/UNSUBSCRIBE 확인 응답 ([kind, channel, 구독 수])"""
+    return b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n:%d\r\n" % (
+        len(kind), kind, len(channel), channel, count
+    )
+
+
+class RedisStandIn:
+    """pub/sub 만 지원하는 최소 RESP 서버"""
+
+    def __init__(self):
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR protocol error\r\n")
+                    continue
+                name = command[0].upper()
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == b"AUTH":
+                    writer.write(b"+OK\r\n")
+                elif name == b"PUBLISH":
+                    _, channel, payload = command
+                    receivers = self.channels.get(channel, ())
+                    message = encode_command("message", channel, payload)
+                    for receiver in receivers:
+                        receiver.write(message)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in command[1:]:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        subscribed.add(channel)
+                        writer.write(subscription_reply(b"subscribe", channel, len(subscribed)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in command[1:]:
+                        self._remove(channel, writer)
+                        subscribed.discard(channel)
+                        writer.write(subscription_reply(b"unsubscribe", channel, len(subscribed)))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self._remove(channel, writer)
+            writer.close()
+
+    def _remove(self, channel: bytes, writer: asyncio.StreamWriter):
+        receivers = self.channels.get(channel)
+        if receivers is not None:
+            receivers.discard(writer)
+            if not receivers:
+                del self.channels[channel]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Minimal Redis pub/sub stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    standin = RedisStandIn()
+    server = await asyncio.start_server(standin.handle, args.host, args.port)
+    logging.info(f"Redis 대역 서버 시작: redis://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logging.info("서버 종료")
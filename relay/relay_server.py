@@ -1,102 +1,308 @@
 import asyncio
 import logging
-import json
+import os
+import time
 import websockets
 from websockets.exceptions import ConnectionClosed
-from typing import Dict, Set, Optional
+from websockets.frames import prepare_data
+from typing import Dict, FrozenSet, List, Set, Optional, Union
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from admission import AdmissionController, CLOSE_TRY_AGAIN_LATER, client_address
+from backplane import cluster_from_env
+from codec import dumps, loads, peek_type, DecodeError
+from compression import serve_options
+from eventloop import install_event_loop, loop_name
+from fanout import FanoutEngine
+from history import HistoryRecorder, history_from_env
+from lean import PD_ROLES, Role, connection_limits, intern_id, monotonic_seconds, parse_role, slotted
+from legacy import LEGACY_PROTOCOL, LegacyRelay, is_register_message, legacy_session_id
+from liveness import LivenessTracker
+from metrics import RelayMetrics
+from profiling import HandlerTimings, start_admin_socket, timed, untimed
+from quality import QualityReporter, QualityRing
+from resume import ReplayBuffer, ResumeRegistry, SESSION_GRACE_PERIOD
+from subscriptions import InputSubscriptions, input_state, input_tally_message, parse_subscription
+from tally import diff_tally_state, delta_message, merge_tally_update, SnapshotCache, SnapshotBatcher, TallyCoalescer
+from timesync import TALLY_SERVER_TIME, pong_message, server_time_ms, update_clock
+from wire import BINARY_SUBPROTOCOL
+
+# 등록 전에 허용되는 메시지 type
+REGISTER_TYPES = ("register", "register_pd")
+
+# 미리 인코딩해 둔 pong 응답
+PONG_MESSAGE = dumps({"type": "pong"})
+PONG_FRAME = prepare_data(PONG_MESSAGE)
+
 # 로깅 설정
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-@dataclass
+# 세션 초기 탈리 상태. 상태는 항상 새 dict 로 교체되고 제자리 수정되지 않으므로 모든 세션이 공유한다
+INITIAL_TALLY_STATE = {
+    "program": None,
+    "preview": None,
+    "inputs": {}
+}
+
+@slotted
+@dataclass(eq=False)
 class Client:
     """클라이언트 정보를 저장하는 클래스"""
     websocket: websockets.WebSocketServerProtocol
     session_id: Optional[str] = None
-    role: str = "viewer"  # pd, camera, staff, viewer
+    role: Union[Role, str] = Role.VIEWER  # pd, camera, staff, viewer
     user_id: Optional[str] = None
-    connected_at: datetime = field(default_factory=datetime.now)
+    connected_at: int = field(default_factory=monotonic_seconds)
+    delta: bool = False  # tally_delta(변경분) 수신 여부
+    binary: bool = False  # 바이너리 서브프로토콜 협상 여부
+    resume_token: Optional[str] = None  # 재접속 시 놓친 변경만 받기 위한 토큰
+    inputs: Optional[FrozenSet[str]] = None  # 구독한 입력 id (None 이면 전체 상태 수신)
+    rtt: Optional[float] = None  # ping/pong 으로 추정한 평활 RTT (ms)
+    clock_offset: Optional[float] = None  # 서버 시계 - 클라이언트 시계 (ms)
+    pd_claim: Optional[str] = None  # 멀티 워커 모드에서 소유 노드가 허락한 PD 연결 id
 
+@slotted
 @dataclass
 class Session:
     """방송 세션 정보를 저장하는 클래스"""
     session_id: str
     pd_client: Optional[Client] = None
     clients: Set[Client] = field(default_factory=set)
-    tally_state: Dict = field(default_factory=lambda: {
-        "program": None,
-        "preview": None,
-        "inputs": {}
-    })
-    created_at: datetime = field(default_factory=datetime.now)
+    tally_state: Dict = field(default_factory=lambda: INITIAL_TALLY_STATE)
+    created_at: int = field(default_factory=monotonic_seconds)
+    seq: int = 0  # 탈리 상태 변경마다 1씩 증가
+    snapshot: SnapshotCache = field(default_factory=SnapshotCache)
+    replay: ReplayBuffer = field(default_factory=ReplayBuffer)  # 재접속 클라이언트용 최근 변경
+    expiry: Optional[asyncio.TimerHandle] = None  # 비어 있는 세션의 제거 예약
+    subscriptions: InputSubscriptions = field(default_factory=InputSubscriptions)  # 입력별 구독 색인
+    quality: Optional[QualityRing] = None  # 클라이언트 품질 리포트 링 버퍼 (첫 리포트 때 생성)
 
 class RelayServer:
-    def __init__(self):
+    def __init__(self, cluster=None, legacy: bool = LEGACY_PROTOCOL, history: Optional[HistoryRecorder] = None):
         self.sessions: Dict[str, Session] = {}
         self.clients: Dict[websockets.WebSocketServerProtocol, Client] = {}
+        self.fanout = FanoutEngine()
+        self.snapshots = SnapshotBatcher(self.fanout, self.drop_dead_clients)
+        self.coalescer = TallyCoalescer(self.handle_tally_update)
+        self.metrics = RelayMetrics()
+        # 핸들러별 소요 시간과 느린 작업 로그 (RELAY_SLOW_OP_MS)
+        self.timings = HandlerTimings()
+        # 타이머 휠 기반 유휴 연결 확인 (websockets 의 연결별 keepalive 태스크 대신)
+        self.liveness = LivenessTracker()
+        # 짧게 끊겼다 돌아온 클라이언트용 resume 토큰과 빈 세션 보존 시간
+        self.resume = ResumeRegistry()
+        # 재접속 폭주 때 새 연결·등록 제한 (주소별 연결 수, 등록 토큰 버킷, 대기열)
+        self.admission = AdmissionController()
+        self.session_grace = SESSION_GRACE_PERIOD
+        # 스태프 품질 리포트를 모아 PD 에게 주기적으로 요약 하나만 전송
+        self.quality = QualityReporter(self.fanout, self.sessions)
+        # 탈리 상태에 serverTime 포함 여부 (RELAY_TALLY_SERVER_TIME)
+        self.server_time = TALLY_SERVER_TIME
+        # 메시지 type → 핸들러. raw_handlers 는 본문 파싱이 필요 없는 제어 메시지용
+        self.message_handlers = {
+            "register": self.on_register,
+            "register_pd": self.on_register_pd,
+            "tally_update": self.on_tally_update,
+            "full_state": self.on_full_state,
+            "input_list": self.on_input_list,
+            "ping": self.on_ping,
+            "quality_metrics": self.on_quality_metrics,
+            "quality_metrics_report": self.on_quality_metrics,
+        }
+        self.raw_handlers = {
+            "ping": self.on_ping,
+        }
+        # main.py 프로토콜 호환: 등록하지 않은 클라이언트는 같은 legacy 세션 안에서만 중계
+        self.legacy = LegacyRelay(self.fanout, Client) if legacy else None
+        # 탈리 변경 이력 write-behind 기록 (RELAY_HISTORY_PATH 가 없으면 None)
+        self.history = history
+        # 멀티 워커/멀티 노드 모드에서 세션 소유권과 상태 전달 담당 (단일 프로세스면 None)
+        self.cluster = cluster
+        if cluster:
+            cluster.attach(self)
+    
+    def ensure_session(self, session_id: str) -> Session:
+        """세션을 가져오거나 없으면 생성"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id=session_id)
+            logging.info(f"새 세션 생성: {session_id}")
+        elif session.expiry is not None:
+            # grace 기간 중 돌아온 세션: 제거 예약 취소
+            session.expiry.cancel()
+            session.expiry = None
+        return session
+    
+    def session_is_idle(self, session: Session) -> bool:
+        """로컬 클라이언트도, 이 세션을 구독하는 다른 노드도 없는지"""
+        if session.clients:
+            return False
+        return not (self.cluster and self.cluster.has_subscribers(session.session_id))
+    
+    def drop_session_if_idle(self, session_id: str) -> bool:
+        """비어 있는 세션 제거 (즉시 제거했으면 True)
+
+        session_grace 가 있으면 그동안 탈리 상태와 replay 버퍼를 보존했다가
+        그때도 비어 있으면 expire_session 에서 제거한다.
+        """
+        session = self.sessions.get(session_id)
+        if session is None or not self.session_is_idle(session):
+            return False
+        if self.session_grace > 0:
+            if session.expiry is None:
+                session.expiry = asyncio.get_running_loop().call_later(
+                    self.session_grace, self.expire_session, session_id
+                )
+            return False
+        del self.sessions[session_id]
+        logging.info(f"빈 세션 제거: {session_id}")
+        return True
+    
+    def expire_session(self, session_id: str):
+        """grace 기간이 끝난 빈 세션 제거"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        session.expiry = None
+        if not self.session_is_idle(session):
+            return
+        del self.sessions[session_id]
+        logging.info(f"빈 세션 제거: {session_id}")
+        if self.cluster:
+            asyncio.ensure_future(self.cluster.leave(session_id))
         
+    @timed("register_client")
     async def register_client(self, websocket, message: Dict):
         """클라이언트를 세션에 등록"""
-        session_id = message.get("sessionId")
-        role = message.get("role", "viewer")
+        session_id = intern_id(message.get("sessionId"))
+        role = parse_role(message.get("role", "viewer"))
         user_id = message.get("userId")
         
         if not session_id:
             await self.send_error(websocket, "sessionId is required")
             return
         
+        # 새 등록은 토큰 버킷을 통과해야 한다 (PD 는 대기 없이 통과). 이 릴레이는 인증이 없어
+        # 역할을 클라이언트가 정하므로 우선순위도 자기 신고를 믿는다. 역할을 위조할 수 있는
+        # 환경이면 isPD 를 검증하는 relay_server_secure 를 쓴다
+        if websocket not in self.clients:
+            cause = await untimed(self.admission.admit(priority=role in PD_ROLES))
+            if cause is not None:
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=self.admission.close_reason(cause))
+                return
+        
         # 클라이언트 객체 생성
         client = Client(
             websocket=websocket,
             session_id=session_id,
             role=role,
-            user_id=user_id
+            user_id=user_id,
+            delta=bool(message.get("delta", False)),
+            binary=websocket.subprotocol == BINARY_SUBPROTOCOL
         )
         
-        # 세션이 없으면 생성
-        if session_id not in self.sessions:
-            self.sessions[session_id] = Session(session_id=session_id)
-            logging.info(f"새 세션 생성: {session_id}")
+        # 카메라 등은 register 때 subscribeInputs 로 자기 입력의 탈리만 받을 수 있다 (JSON 클라이언트)
+        if not client.binary:
+            client.inputs = parse_subscription(message.get("subscribeInputs"), role)
         
-        session = self.sessions[session_id]
+        # 재접속: 같은 세션·역할로 받은 resume 토큰이면 놓친 변경만 보낸다
+        ticket = None
+        if message.get("resumeToken"):
+            ticket = self.resume.claim(message["resumeToken"], session_id, role, user_id)
         
-        # PD 클라이언트 등록
-        if role == "pd" or role == "pd_software":
-            if session.pd_client and session.pd_client.websocket.open:
+        # 세션이 없으면 생성 (멀티 워커 모드에서는 소유 노드에 구독 요청)
+        is_new_session = session_id not in self.sessions
+        session = self.ensure_session(session_id)
+        if is_new_session and self.cluster:
+            await self.cluster.join(session_id)
+        
+        # PD 클라이언트 등록 (멀티 워커 모드에서는 다른 노드의 PD 도 있을 수 있어 소유 노드가 결정)
+        if role in PD_ROLES:
+            previous = session.pd_client
+            if previous and previous.websocket.open and ticket is None:
                 await self.send_error(websocket, "PD already connected to this session")
                 return
+            if self.cluster:
+                client.pd_claim = self.cluster.new_claim()
+                if not await self.cluster.claim_pd(session_id, client.pd_claim, takeover=ticket is not None):
+                    await self.send_error(websocket, "PD already connected to this session")
+                    return
+            if previous and previous.websocket.open:
+                # resume 토큰을 가진 PD 는 아직 정리되지 않은 이전 연결을 대신한다
+                asyncio.ensure_future(previous.websocket.close(reason="Resumed on a new connection"))
             session.pd_client = client
             logging.info(f"PD 클라이언트 등록: {session_id}")
         
-        # 세션에 클라이언트 추가
-        session.clients.add(client)
+        # 세션에 클라이언트 추가 (재접속이면 놓친 변경과 순서가 섞이지 않도록 응답 후에 추가)
+        client.resume_token = self.resume.issue(session_id, role, user_id)
+        if ticket is None:
+            session.clients.add(client)
+            session.subscriptions.add(client)
         self.clients[websocket] = client
+        self.fanout.compression.assign(websocket, role)
         
         # 등록 확인 메시지
-        await websocket.send(json.dumps({
+        self.metrics.count_out("session_registered")
+        await websocket.send(dumps({
             "type": "session_registered",
             "sessionId": session_id,
             "role": role,
+            "seq": session.seq,
+            "resumeToken": client.resume_token,
             "timestamp": datetime.now().isoformat()
         }))
         
+        if ticket is not None:
+            session.clients.add(client)
+            session.subscriptions.add(client)
+            if self.replay_missed(session, client, message.get("lastSeq")):
+                logging.info(f"클라이언트 재접속: {role} in session {session_id} (seq {session.seq})")
+                return
+        
         # 현재 탈리 상태 전송
         if session.tally_state["inputs"]:
-            await websocket.send(json.dumps({
-                "type": "tally_update",
-                **session.tally_state
-            }))
+            self.queue_snapshot(session, client)
         
         logging.info(f"클라이언트 등록 완료: {role} in session {session_id}")
     
+    def queue_snapshot(self, session: Session, client: Client):
+        """클라이언트에게 현재 상태 전송 (입력 구독 클라이언트는 구독한 입력의 상태만)"""
+        if client.inputs is None:
+            self.snapshots.queue(session, client)
+            return
+        timestamp = session.tally_state.get("timestamp")
+        for input_id in client.inputs:
+            program, preview = input_state(session.tally_state, input_id)
+            frame = dumps(input_tally_message(session.seq, input_id, program, preview, timestamp))
+            if self.fanout.broadcast([client], frame, "input_tally", input_id):
+                break
+    
+    def replay_missed(self, session: Session, client: Client, last_seq) -> bool:
+        """last_seq 이후 놓친 변경만 전송 (스냅샷을 보내야 하면 False)"""
+        if type(last_seq) is not int:
+            return False
+        if last_seq == session.seq:
+            return True
+        # 전체 상태/바이너리/입력 구독 클라이언트는 스냅샷이 곧 놓친 변경 전부
+        if client.binary or not client.delta or client.inputs is not None:
+            return False
+        entries = session.replay.since(last_seq)
+        if entries is None:
+            return False
+        for seq, delta, timestamp in entries:
+            frame = dumps(delta_message(seq, delta, timestamp))
+            if self.fanout.broadcast([client], frame, "tally_replay"):
+                break
+        return True
+    
+    @timed("handle_tally_update")
     async def handle_tally_update(self, client: Client, message: Dict):
         """PD로부터 탈리 업데이트 처리"""
-        if client.role not in ["pd", "pd_software"]:
+        if client.role not in PD_ROLES:
             await self.send_error(client.websocket, "Unauthorized to send tally updates")
             return
         
@@ -104,65 +310,213 @@ class RelayServer:
         if not session:
             return
         
-        # 탈리 상태 업데이트
-        session.tally_state.update({
-            "program": message.get("program"),
-            "preview": message.get("preview"),
-            "inputs": message.get("inputs", {}),
-            "timestamp": datetime.now().isoformat()
-        })
+        # 세션 상태를 다른 워커가 소유하면 그쪽에서 갱신
+        if self.cluster:
+            if not self.cluster.is_owner(session.session_id):
+                await self.cluster.forward_update(session.session_id, message, client.pd_claim)
+                return
+            if not self.cluster.accepts_update(session.session_id, client.pd_claim):
+                return
+        
+        await self.apply_tally_update(session, message)
+    
+    async def apply_tally_update(self, session: Session, message: Dict):
+        """탈리 상태 갱신 후 로컬 클라이언트와 구독 노드에 전달"""
+        # 메시지에 없는 필드는 이전 값을 유지 (병합된 업데이트와 같은 결과)
+        new_state = merge_tally_update(session.tally_state, message)
+        new_state["timestamp"] = datetime.now().isoformat()
+        if self.server_time:
+            # 클라이언트는 serverTime 과 pong 으로 구한 시계 오프셋으로 실제 전달 지연을 계산한다
+            new_state["serverTime"] = server_time_ms()
+        
+        # 이전 상태와 같으면 상태(스냅샷 캐시)를 유지하고 브로드캐스트 생략
+        delta = diff_tally_state(session.tally_state, new_state)
+        if not delta:
+            return
+        session.tally_state = new_state
+        session.seq += 1
+        session.replay.append(session.seq, delta, new_state["timestamp"])
+        
+        self.broadcast_tally(session, delta)
+        if self.history:
+            self.history.record(session.session_id, session.seq, delta, new_state)
+        if self.cluster:
+            await self.cluster.publish_state(session, delta)
+    
+    async def apply_remote_state(self, session_id: str, seq: int, tally_state: Dict, delta: Optional[Dict]):
+        """소유 노드에서 받은 탈리 상태 반영 후 로컬 클라이언트에 전달"""
+        session = self.sessions.get(session_id)
+        if not session or seq <= session.seq:
+            return
         
-        # 같은 세션의 모든 클라이언트에게 브로드캐스트
-        broadcast_message = json.dumps({
-            "type": "tally_update",
-            **session.tally_state
-        })
+        in_order = delta is not None and seq == session.seq + 1
+        session.tally_state = tally_state
+        session.seq = seq
+        if in_order:
+            session.replay.append(seq, delta, tally_state.get("timestamp"))
+            self.broadcast_tally(session, delta)
+        else:
+            session.replay.reset()
+            session.subscriptions.changes(tally_state)
+            # 처음 받은 상태이거나 중간이 빠졌으면 전원에게 스냅샷
+            for session_client in session.clients:
+                self.queue_snapshot(session, session_client)
+    
+    def broadcast_tally(self, session: Session, delta: Dict):
+        """로컬 클라이언트에게 탈리 변경 전송"""
+        started = time.perf_counter()
+        encode_seconds = 0.0
         
+        # 같은 세션의 클라이언트에게 수신 형식별로 한 번씩만 인코딩해서 대기 없이 전송
+        full_clients = [c for c in session.clients if not c.delta and not c.binary and c.inputs is None]
+        delta_clients = [c for c in session.clients if c.delta and not c.binary and c.inputs is None]
+        binary_clients = [c for c in session.clients if c.binary]
         disconnected_clients = []
-        for session_client in session.clients:
-            try:
-                await session_client.websocket.send(broadcast_message)
-            except ConnectionClosed:
-                disconnected_clients.append(session_client)
+        if full_clients:
+            encode_started = time.perf_counter()
+            broadcast_message = session.snapshot.frame_for(session)
+            encode_seconds += time.perf_counter() - encode_started
+            disconnected_clients += self.fanout.broadcast(full_clients, broadcast_message, "tally_update")
+        if delta_clients:
+            encode_started = time.perf_counter()
+            delta_broadcast = dumps(delta_message(
+                session.seq, delta, session.tally_state["timestamp"], session.tally_state.get("serverTime")
+            ))
+            encode_seconds += time.perf_counter() - encode_started
+            disconnected_clients += self.fanout.broadcast(delta_clients, delta_broadcast, "tally_delta")
+        if binary_clients:
+            encode_started = time.perf_counter()
+            binary_broadcast = session.snapshot.binary_update_frame(session, delta)
+            encode_seconds += time.perf_counter() - encode_started
+            disconnected_clients += self.fanout.broadcast(binary_clients, binary_broadcast, "tally_binary")
+        
+        # 입력별 구독 클라이언트: 상태가 바뀐 입력의 구독자에게만 작은 메시지 전송
+        timestamp = session.tally_state.get("timestamp")
+        server_time = session.tally_state.get("serverTime")
+        for input_id, program, preview in session.subscriptions.changes(session.tally_state):
+            encode_started = time.perf_counter()
+            input_broadcast = dumps(
+                input_tally_message(session.seq, input_id, program, preview, timestamp, server_time)
+            )
+            encode_seconds += time.perf_counter() - encode_started
+            disconnected_clients += self.fanout.broadcast(
+                session.subscriptions.subscribers[input_id], input_broadcast, "input_tally", input_id
+            )
         
         # 연결이 끊긴 클라이언트 제거
-        for client in disconnected_clients:
-            session.clients.remove(client)
+        if disconnected_clients:
+            self.drop_dead_clients(session, disconnected_clients)
+        
+        self.metrics.encode_seconds.observe(encode_seconds)
+        self.metrics.fanout_seconds.observe(time.perf_counter() - started)
+    
+    def drop_dead_clients(self, session: Session, dead_clients: List[Client]):
+        """팬아웃 중 끊긴 것으로 확인된 클라이언트를 세션 전송 대상(클라이언트·입력 구독)에서 제외
+
+        연결은 이미 닫혔거나 FanoutEngine 이 끊었으므로 PD·resume·클러스터 정리는
+        핸들러의 handle_disconnect 가 한다.
+        """
+        for client in dead_clients:
+            session.clients.discard(client)
+        session.subscriptions.discard_all(dead_clients)
+    
+    async def submit_tally_update(self, client: Client, message: Dict):
+        """탈리 업데이트를 세션별 병합 단계를 거쳐 handle_tally_update 로 전달"""
+        # 권한 없는 업데이트가 대기 중인 PD 업데이트와 병합되지 않도록 병합 전에 거절
+        if client.role not in PD_ROLES:
+            await self.send_error(client.websocket, "Unauthorized to send tally updates")
+            return
+        session = self.sessions.get(client.session_id)
+        if not session:
+            return
+        await self.coalescer.submit(client, session, message)
+    
+    async def on_register(self, websocket, data: Dict):
+        await self.register_client(websocket, data)
+    
+    async def on_register_pd(self, websocket, data: Dict):
+        # 기존 PD 등록 메시지와의 호환성
+        data["role"] = "pd_software"
+        await self.register_client(websocket, data)
     
+    async def on_tally_update(self, websocket, data: Dict):
+        client = self.clients.get(websocket)
+        if client:
+            await self.submit_tally_update(client, data)
+    
+    async def on_full_state(self, websocket, data: Dict):
+        # seq 누락을 감지한 클라이언트의 전체 상태 재요청
+        client = self.clients.get(websocket)
+        if client and client.session_id in self.sessions:
+            self.queue_snapshot(self.sessions[client.session_id], client)
+    
+    async def on_input_list(self, websocket, data: Dict):
+        # 기존 input_list 메시지 호환성
+        client = self.clients.get(websocket)
+        if client and client.role in PD_ROLES:
+            data["type"] = "tally_update"
+            data["inputs"] = data.get("inputs", {})
+            await self.submit_tally_update(client, data)
+    
+    async def on_quality_metrics(self, websocket, data: Dict):
+        # 패킷 손실·지터·RTT 등 클라이언트 품질 리포트 (PD 에게는 QualityReporter 요약으로 전달)
+        client = self.clients.get(websocket)
+        session = self.sessions.get(client.session_id) if client else None
+        if session is not None:
+            self.quality.record(session, client, data)
+    
+    async def on_ping(self, websocket, data: Optional[Dict] = None):
+        self.metrics.count_out("pong")
+        if data is None or "t0" not in data:
+            # 미리 인코딩한 pong 프레임을 쓰기 버퍼에 바로 기록
+            self.fanout.send_prepared(websocket, PONG_FRAME, PONG_MESSAGE)
+            return
+        # NTP 방식 ping: 직전 교환의 [t0, t1, t2, t3] 로 RTT·시계 오프셋을 갱신하고 시각을 찍어 응답
+        received = server_time_ms()
+        client = self.clients.get(websocket)
+        if client is not None:
+            update_clock(client, data.get("last"))
+        message = pong_message(data["t0"], received)
+        self.fanout.send_prepared(websocket, prepare_data(message), message)
+    
+    @timed("handle_message")
     async def handle_message(self, websocket, message: str):
         """메시지 처리"""
+        self.liveness.touch(websocket)
+        if self.legacy is not None and websocket in self.legacy.members:
+            # 등록 메시지를 보내면 그때부터 일반 클라이언트로 처리
+            if not is_register_message(message, REGISTER_TYPES):
+                self.metrics.count_in("legacy")
+                self.legacy.relay(websocket, message)
+                return
+            self.legacy.leave(websocket)
         try:
-            data = json.loads(message)
+            # 등록된 클라이언트의 작은 제어 메시지는 JSON 파싱 없이 type 만 보고 처리
+            if websocket in self.clients:
+                peeked_type = peek_type(message)
+                raw_handler = self.raw_handlers.get(peeked_type)
+                # type 외의 필드가 있으면(예: 시각을 담은 ping) 파싱 경로로
+                if raw_handler is not None and message.count(":") == 1:
+                    self.metrics.count_in(peeked_type)
+                    await raw_handler(websocket)
+                    return
+            
+            data = loads(message)
             msg_type = data.get("type")
+            self.metrics.count_in(msg_type if msg_type in self.message_handlers else "unknown")
             
             # 클라이언트가 등록되지 않은 경우
-            if websocket not in self.clients and msg_type != "register":
+            if websocket not in self.clients and msg_type not in REGISTER_TYPES:
                 await self.send_error(websocket, "Not registered. Please register first.")
                 return
             
-            if msg_type == "register":
-                await self.register_client(websocket, data)
-            elif msg_type == "register_pd":
-                # 기존 PD 등록 메시지와의 호환성
-                data["role"] = "pd_software"
-                await self.register_client(websocket, data)
-            elif msg_type == "tally_update":
-                client = self.clients.get(websocket)
-                if client:
-                    await self.handle_tally_update(client, data)
-            elif msg_type == "ping":
-                await websocket.send(json.dumps({"type": "pong"}))
-            elif msg_type == "input_list":
-                # 기존 input_list 메시지 호환성
-                client = self.clients.get(websocket)
-                if client and client.role in ["pd", "pd_software"]:
-                    data["type"] = "tally_update"
-                    data["inputs"] = data.get("inputs", {})
-                    await self.handle_tally_update(client, data)
-            else:
+            handler = self.message_handlers.get(msg_type)
+            if handler is None:
                 logging.warning(f"Unknown message type: {msg_type}")
+                return
+            await handler(websocket, data)
                 
-        except json.JSONDecodeError:
+        except DecodeError:
             await self.send_error(websocket, "Invalid JSON format")
         except Exception as e:
             logging.error(f"Error handling message: {e}")
@@ -170,8 +524,9 @@ class RelayServer:
     
     async def send_error(self, websocket, message: str):
         """에러 메시지 전송"""
+        self.metrics.count_out("error")
         try:
-            await websocket.send(json.dumps({
+            await websocket.send(dumps({
                 "type": "error",
                 "message": message,
                 "timestamp": datetime.now().isoformat()
@@ -179,25 +534,33 @@ class RelayServer:
         except:
             pass
     
+    @timed("handle_disconnect")
     async def handle_disconnect(self, websocket):
         """클라이언트 연결 해제 처리"""
+        self.liveness.forget(websocket)
+        self.fanout.compression.forget(websocket)
+        if self.legacy is not None:
+            self.legacy.leave(websocket)
         client = self.clients.get(websocket)
         if not client:
             return
+        self.resume.release(client.resume_token)
         
         session = self.sessions.get(client.session_id)
         if session:
             session.clients.discard(client)
+            session.subscriptions.remove(client)
             
             # PD 클라이언트가 연결 해제된 경우
             if session.pd_client == client:
                 session.pd_client = None
                 logging.info(f"PD 클라이언트 연결 해제: {client.session_id}")
+            if client.pd_claim is not None:
+                await self.cluster.release_pd(client.session_id, client.pd_claim)
             
             # 세션에 클라이언트가 없으면 세션 제거
-            if not session.clients:
-                del self.sessions[client.session_id]
-                logging.info(f"빈 세션 제거: {client.session_id}")
+            if self.drop_session_if_idle(client.session_id) and self.cluster:
+                await self.cluster.leave(client.session_id)
         
         del self.clients[websocket]
         logging.info(f"클라이언트 연결 해제: {client.role} from session {client.session_id}")
@@ -205,7 +568,15 @@ class RelayServer:
     async def handler(self, websocket, path):
         """웹소켓 연결 핸들러"""
         remote_address = websocket.remote_address
+        address = client_address(websocket)
+        cause = self.admission.connect(address)
+        if cause is not None:
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=self.admission.close_reason(cause))
+            return
         logging.info(f"새 연결: {remote_address}")
+        self.liveness.track(websocket)
+        if self.legacy is not None:
+            self.legacy.join(websocket, intern_id(legacy_session_id(path)))
         
         try:
             async for message in websocket:
@@ -215,18 +586,40 @@ class RelayServer:
         except Exception as e:
             logging.error(f"핸들러 오류: {e}")
         finally:
+            self.admission.disconnect(address)
             await self.handle_disconnect(websocket)
 
 async def main():
-    server = RelayServer()
-    host = "0.0.0.0"
-    port = 8765
+    # RELAY_BACKPLANE_URL 이 설정되면 여러 릴레이 노드가 세션을 공유
+    cluster = cluster_from_env()
+    if cluster:
+        await cluster.start()
+        logging.info(f"백플레인 연결: 노드 {cluster.node_id} / {','.join(cluster.nodes)}")
+    server = RelayServer(cluster=cluster, history=history_from_env())
+    host = os.environ.get("RELAY_HOST", "0.0.0.0")
+    port = int(os.environ.get("RELAY_PORT", "8765"))
     
-    async with websockets.serve(server.handler, host, port):
+    # 같은 포트의 /metrics 로 Prometheus 지표 제공
+    asyncio.ensure_future(server.metrics.sample_loop_lag())
+    asyncio.ensure_future(server.liveness.run())
+    asyncio.ensure_future(server.quality.run())
+    # RELAY_ADMIN_SOCKET 이 있으면 재시작 없이 프로파일을 뜰 수 있는 관리 소켓
+    await start_admin_socket(server)
+    if server.history:
+        asyncio.ensure_future(server.history.run())
+    async with websockets.serve(
+        server.handler, host, port,
+        subprotocols=[BINARY_SUBPROTOCOL],
+        process_request=server.metrics.process_request_hook(server),
+        ping_interval=None,  # 생존 확인은 server.liveness 가 담당
+        **serve_options(connection_limits())  # RELAY_COMPRESSION 압축 정책
+    ):
         logging.info(f"다중 세션 지원 Relay Server 시작: ws://{host}:{port}")
+        logging.info(f"이벤트 루프: {loop_name()}")
         await asyncio.Future()  # 서버 계속 실행
 
 if __name__ == "__main__":
+    install_event_loop()  # RELAY_EVENT_LOOP (기본: uvloop 이 있으면 사용)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,85 @@
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 세션별로 보관할 최근 탈리 변경 수
+REPLAY_BUFFER_SIZE = int(os.environ.get("RELAY_REPLAY_BUFFER", "64"))
+# 마지막 클라이언트가 나간 세션과 끊긴 연결의 resume 토큰을 보존하는 시간 (초)
+SESSION_GRACE_PERIOD = float(os.environ.get("RELAY_SESSION_GRACE", "30"))
+
+
+class ReplayBuffer:
+    """세션의 최근 탈리 변경 (seq, delta, timestamp) 링 버퍼"""
+
+    def __init__(self, size: int = REPLAY_BUFFER_SIZE):
+        self.entries: deque = deque(maxlen=size)
+
+    def append(self, seq: int, delta: Dict, timestamp: Optional[str]):
+        self.entries.append((seq, delta, timestamp))
+
+    def reset(self):
+        """seq 가 건너뛴 상태를 반영했을 때 (이전 항목으로는 이어 붙일 수 없음)"""
+        self.entries.clear()
+
+    def since(self, last_seq: int) -> Optional[List[Tuple[int, Dict, Optional[str]]]]:
+        """last_seq 다음부터의 변경 목록. 버퍼 범위를 벗어났으면 None (스냅샷 필요)"""
+        if not self.entries or last_seq < self.entries[0][0] - 1 or last_seq > self.entries[-1][0]:
+            return None
+        return [entry for entry in self.entries if entry[0] > last_seq]
+
+
+@dataclass
+class ResumeTicket:
+    """resume 토큰으로 되찾을 수 있는 등록 정보"""
+    session_id: str
+    role: str
+    user_id: Optional[str] = None
+
+
+class ResumeRegistry:
+    """resume 토큰 발급·확인
+
+    토큰은 연결 중에는 계속 유효하고, 연결이 끊기면 grace 초 뒤 만료된다. 끊긴 순서가
+    곧 만료 순서이므로 만료 정리는 released 의 앞쪽만 보면 된다.
+    """
+
+    def __init__(self, grace: float = SESSION_GRACE_PERIOD, clock: Callable[[], float] = time.monotonic):
+        self.grace = grace
+        self.clock = clock
+        self.tickets: Dict[str, ResumeTicket] = {}
+        self.released: "OrderedDict[str, float]" = OrderedDict()
+        self.resumed = 0
+
+    def issue(self, session_id: str, role: str, user_id: Optional[str] = None) -> str:
+        token = secrets.token_urlsafe(16)
+        self.tickets[token] = ResumeTicket(session_id, role, user_id)
+        return token
+
+    def claim(self, token, session_id: str, role: str, user_id: Optional[str] = None) -> Optional[ResumeTicket]:
+        """토큰이 같은 세션·역할·사용자의 것이면 소모하고 반환"""
+        self.prune()
+        ticket = self.tickets.get(token) if isinstance(token, str) else None
+        if ticket is None or (ticket.session_id, ticket.role, ticket.user_id) != (session_id, role, user_id):
+            return None
+        del self.tickets[token]
+        self.released.pop(token, None)
+        self.resumed += 1
+        return ticket
+
+    def release(self, token: Optional[str]):
+        """연결 종료: grace 기간 뒤 만료되도록 표시"""
+        if token in self.tickets:
+            self.released[token] = self.clock() + self.grace
+        self.prune()
+
+    def prune(self):
+        now = self.clock()
+        while self.released:
+            token, expires_at = next(iter(self.released.items()))
+            if expires_at > now:
+                break
+            del self.released[token]
+            self.tickets.pop(token, None)
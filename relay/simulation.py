@@ -0,0 +1,342 @@
+"""
+메모리 연결 + 가상 시계 시뮬레이션
+RelayServer / SecureRelayServer 의 handler 를 실제 소켓 없이 같은 프로세스에서 돌린다.
+MemoryConnection 은 서버 코드가 쓰는 websockets 연결의 표면(send, recv, async for, close,
+ping, drain, write_frame_sync, transport)만 구현하고, VirtualClockLoop 는 잠들 때 실제로
+기다리지 않고 다음 타이머 시각으로 시계를 넘긴다. 같은 시나리오는 매번 같은 순서로 실행된다.
+
+예: PD 가 팬아웃 도중(첫 스태프가 컷을 받는 순간) 끊기는 경우. abort 는 양쪽 끝을 그 자리에서
+닫으므로 같은 팬아웃의 나머지 전송은 닫힌 PD 연결을 보게 된다
+
+    sim = Simulation()
+
+    async def scenario():
+        staff = [await sim.client("s1", "staff") for _ in range(3)]
+        pd = await sim.client("s1", "pd")
+        staff[0].on_message = lambda connection, message: pd.abort()
+        await pd.send(json.dumps({"type": "tally_update", "program": 1, "preview": 2}))
+        await asyncio.sleep(1.0)  # 가상 시간 1초 (즉시 끝남)
+
+    sim.run(scenario())
+    sim.close()
+
+실행기 스레드 작업(history 기록, 프로파일러)은 가상 시계를 따르지 않으므로 쓰지 않는다.
+"""
+
+import asyncio
+import collections
+import itertools
+import json
+import random
+import selectors
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from websockets.datastructures import Headers
+from websockets.exceptions import ConnectionClosedError, ConnectionClosedOK
+from websockets.frames import OP_TEXT, Close, prepare_data
+
+from compression import CompressionPolicy
+from relay_server import RelayServer
+
+# 상대가 읽지 않은 바이트가 이만큼 쌓이면 송신 버퍼가 찬 것으로 본다 (websockets 기본 write_limit)
+MEMORY_WRITE_LIMIT = 64 * 1024
+
+# RFC 6455 1006: close frame 없이 끊김
+CLOSE_ABNORMAL = 1006
+
+# 루프 한 바퀴마다 가상 시계가 최소한 이만큼 흐른다. 실제 시계처럼 조금씩은 흘러야
+# 아주 짧은 sleep 을 반복하며 시간이 지나기를 기다리는 코드(토큰 버킷 등)가 멈추지 않는다
+VIRTUAL_TICK = 1e-9
+
+
+class SimulationDeadlock(RuntimeError):
+    """기다리는 코루틴은 있는데 예정된 타이머도 실행할 콜백도 없음"""
+
+
+class VirtualClock:
+    """VirtualClockLoop 의 현재 시각 (초)"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """I/O 를 기다리지 않고 select(timeout) 에서 시계만 timeout 만큼 넘기는 셀렉터"""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.keys: Dict[int, selectors.SelectorKey] = {}
+
+    @staticmethod
+    def _fd(fileobj) -> int:
+        return fileobj if isinstance(fileobj, int) else fileobj.fileno()
+
+    def register(self, fileobj, events, data=None) -> selectors.SelectorKey:
+        key = self.keys[self._fd(fileobj)] = selectors.SelectorKey(fileobj, self._fd(fileobj), events, data)
+        return key
+
+    def unregister(self, fileobj) -> selectors.SelectorKey:
+        return self.keys.pop(self._fd(fileobj))
+
+    def select(self, timeout=None):
+        if timeout is None:
+            raise SimulationDeadlock("no timers scheduled and nothing ready to run")
+        self.clock.now += max(timeout, VIRTUAL_TICK)
+        return []
+
+    def get_map(self):
+        return self.keys
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """asyncio.sleep, call_later, wait_for 시간 초과가 가상 시계로 즉시 진행되는 이벤트 루프"""
+
+    def __init__(self, start: float = 0.0):
+        self.clock = VirtualClock(start)
+        super().__init__(_VirtualSelector(self.clock))
+
+    def time(self) -> float:
+        return self.clock.now
+
+
+def _decode(opcode: int, data) -> object:
+    return data.decode("utf-8") if opcode == OP_TEXT else bytes(data)
+
+
+class MemoryTransport:
+    """FanoutEngine·LivenessTracker 가 보는 전송 계층 (송신 버퍼 = 상대가 아직 읽지 않은 바이트)"""
+
+    def __init__(self, connection: "MemoryConnection"):
+        self.connection = connection
+
+    def get_write_buffer_size(self) -> int:
+        return self.connection.peer.unread_bytes
+
+    def get_write_buffer_limits(self) -> Tuple[int, int]:
+        # websockets 와 같이 low-water 는 high-water 의 1/4
+        return self.connection.write_limit // 4, self.connection.write_limit
+
+    def abort(self):
+        self.connection.abort()
+
+
+class MemoryConnection:
+    """websockets 서버 연결과 같은 표면을 가진 메모리 연결의 한쪽 끝
+
+    pair() 로 서버 쪽과 클라이언트 쪽을 함께 만든다. 한쪽에서 보낸 메시지는 상대 수신함에
+    바로 들어가고, 상대가 읽지 않은 바이트가 write_limit 를 넘으면 송신 버퍼가 찬 것으로 보인다.
+    on_message 가 있으면 메시지가 도착하는 순간(팬아웃 도중) 동기적으로 불리므로 특정 전송
+    시점에 다른 연결을 끊는 경쟁 상태를 그대로 재현할 수 있다. keep_messages=False 면 받은
+    메시지를 세기만 하고 보관하지 않는다 (항상 바로 읽는 클라이언트).
+    """
+
+    def __init__(self, path: str = "/", remote_address: Tuple = ("127.0.0.1", 0), request_headers=None,
+                 subprotocol: Optional[str] = None, write_limit: int = MEMORY_WRITE_LIMIT,
+                 keep_messages: bool = True):
+        self.path = path
+        self.remote_address = remote_address
+        self.request_headers = Headers(request_headers or {})
+        self.subprotocol = subprotocol
+        self.extensions: List = []
+        self.write_limit = write_limit
+        self.keep_messages = keep_messages
+        self.transport = MemoryTransport(self)
+        self.peer: Optional["MemoryConnection"] = None
+        self.inbox: Deque[Tuple[int, bytes]] = collections.deque()
+        self.unread_bytes = 0
+        self.received = 0
+        self.answer_pings = True
+        self.on_message: Optional[Callable[["MemoryConnection", object], None]] = None
+        self.close_code: Optional[int] = None
+        self.close_reason = ""
+        self._recv_waiter: Optional[asyncio.Future] = None
+        self._drain_waiters: List[asyncio.Future] = []
+        self._pings: List[asyncio.Future] = []
+
+    @classmethod
+    def pair(cls, path: str = "/", subprotocol: Optional[str] = None, request_headers=None,
+             remote_address: Tuple = ("127.0.0.1", 0), write_limit: int = MEMORY_WRITE_LIMIT,
+             keep_messages: bool = True) -> Tuple["MemoryConnection", "MemoryConnection"]:
+        """(서버 쪽, 클라이언트 쪽). write_limit 는 서버 쪽 송신, keep_messages 는 클라이언트 쪽 수신에 적용"""
+        server = cls(path, remote_address, request_headers, subprotocol, write_limit=write_limit)
+        client = cls(path, ("127.0.0.1", 8765), None, subprotocol, keep_messages=keep_messages)
+        server.peer, client.peer = client, server
+        return server, client
+
+    @property
+    def open(self) -> bool:
+        return self.close_code is None
+
+    @property
+    def closed(self) -> bool:
+        return self.close_code is not None
+
+    def write_frame_sync(self, fin: bool, opcode: int, data: bytes):
+        """FanoutEngine 의 동기 쓰기 경로 (닫힌 연결이면 버린다)"""
+        if self.open:
+            self.peer._deliver(opcode, data)
+
+    async def send(self, message):
+        if self.closed:
+            raise self._connection_closed()
+        opcode, data = prepare_data(message)
+        self.peer._deliver(opcode, data)
+
+    async def recv(self):
+        while not self.inbox:
+            if self.closed:
+                raise self._connection_closed()
+            self._recv_waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._recv_waiter
+            finally:
+                self._recv_waiter = None
+        opcode, data = self.inbox.popleft()
+        self.unread_bytes -= len(data)
+        self.peer._wake_drain()
+        return _decode(opcode, data)
+
+    async def __aiter__(self):
+        try:
+            while True:
+                yield await self.recv()
+        except ConnectionClosedOK:
+            return
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self._close(code, reason)
+
+    def abort(self):
+        self._close(CLOSE_ABNORMAL, "")
+
+    async def ping(self, data=None) -> asyncio.Future:
+        """pong 을 기다리는 future. 상대가 answer_pings 면 바로 완료된다"""
+        if self.closed:
+            raise self._connection_closed()
+        pong = asyncio.get_running_loop().create_future()
+        if self.peer.answer_pings:
+            pong.set_result(0.0)
+        else:
+            self._pings.append(pong)
+        return pong
+
+    async def drain(self):
+        """상대가 읽어 송신 버퍼가 low-water 아래로 내려갈 때까지 대기"""
+        low, _ = self.transport.get_write_buffer_limits()
+        while self.open and self.peer.unread_bytes > low:
+            waiter = asyncio.get_running_loop().create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+        if self.closed:
+            raise self._connection_closed()
+
+    def _deliver(self, opcode: int, data: bytes):
+        if self.closed:
+            return
+        self.received += 1
+        if self.keep_messages:
+            self.inbox.append((opcode, data))
+            self.unread_bytes += len(data)
+            if self._recv_waiter is not None and not self._recv_waiter.done():
+                self._recv_waiter.set_result(None)
+        if self.on_message is not None:
+            self.on_message(self, _decode(opcode, data))
+
+    def _wake_drain(self):
+        low, _ = self.transport.get_write_buffer_limits()
+        if self.peer.unread_bytes > low:
+            return
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _close(self, code: int, reason: str):
+        for end in (self, self.peer):
+            if end.close_code is not None:
+                continue
+            end.close_code, end.close_reason = code, reason
+            # recv 는 깨워서 ConnectionClosed 를 내게 하고, drain·pong 대기는 취소
+            if end._recv_waiter is not None and not end._recv_waiter.done():
+                end._recv_waiter.set_result(None)
+            for waiter in end._drain_waiters + end._pings:
+                waiter.cancel()
+            end._drain_waiters, end._pings = [], []
+
+    def _connection_closed(self):
+        if self.close_code == CLOSE_ABNORMAL:
+            return ConnectionClosedError(None, None)
+        close = Close(self.close_code, self.close_reason)
+        if self.close_code in (1000, 1001):
+            return ConnectionClosedOK(close, close)
+        return ConnectionClosedError(close, close)
+
+
+class Simulation:
+    """가상 시계 루프 위에서 릴레이 서버 하나와 메모리 연결들을 돌리는 하네스
+
+    서버 구성 요소의 clock(생존 확인, resume, 등록 토큰 버킷, 품질 요약)을 루프 시계로 바꾸고, 메모리
+    연결에는 압축 확장이 없으므로 압축 정책은 default 로 둔다. seed 는 등록 거절 재시도
+    지터 같은 random 사용을 고정한다.
+    """
+
+    def __init__(self, server_factory: Callable = RelayServer, seed: int = 0, background: bool = False):
+        random.seed(seed)
+        self.loop = VirtualClockLoop()
+        asyncio.set_event_loop(self.loop)
+        self.server = server_factory()
+        self.server.fanout.compression = CompressionPolicy("default")
+        for component in (self.server.liveness, self.server.resume, self.server.admission.bucket,
+                          self.server.quality):
+            component.clock = self.loop.time
+        # 만들어질 때 monotonic 으로 읽은 시각을 가상 시계 기준으로 되돌린다
+        self.started_at = self.loop.time()
+        self.server.admission.bucket.updated = self.started_at
+        self.tasks: List[asyncio.Task] = []
+        self._addresses = itertools.count(1)
+        if background:
+            # main() 처럼 생존 확인과 품질 요약 태스크를 돌린다
+            self.tasks.append(self.loop.create_task(self.server.liveness.run()))
+            self.tasks.append(self.loop.create_task(self.server.quality.run()))
+
+    @property
+    def elapsed(self) -> float:
+        """시뮬레이션 시작 후 흐른 가상 시간 (초)"""
+        return self.loop.time() - self.started_at
+
+    def run(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    async def connect(self, path: str = "/", subprotocol: Optional[str] = None, headers=None,
+                      remote_address: Optional[Tuple] = None, keep_messages: bool = True) -> MemoryConnection:
+        """서버 handler 에 새 연결을 붙이고 클라이언트 쪽 끝을 반환 (주소를 안 주면 연결마다 다른 주소)"""
+        if remote_address is None:
+            number = next(self._addresses)
+            remote_address = (f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}", 40000)
+        server_end, client_end = MemoryConnection.pair(path, subprotocol, headers, remote_address,
+                                                       keep_messages=keep_messages)
+        self.tasks.append(asyncio.ensure_future(self.server.handler(server_end, path)))
+        await asyncio.sleep(0)
+        return client_end
+
+    async def client(self, session_id: str, role: str = "staff", keep_messages: bool = True,
+                     **fields) -> MemoryConnection:
+        """연결 후 register 를 보내고 등록 확인(또는 오류)까지 기다린 클라이언트"""
+        connection = await self.connect()
+        await connection.send(json.dumps({"type": "register", "sessionId": session_id, "role": role, **fields}))
+        while json.loads(await connection.recv()).get("type") not in ("session_registered", "error"):
+            pass
+        if not keep_messages:
+            # 이후 메시지는 세기만 한다 (등록 직후 스냅샷도 버림)
+            connection.keep_messages = False
+            connection.inbox.clear()
+            connection.unread_bytes = 0
+        return connection
+
+    def close(self):
+        """남은 handler·백그라운드 태스크를 정리하고 루프 종료"""
+        for task in self.tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*self.tasks, return_exceptions=True))
+        self.loop.close()
+        asyncio.set_event_loop(None)
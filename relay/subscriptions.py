@@ -0,0 +1,89 @@
+import sys
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from lean import PD_ROLES, Role
+
+# 입력별 구독을 받지 않고 항상 전체 상태를 받는 역할
+FULL_FEED_ROLES = PD_ROLES + (Role.STAFF, Role.VIEWER)
+
+
+def input_key(value) -> Optional[str]:
+    """program/preview 값과 inputs 키를 같은 형태(str)로 맞춤"""
+    return None if value is None else str(value)
+
+
+def parse_subscription(value, role) -> Optional[FrozenSet[str]]:
+    """register 의 subscribeInputs 목록을 입력 id 집합으로 변환 (구독하지 않으면 None)"""
+    if role in FULL_FEED_ROLES or not isinstance(value, list) or not value:
+        return None
+    return frozenset(sys.intern(input_key(input_id)) for input_id in value if input_id is not None)
+
+
+def input_state(tally_state: Dict, input_id: str) -> Tuple[bool, bool]:
+    """입력 하나의 (program, preview) 여부"""
+    return (
+        input_key(tally_state.get("program")) == input_id,
+        input_key(tally_state.get("preview")) == input_id
+    )
+
+
+def input_tally_message(seq: int, input_id: str, program: bool, preview: bool,
+                        timestamp: Optional[str], server_time: Optional[float] = None) -> Dict:
+    """입력 하나의 탈리 상태 메시지"""
+    message = {
+        "type": "input_tally",
+        "seq": seq,
+        "input": input_id,
+        "program": program,
+        "preview": preview,
+        "timestamp": timestamp
+    }
+    if server_time is not None:
+        message["serverTime"] = server_time
+    return message
+
+
+class InputSubscriptions:
+    """세션의 입력 id → 구독 클라이언트 색인
+
+    on 에는 현재 program/preview 인 입력(최대 두 개)만 들고 있어서, 갱신 때마다
+    이전·현재 on 입력만 비교하면 상태가 바뀐 입력을 알 수 있다.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set] = {}
+        self.on: Dict[str, Tuple[bool, bool]] = {}
+
+    def add(self, client):
+        for input_id in client.inputs or ():
+            self.subscribers.setdefault(input_id, set()).add(client)
+
+    def remove(self, client):
+        for input_id in client.inputs or ():
+            clients = self.subscribers.get(input_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.subscribers[input_id]
+
+    def discard_all(self, clients: Iterable):
+        for client in clients:
+            self.remove(client)
+
+    def changes(self, tally_state: Dict) -> List[Tuple[str, bool, bool]]:
+        """새 상태 반영 후, 상태가 바뀐 입력 중 구독자가 있는 것의 (id, program, preview) 목록"""
+        program = input_key(tally_state.get("program"))
+        preview = input_key(tally_state.get("preview"))
+        on: Dict[str, Tuple[bool, bool]] = {}
+        if preview is not None:
+            on[preview] = (False, True)
+        if program is not None:
+            on[program] = (True, program == preview)
+
+        changed = []
+        for input_id in self.on.keys() | on.keys():
+            state = on.get(input_id, (False, False))
+            if self.on.get(input_id, (False, False)) != state and input_id in self.subscribers:
+                changed.append((input_id,) + state)
+        self.on = on
+        return changed
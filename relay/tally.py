@@ -0,0 +1,240 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from codec import dumps
+from wire import InputTable, encode_snapshot, encode_tally
+
+# 입력 목록 외에 비교하는 탈리 필드
+TALLY_FIELDS = ("program", "preview")
+
+# 입장 스냅샷을 모아서 보내는 대기 시간 (초)
+SNAPSHOT_BATCH_WINDOW = 0.01
+
+# PD 업데이트 병합 대기 시간 (초). 기본값은 60fps 한 프레임 남짓, 0 이면 병합하지 않음
+COALESCE_WINDOW = float(os.environ.get("TALLY_COALESCE_WINDOW_MS", "16")) / 1000
+
+_MISSING = object()
+
+
+def merge_tally_update(state: Dict, message: Dict) -> Dict:
+    """PD 업데이트를 반영한 새 탈리 상태
+
+    메시지에 없는 필드는 이전 값을 유지한다. TallyCoalescer 의 병합과 같은 규칙이므로
+    업데이트가 병합되었든 따로 반영되었든 결과가 같다.
+    """
+    new_state = dict(state)
+    for key in TALLY_FIELDS + ("inputs",):
+        if key in message:
+            new_state[key] = message[key]
+    return new_state
+
+
+def diff_tally_state(previous: Dict, current: Dict) -> Dict:
+    """이전 탈리 상태 대비 변경분 계산
+
+    반환값에는 바뀐 program/preview, 추가되거나 바뀐 입력(inputs),
+    사라진 입력 키 목록(removed)만 들어간다. 변경이 없으면 빈 dict.
+    """
+    delta = {}
+    for key in TALLY_FIELDS:
+        if current.get(key) != previous.get(key):
+            delta[key] = current.get(key)
+
+    previous_inputs = previous.get("inputs") or {}
+    current_inputs = current.get("inputs") or {}
+    changed_inputs = {
+        key: value for key, value in current_inputs.items()
+        if previous_inputs.get(key, _MISSING) != value
+    }
+    removed_inputs = [key for key in previous_inputs if key not in current_inputs]
+
+    if changed_inputs:
+        delta["inputs"] = changed_inputs
+    if removed_inputs:
+        delta["removed"] = removed_inputs
+    return delta
+
+
+def snapshot_message(seq: int, tally_state: Dict) -> Dict:
+    """전체 탈리 상태 메시지 (기존 tally_update 형식 + seq)"""
+    return {
+        "type": "tally_update",
+        "seq": seq,
+        **tally_state
+    }
+
+
+def delta_message(seq: int, delta: Dict, timestamp: Optional[str], server_time: Optional[float] = None) -> Dict:
+    """변경분 메시지. 클라이언트는 seq 가 이전 값 + 1 이 아니면 full_state 를 요청한다"""
+    message = {
+        "type": "tally_delta",
+        "seq": seq,
+        **delta,
+        "timestamp": timestamp
+    }
+    if server_time is not None:
+        message["serverTime"] = server_time
+    return message
+
+
+class SnapshotCache:
+    """세션 전체 상태 프레임을 seq 버전별로 한 번만 인코딩해서 보관"""
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.frame: Optional[str] = None
+        self.binary_version: Optional[int] = None
+        self.binary_frame: Optional[bytes] = None
+        self.input_table = InputTable()
+        self.hits = 0
+        self.misses = 0
+
+    def frame_for(self, session) -> str:
+        """현재 seq 의 스냅샷 프레임 반환 (seq 가 바뀐 경우에만 재인코딩)"""
+        if self.version != session.seq or self.frame is None:
+            self.frame = dumps(snapshot_message(session.seq, session.tally_state))
+            self.version = session.seq
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self.frame
+
+    def binary_frame_for(self, session) -> bytes:
+        """현재 seq 의 바이너리 스냅샷 프레임 반환"""
+        if self.binary_version != session.seq or self.binary_frame is None:
+            self.binary_frame = encode_snapshot(session.seq, session.tally_state, self.input_table)
+            self.binary_version = session.seq
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self.binary_frame
+
+    def binary_update_frame(self, session, delta: Dict) -> bytes:
+        """바이너리 클라이언트용 변경 프레임
+
+        입력 목록이 그대로면 고정 길이 FRAME_TALLY, 바뀌었으면 스냅샷 프레임을 보낸다.
+        """
+        if "inputs" in delta or "removed" in delta or self.input_table.sync(session.tally_state):
+            return self.binary_frame_for(session)
+        return encode_tally(session.seq, session.tally_state, self.input_table)
+
+
+class SnapshotBatcher:
+    """짧은 시간 안에 들어온 입장/full_state 요청을 모아 한 번의 전송 패스로 처리
+
+    PD 재시작 직후처럼 수십~수백 명이 동시에 재접속해도 스냅샷 인코딩은
+    세션당 한 번, 전송은 window 마다 한 번의 팬아웃으로 끝난다.
+    """
+
+    def __init__(self, fanout, on_dead: Callable[[object, List], None], window: float = SNAPSHOT_BATCH_WINDOW):
+        self.fanout = fanout
+        # 전송 중 끊긴 클라이언트 처리 (브로드캐스트와 같은 정리 경로)
+        self.on_dead = on_dead
+        self.window = window
+        self.pending: Dict[str, Tuple[object, List]] = {}
+        self.flushes = 0
+
+    def queue(self, session, client):
+        """client 에게 보낼 스냅샷을 대기열에 추가"""
+        entry = self.pending.get(session.session_id)
+        if entry is None:
+            entry = (session, [])
+            self.pending[session.session_id] = entry
+            asyncio.get_running_loop().call_later(self.window, self.flush, session.session_id)
+        entry[1].append(client)
+
+    def flush(self, session_id: str):
+        """대기 중인 클라이언트 전원에게 캐시된 스냅샷 전송"""
+        entry = self.pending.pop(session_id, None)
+        if entry is None:
+            return
+        session, waiting_clients = entry
+        self.flushes += 1
+
+        json_clients = [c for c in waiting_clients if not c.binary]
+        binary_clients = [c for c in waiting_clients if c.binary]
+        dead_clients = []
+        if json_clients:
+            frame = session.snapshot.frame_for(session)
+            dead_clients += self.fanout.broadcast(json_clients, frame, "snapshot")
+        if binary_clients:
+            frame = session.snapshot.binary_frame_for(session)
+            dead_clients += self.fanout.broadcast(binary_clients, frame, "snapshot_binary")
+        if dead_clients:
+            self.on_dead(session, dead_clients)
+
+
+@dataclass
+class CoalesceStats:
+    """업데이트 병합 통계"""
+    received: int = 0   # PD 로부터 받은 업데이트 수
+    emitted: int = 0    # 실제로 브로드캐스트 단계로 넘긴 업데이트 수
+    coalesced: int = 0  # 뒤에 온 업데이트에 흡수된 수
+    immediate: int = 0  # program 변경이라 즉시 보낸 수
+
+
+class TallyCoalescer:
+    """세션별로 window 안에 들어온 PD 업데이트를 병합해 최신 상태 하나만 방출
+
+    필드 단위로 나중 값이 이기도록 병합하므로 input_list 뒤에 온 tally_update 가
+    입력 목록을 지우지 않는다. 병합하지 않고 따로 반영할 때도 merge_tally_update 가
+    같은 규칙(빠진 필드는 이전 값 유지)을 쓰므로 타이밍에 따라 상태가 달라지지 않는다.
+    program 이 바뀌는 업데이트(컷)는 대기 중이던 변경을 합쳐 즉시 방출해 지연되지 않게
+    한다. 병합은 같은 클라이언트의 업데이트끼리만 하며, 권한 확인은 submit 을 부르기 전에
+    끝나 있어야 한다.
+    """
+
+    def __init__(self, emit: Callable[[object, Dict], Awaitable[None]],
+                 window: float = COALESCE_WINDOW):
+        self.emit = emit
+        self.window = window
+        self.pending: Dict[str, Tuple[object, Dict]] = {}
+        self.timers: Dict[str, asyncio.TimerHandle] = {}
+        self.stats = CoalesceStats()
+
+    async def submit(self, client, session, message: Dict):
+        """PD 업데이트 접수"""
+        self.stats.received += 1
+        pending = self.pending.get(session.session_id)
+        if pending is not None and pending[0] is not client:
+            # 다른 클라이언트(PD 교체 등)의 업데이트와는 합치지 않고 대기 중이던 것을 먼저 방출
+            timer = self.timers.pop(session.session_id, None)
+            if timer is not None:
+                timer.cancel()
+            await self.flush(session.session_id)
+        pending = self.pending.pop(session.session_id, None)
+        if pending is not None:
+            self.stats.coalesced += 1
+            message = {**pending[1], **message}
+
+        is_cut = "program" in message and message["program"] != session.tally_state.get("program")
+        if self.window <= 0 or is_cut:
+            timer = self.timers.pop(session.session_id, None)
+            if timer is not None:
+                timer.cancel()
+            if is_cut:
+                self.stats.immediate += 1
+            self.stats.emitted += 1
+            await self.emit(client, message)
+            return
+
+        if session.session_id not in self.timers:
+            self.timers[session.session_id] = asyncio.get_running_loop().call_later(
+                self.window, self._schedule_flush, session.session_id
+            )
+        self.pending[session.session_id] = (client, message)
+
+    def _schedule_flush(self, session_id: str):
+        """타이머 콜백에서 비동기 flush 시작"""
+        self.timers.pop(session_id, None)
+        asyncio.ensure_future(self.flush(session_id))
+
+    async def flush(self, session_id: str):
+        """대기 중인 최신 업데이트 방출"""
+        pending = self.pending.pop(session_id, None)
+        if pending is None:
+            return
+        self.stats.emitted += 1
+        await self.emit(*pending)
@@ -0,0 +1,70 @@
+import os
+import time
+from typing import Collection, Optional, Tuple
+
+from codec import dumps
+
+# 탈리 상태에 serverTime(ms) 을 넣어 클라이언트가 실제 전달 지연을 계산할 수 있게 한다
+TALLY_SERVER_TIME = os.environ.get("RELAY_TALLY_SERVER_TIME", "0") == "1"
+
+# RTT·시계 오프셋 지수 평활 계수 (TCP SRTT 와 같은 1/8)
+SMOOTHING = 0.125
+
+# 벽시계 기준점. 이후 시각은 monotonic 으로 진행해 서버 시계 보정에 튀지 않는다
+_WALL_ANCHOR = time.time() - time.monotonic()
+
+
+def server_time_ms() -> float:
+    """서버 벽시계 시각 (UNIX ms, monotonic 기반)"""
+    return round((time.monotonic() + _WALL_ANCHOR) * 1000, 3)
+
+
+def pong_message(t0, t1: float) -> str:
+    """NTP 방식 pong: 클라이언트 송신 t0, 서버 수신 t1, 서버 송신 t2 (벽시계 ms) 와 서버 monotonic ms"""
+    now = time.monotonic()
+    return dumps({
+        "type": "pong",
+        "t0": t0,
+        "t1": t1,
+        "t2": round((now + _WALL_ANCHOR) * 1000, 3),
+        "mono": round(now * 1000, 3)
+    })
+
+
+def exchange_sample(last) -> Optional[Tuple[float, float]]:
+    """클라이언트가 다음 ping 의 last 로 돌려준 [t0, t1, t2, t3] 에서 (rtt, offset) ms 계산
+
+    offset 은 서버 시계 - 클라이언트 시계. 값이 이상하면 None.
+    """
+    if not isinstance(last, list) or len(last) != 4:
+        return None
+    if not all(type(value) in (int, float) for value in last):
+        return None
+    t0, t1, t2, t3 = last
+    rtt = (t3 - t0) - (t2 - t1)
+    if rtt < 0:
+        return None
+    return rtt, ((t1 - t0) + (t2 - t3)) / 2
+
+
+def update_clock(client, last) -> bool:
+    """ping 의 last 로 client 의 평활 RTT·오프셋 갱신"""
+    sample = exchange_sample(last)
+    if sample is None:
+        return False
+    rtt, offset = sample
+    if client.rtt is None:
+        client.rtt, client.clock_offset = rtt, offset
+    else:
+        client.rtt += SMOOTHING * (rtt - client.rtt)
+        client.clock_offset += SMOOTHING * (offset - client.clock_offset)
+    return True
+
+
+def session_clock_stats(clients: Collection) -> Optional[Tuple[int, float, float, float]]:
+    """측정된 클라이언트 수, 평균·최대 RTT, 최대 |오프셋| (ms). 측정된 클라이언트가 없으면 None"""
+    rtts = [client.rtt for client in clients if client.rtt is not None]
+    if not rtts:
+        return None
+    max_offset = max(abs(client.clock_offset) for client in clients if client.clock_offset is not None)
+    return len(rtts), sum(rtts) / len(rtts), max(rtts), max_offset
@@ -0,0 +1,119 @@
+import json
+import struct
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 클라이언트가 Sec-WebSocket-Protocol 로 요청하면 서버→클라이언트 탈리를 바이너리로 전송
+BINARY_SUBPROTOCOL = "returnfeed.tally.v1"
+
+WIRE_VERSION = 1
+
+# 프레임 종류
+FRAME_TALLY = 0x01     # program/preview 변경만 (고정 길이)
+FRAME_SNAPSHOT = 0x02  # 고정 헤더 + 입력 인덱스 테이블 + 입력 메타데이터(JSON)
+
+# program/preview 가 없을 때의 인덱스
+NO_INPUT = 0xFFFF
+
+# type(u8) version(u8) seq(u32) timestamp_ms(u64) program(u16) preview(u16)
+TALLY_HEADER = struct.Struct("<BBIQHH")
+_U16 = struct.Struct("<H")
+
+
+class InputTable:
+    """세션 로컬 입력 인덱스 테이블 (입력 키 → u16 인덱스)"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def sync(self, tally_state: Dict) -> bool:
+        """tally_state 의 입력/program/preview 로 테이블 재구성, 바뀌었으면 True"""
+        keys = [str(key) for key in (tally_state.get("inputs") or {})]
+        for field_name in ("program", "preview"):
+            value = tally_state.get(field_name)
+            if value is not None and str(value) not in keys:
+                keys.append(str(value))
+
+        if keys == self.keys:
+            return False
+        if len(keys) >= NO_INPUT:
+            raise ValueError(f"Too many inputs for binary tally frame: {len(keys)}")
+        self.keys = keys
+        self.index = {key: position for position, key in enumerate(keys)}
+        return True
+
+    def index_of(self, input_id) -> int:
+        """입력 ID 의 인덱스 (없으면 NO_INPUT)"""
+        if input_id is None:
+            return NO_INPUT
+        return self.index.get(str(input_id), NO_INPUT)
+
+
+def timestamp_ms(tally_state: Dict) -> int:
+    """tally_state 의 ISO 타임스탬프를 epoch 밀리초로 변환"""
+    timestamp = tally_state.get("timestamp")
+    if not timestamp:
+        return 0
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+def encode_tally(seq: int, tally_state: Dict, table: InputTable) -> bytes:
+    """program/preview 변경 프레임 (18바이트)"""
+    return TALLY_HEADER.pack(
+        FRAME_TALLY, WIRE_VERSION, seq & 0xFFFFFFFF, timestamp_ms(tally_state),
+        table.index_of(tally_state.get("program")),
+        table.index_of(tally_state.get("preview"))
+    )
+
+
+def encode_snapshot(seq: int, tally_state: Dict, table: InputTable) -> bytes:
+    """전체 상태 프레임. 입력 목록이 바뀌었을 때와 입장/재동기화 때 사용"""
+    table.sync(tally_state)
+    parts = [
+        TALLY_HEADER.pack(
+            FRAME_SNAPSHOT, WIRE_VERSION, seq & 0xFFFFFFFF, timestamp_ms(tally_state),
+            table.index_of(tally_state.get("program")),
+            table.index_of(tally_state.get("preview"))
+        ),
+        _U16.pack(len(table.keys))
+    ]
+    for key in table.keys:
+        encoded_key = key.encode("utf-8")
+        parts.append(_U16.pack(len(encoded_key)))
+        parts.append(encoded_key)
+    parts.append(json.dumps(tally_state.get("inputs") or {}, separators=(",", ":")).encode("utf-8"))
+    return b"".join(parts)
+
+
+def decode_frame(data: bytes, keys: Optional[List[str]] = None) -> Dict:
+    """바이너리 프레임을 JSON 메시지와 같은 형태의 dict 로 복원 (클라이언트/벤치마크용)
+
+    FRAME_TALLY 는 인덱스만 담고 있으므로 직전 FRAME_SNAPSHOT 의 keys 가 필요하다.
+    """
+    frame_type, version, seq, stamp, program, preview = TALLY_HEADER.unpack_from(data)
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported wire version: {version}")
+
+    message = {"seq": seq, "timestampMs": stamp}
+    if frame_type == FRAME_SNAPSHOT:
+        offset = TALLY_HEADER.size
+        (count,) = _U16.unpack_from(data, offset)
+        offset += _U16.size
+        keys = []
+        for _ in range(count):
+            (length,) = _U16.unpack_from(data, offset)
+            offset += _U16.size
+            keys.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        message["type"] = "tally_update"
+        message["keys"] = keys
+        message["inputs"] = json.loads(data[offset:])
+    elif frame_type == FRAME_TALLY:
+        message["type"] = "tally_delta"
+    else:
+        raise ValueError(f"Unknown frame type: {frame_type}")
+
+    message["program"] = keys[program] if keys is not None and program != NO_INPUT else None
+    message["preview"] = keys[preview] if keys is not None and preview != NO_INPUT else None
+    return message
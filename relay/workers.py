@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+멀티 코어 Relay Server 실행 스크립트
+워커 프로세스 N개가 SO_REUSEPORT 로 같은 포트를 공유한다. 세션 상태는 세션 ID
+해시로 정해진 워커 하나가 소유하고, 다른 워커에 붙은 클라이언트에게는 Unix 소켓
+IPC 로 전달된다.
+
+예: python workers.py --workers 4 --port 8765
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+
+import websockets
+
+from cluster import RelayCluster, UnixSocketTransport
+from compression import serve_options
+from eventloop import install_event_loop, loop_name
+from history import history_from_env
+from profiling import ADMIN_SOCKET, start_admin_socket
+from lean import connection_limits
+from relay_server import RelayServer
+from wire import BINARY_SUBPROTOCOL
+
+
+async def serve_worker(index: int, count: int, host: str, port: int, ipc_dir: str):
+    """워커 하나 실행"""
+    nodes = [str(i) for i in range(count)]
+    cluster = RelayCluster(str(index), nodes, UnixSocketTransport(ipc_dir, str(index)))
+    # 이력은 세션을 소유한 워커가 기록하므로 같은 SQLite 파일에 중복 없이 쌓인다
+    server = RelayServer(cluster=cluster, history=history_from_env())
+    await cluster.start()
+
+    # /metrics 는 요청을 받은 워커 한 곳의 지표만 보여 준다
+    asyncio.ensure_future(server.metrics.sample_loop_lag())
+    asyncio.ensure_future(server.liveness.run())
+    # 품질 요약은 같은 워커에 연결된 스태프 리포트만 모아 그 워커의 PD 에게 보낸다
+    asyncio.ensure_future(server.quality.run())
+    if ADMIN_SOCKET:
+        await start_admin_socket(server, f"{ADMIN_SOCKET}.{index}")
+    if server.history:
+        asyncio.ensure_future(server.history.run())
+    async with websockets.serve(server.handler, host, port,
+                                subprotocols=[BINARY_SUBPROTOCOL], reuse_port=True,
+                                process_request=server.metrics.process_request_hook(server),
+                                ping_interval=None,
+                                **serve_options(connection_limits())):
+        logging.info(f"Relay 워커 {index}/{count} 시작: ws://{host}:{port} (pid {os.getpid()}, {loop_name()})")
+        try:
+            await asyncio.Future()
+        finally:
+            await cluster.close()
+
+
+def run_worker(index: int, count: int, host: str, port: int, ipc_dir: str):
+    """워커 프로세스 진입점"""
+    install_event_loop()
+    try:
+        asyncio.run(serve_worker(index, count, host, port, ipc_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process relay server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="워커 프로세스 수")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ipc-dir", default=os.environ.get(
+        "RELAY_IPC_DIR", os.path.join(tempfile.gettempdir(), "returnfeed-relay")
+    ), help="워커 간 Unix 소켓 디렉터리")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(index, args.workers, args.host, args.port, args.ipc_dir),
+            name=f"relay-worker-{index}"
+        )
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    logging.info(f"Relay 워커 {args.workers}개 시작 (IPC: {args.ipc_dir})")
+
+    # docker stop 등의 SIGTERM 도 Ctrl+C 와 같이 워커를 정리하고 종료
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("워커 종료")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()